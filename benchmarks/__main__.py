@@ -0,0 +1,183 @@
+"""
+Runs the benchmark suite and compares its results against a saved baseline.
+
+    python -m benchmarks                      # run everything, compare to the baseline
+    python -m benchmarks -k build_sg_mail     # only benchmarks whose name contains this
+    python -m benchmarks --latency 0.05       # simulate 50ms of Sendgrid latency
+    python -m benchmarks -s SENDGRID_CONNECTION_POOL_SIZE=4
+    python -m benchmarks --save               # record the results as the new baseline
+
+Baselines are machine-specific, so record one on the machine you compare on before
+making changes.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from django.conf import settings
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure(
+    step: Callable[[], object], messages: int, iterations: int, warmup: int
+) -> dict[str, float]:
+    for _ in range(warmup):
+        step()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        step()
+        latencies.append(time.perf_counter() - start)
+
+    # Tracing slows everything down, so peak memory is measured in a separate pass
+    tracemalloc.start()
+    try:
+        result = step()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stats = {
+        "msgs_per_sec": messages * iterations / sum(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_kb": peak / 1024,
+    }
+    if isinstance(result, bytes):
+        stats["wire_kb"] = len(result) / 1024
+    return stats
+
+
+def run(
+    names: list[str], host: str, iterations: int, warmup: int
+) -> dict[str, dict[str, float]]:
+    from benchmarks.cases import BENCHMARKS
+    from sendgrid_backend.mail import SendgridBackend
+
+    results = {}
+    for name in names:
+        backend = SendgridBackend(api_key="benchmarks", host=host)
+        step, messages = BENCHMARKS[name](backend)
+        with backend:
+            results[name] = measure(step, messages, iterations, warmup)
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    """
+    Prints the results next to the baseline, returning the names of the benchmarks
+    whose throughput dropped by more than `threshold` (a fraction) against it.
+    """
+    regressions = []
+    header = "{:<44} {:>12} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+        "benchmark", "msgs/sec", "p50 ms", "p99 ms", "peak KiB", "wire KiB", "vs base"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        change = ""
+        if name in baseline:
+            ratio = result["msgs_per_sec"] / baseline[name]["msgs_per_sec"] - 1
+            change = "{:+.1%}".format(ratio)
+            if ratio < -threshold:
+                regressions.append(name)
+                change += " !"
+        wire = "{:.1f}".format(result["wire_kb"]) if "wire_kb" in result else ""
+        print(
+            "{:<44} {msgs_per_sec:>12.1f} {p50_ms:>10.3f} {p99_ms:>10.3f} "
+            "{peak_kb:>10.1f} {:>10} {:>9}".format(name, wire, change, **result)
+        )
+    return regressions
+
+
+def parse_setting(value: str) -> tuple[str, Any]:
+    name, _, raw = value.partition("=")
+    try:
+        return name, json.loads(raw)
+    except ValueError:
+        return name, raw
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("-k", dest="filter", default="", help="name substring")
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds the fake Sendgrid server waits before responding",
+    )
+    parser.add_argument(
+        "-s",
+        "--setting",
+        action="append",
+        default=[],
+        type=parse_setting,
+        metavar="NAME=VALUE",
+        help="django setting for the backend, with VALUE parsed as JSON if possible",
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save", action="store_true", help="save the results as the baseline"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="fail if throughput drops by more than this fraction of the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    if not settings.configured:
+        settings.configure(**dict(args.setting))
+    # Template cases log a warning about the ignored subject/body on every build
+    logging.getLogger("sendgrid_backend").setLevel(logging.ERROR)
+
+    from benchmarks.cases import BENCHMARKS
+    from benchmarks.fake_server import FakeSendgridServer
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    with FakeSendgridServer(latency=args.latency, record=False) as server:
+        results = run(names, server.host, args.iterations, args.warmup)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+
+    if regressions:
+        print("\nThroughput regressed for: " + ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""
+The message shapes and operations measured by the benchmark suite.
+
+Each benchmark is a function registered with @benchmark, which is called with a
+SendgridBackend (configured from the command-line settings, and pointed at a fake
+Sendgrid server) and returns a (step, messages) pair: `step` is a zero-argument
+callable timed once per iteration, and `messages` is how many messages one step
+handles, from which throughput is derived.  Steps that return bytes (the encode_body
+cases) also have the size of what they return reported, as the bytes sent on the wire.
+"""
+import atexit
+import base64
+import json
+import os
+import shutil
+import tempfile
+from typing import Callable
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.test import override_settings
+
+from sendgrid_backend.encoding import SERIALIZERS, BodyEncoder
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.signature import load_public_key, verify_signature
+from sendgrid_backend.spool import SpoolBackend
+from sendgrid_backend.util import SENDGRID_6
+
+if SENDGRID_6:
+    from sendgrid.helpers.eventwebhook import EventWebhook
+
+Benchmark = Callable[[SendgridBackend], tuple[Callable[[], object], int]]
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+# Size of the attachment used by the "large attachment" cases
+LARGE_ATTACHMENT_SIZE = 2 * 1024 * 1024
+
+# Number of recipients used by the make_private and personalization cases
+RECIPIENT_COUNT = 1000
+
+# Number of events in the webhook request used by the verification cases
+WEBHOOK_EVENT_COUNT = 1000
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    def register(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+def recipients(count: int) -> list[str]:
+    return ["Recipient %d <recipient-%d@example.com>" % (i, i) for i in range(count)]
+
+
+def plain_message() -> EmailMessage:
+    return EmailMessage(
+        subject="Hello, World!",
+        body="Hello, World!",
+        from_email="Sam Smith <sam.smith@example.com>",
+        to=["John Doe <john.doe@example.com>", "jane.doe@example.com"],
+        cc=["Stephanie Smith <stephanie.smith@example.com>"],
+        bcc=["Sarah Smith <sarah.smith@example.com>"],
+        reply_to=["Sam Smith <sam.smith@example.com>"],
+        headers={"X-Campaign": "benchmarks"},
+    )
+
+
+def alternatives_message() -> EmailMessage:
+    msg = EmailMultiAlternatives(
+        subject="Hello, World!",
+        body="Hello, World!",
+        from_email="Sam Smith <sam.smith@example.com>",
+        to=["John Doe <john.doe@example.com>"],
+    )
+    msg.attach_alternative(
+        "<html><body><p>Hello, World!</p></body></html>", "text/html"
+    )
+    return msg
+
+
+def make_private_message() -> EmailMessage:
+    msg = plain_message()
+    msg.to = recipients(RECIPIENT_COUNT)
+    msg.cc = []
+    msg.bcc = []
+    msg.make_private = True  # type: ignore[attr-defined]
+    return msg
+
+
+def personalizations_message() -> EmailMessage:
+    msg = plain_message()
+    msg.to = []
+    msg.personalizations = [  # type: ignore[attr-defined]
+        {
+            "to": [
+                {"email": "recipient-%d@example.com" % i, "name": "Recipient %d" % i}
+            ],
+            "subject": "Hello, Recipient %d!" % i,
+            "dynamic_template_data": {"recipient_id": i},
+        }
+        for i in range(RECIPIENT_COUNT)
+    ]
+    return msg
+
+
+def attachment_message() -> EmailMessage:
+    msg = plain_message()
+    msg.attach(
+        "report.bin", os.urandom(LARGE_ATTACHMENT_SIZE), "application/octet-stream"
+    )
+    return msg
+
+
+def template_message() -> EmailMessage:
+    msg = plain_message()
+    msg.template_id = "d-0123456789abcdef0123456789abcdef"  # type: ignore[attr-defined]
+    msg.dynamic_template_data = {  # type: ignore[attr-defined]
+        "first_name": "John",
+        "items": [{"name": "Item %d" % i, "price": i * 100} for i in range(20)],
+    }
+    msg.categories = ["benchmarks", "templates"]  # type: ignore[attr-defined]
+    msg.custom_args = {"campaign": "benchmarks"}  # type: ignore[attr-defined]
+    return msg
+
+
+MESSAGES = {
+    "plain": plain_message,
+    "alternatives": alternatives_message,
+    "make_private": make_private_message,
+    "personalizations": personalizations_message,
+    "attachment": attachment_message,
+    "template": template_message,
+}
+
+
+def _build_benchmark(make_message: Callable[[], EmailMessage]) -> Benchmark:
+    def build(backend: SendgridBackend) -> tuple[Callable[[], object], int]:
+        msg = make_message()
+        return lambda: backend._build_sg_mail(msg), 1
+
+    return build
+
+
+for _name, _make_message in MESSAGES.items():
+    benchmark("build_sg_mail[%s]" % _name)(_build_benchmark(_make_message))
+
+
+@benchmark("build_sg_personalization")
+def build_personalization(backend):
+    msg = make_private_message()
+    to = msg.to
+    return lambda: [backend._build_sg_personalization(msg, [], [t]) for t in to], 1
+
+
+@benchmark("create_sg_attachment")
+def create_attachment(backend):
+    attachment = attachment_message().attachments[0]
+    return lambda: backend._create_sg_attachment(attachment), 1
+
+
+# Bodies of at least this many bytes are compressed by the gzip encode_body cases
+COMPRESS_MIN_SIZE = 1024
+
+
+def _encode_benchmark(
+    make_message: Callable[[], EmailMessage], serializer: str, compress: bool
+) -> Benchmark:
+    def encode(backend: SendgridBackend) -> tuple[Callable[[], object], int]:
+        data = backend._build_sg_mail(make_message())
+        encoder = BodyEncoder(
+            SERIALIZERS[serializer],
+            compress_min_size=COMPRESS_MIN_SIZE if compress else None,
+        )
+        return lambda: encoder.encode(data)[0], 1
+
+    return encode
+
+
+for _name in ("make_private", "personalizations", "attachment"):
+    for _serializer in SERIALIZERS:
+        for _compress in (False, True):
+            benchmark(
+                "encode_body[%s,%s%s]"
+                % (_name, _serializer, ",gzip" if _compress else "")
+            )(_encode_benchmark(MESSAGES[_name], _serializer, _compress))
+
+
+SEND_BATCH_SIZE = 20
+
+
+@benchmark("send_messages[plain]")
+def send_messages(backend):
+    msgs = [plain_message() for _ in range(SEND_BATCH_SIZE)]
+    return lambda: backend.send_messages(msgs), len(msgs)
+
+
+@benchmark("send_messages[template]")
+def send_template_messages(backend):
+    msgs = [template_message() for _ in range(SEND_BATCH_SIZE)]
+    return lambda: backend.send_messages(msgs), len(msgs)
+
+
+@benchmark("spool_messages[plain]")
+def spool_messages(backend):
+    # What send_messages[plain] costs the caller with SpoolBackend
+    spool_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, spool_dir, True)
+    with override_settings(
+        SENDGRID_SPOOL_PATH=os.path.join(spool_dir, "spool.sqlite3")
+    ):
+        spool_backend = SpoolBackend(api_key="benchmarks", host=backend.sg.host)
+    msgs = [plain_message() for _ in range(SEND_BATCH_SIZE)]
+    return lambda: spool_backend.send_messages(msgs), len(msgs)
+
+
+def _echo_benchmark(**settings) -> Benchmark:
+    def make_benchmark(backend):
+        # What SENDGRID_ECHO_TO_STDOUT adds to send_messages[plain], echoing to devnull
+        stream = open(os.devnull, "w")
+        with override_settings(SENDGRID_ECHO_TO_STDOUT=True, **settings):
+            echo_backend = SendgridBackend(
+                api_key="benchmarks", host=backend.sg.host, stream=stream
+            )
+        msgs = [plain_message() for _ in range(SEND_BATCH_SIZE)]
+        return lambda: echo_backend.send_messages(msgs), len(msgs)
+
+    return make_benchmark
+
+
+benchmark("send_messages[echo]")(_echo_benchmark())
+benchmark("send_messages[echo,summary,buffered]")(
+    _echo_benchmark(SENDGRID_ECHO_FORMAT="summary", SENDGRID_ECHO_BUFFERED=True)
+)
+
+
+@benchmark("send_messages[personalizations]")
+def send_personalizations_messages(backend):
+    # Large request bodies, to compare SENDGRID_JSON_SERIALIZER and
+    # SENDGRID_COMPRESS_MIN_SIZE settings end to end
+    msgs = [personalizations_message() for _ in range(2)]
+    return lambda: backend.send_messages(msgs), len(msgs)
+
+
+def signed_webhook() -> tuple[bytes, str, str, str]:
+    """
+    Returns the body, signature, timestamp and verification key of an event webhook
+    request carrying a batch of events, signed like Sendgrid signs them.
+    """
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public_key = private_key.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    body = json.dumps(
+        [
+            {
+                "email": "recipient-%d@example.com" % i,
+                "timestamp": 1715586138,
+                "event": "delivered",
+                "sg_event_id": "event-%d" % i,
+                "sg_message_id": "message-%d" % i,
+                "smtp-id": "<message-%d@example.com>" % i,
+            }
+            for i in range(WEBHOOK_EVENT_COUNT)
+        ]
+    ).encode()
+    timestamp = "1715586138"
+    signature = private_key.sign(timestamp.encode() + body, ec.ECDSA(hashes.SHA256()))
+    return (
+        body,
+        base64.b64encode(signature).decode(),
+        timestamp,
+        base64.b64encode(public_key).decode(),
+    )
+
+
+if SENDGRID_6:
+
+    @benchmark("verify_webhook[sendgrid-uncached]")
+    def verify_webhook_sendgrid_uncached(backend):
+        body, signature, timestamp, key = signed_webhook()
+
+        # What check_sendgrid_signature did before its key cache
+        def step():
+            event_webhook = EventWebhook()
+            ec_public_key = event_webhook.convert_public_key_to_ecdsa(key)
+            assert event_webhook.verify_signature(
+                body.decode("utf-8"), signature, timestamp, ec_public_key
+            )
+
+        return step, 1
+
+    @benchmark("verify_webhook[sendgrid]")
+    def verify_webhook_sendgrid(backend):
+        body, signature, timestamp, key = signed_webhook()
+        ec_public_key = EventWebhook().convert_public_key_to_ecdsa(key)
+
+        def step():
+            assert EventWebhook().verify_signature(
+                body.decode("utf-8"), signature, timestamp, ec_public_key
+            )
+
+        return step, 1
+
+
+try:
+    from ellipticcurve import Ecdsa, PublicKey, Signature
+except ImportError:
+    Ecdsa = None
+
+if Ecdsa is not None:
+
+    @benchmark("verify_webhook[starkbank-ecdsa]")
+    def verify_webhook_starkbank(backend):
+        # The pure-Python ECDSA that older sendgrid releases verify signatures with
+        body, signature, timestamp, key = signed_webhook()
+        public_key = PublicKey.fromDer(base64.b64decode(key))
+
+        def step():
+            assert Ecdsa.verify(
+                timestamp + body.decode("utf-8"),
+                Signature.fromBase64(signature),
+                public_key,
+            )
+
+        return step, 1
+
+
+@benchmark("verify_webhook[signature]")
+def verify_webhook_signature(backend):
+    body, signature, timestamp, key = signed_webhook()
+    public_keys = [load_public_key(key)]
+
+    def step():
+        assert verify_signature(body, signature, timestamp, public_keys)
+
+    return step, 1
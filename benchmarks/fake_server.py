@@ -0,0 +1,100 @@
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, NamedTuple, Optional
+
+
+def decode(body: bytes, headers) -> dict:
+    if headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+class FakeRequest(NamedTuple):
+    client_address: tuple
+    path: str
+    headers: dict
+    # The size of the body as posted, before it is decompressed
+    size: int
+    body: dict
+
+
+class FakeSendgridHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        raw_body = self.rfile.read(int(self.headers["Content-Length"]))
+        request = FakeRequest(
+            self.client_address,
+            self.path,
+            dict(self.headers),
+            len(raw_body),
+            decode(raw_body, self.headers),
+        )
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        with self.server.lock:
+            self.server.request_count += 1
+            if self.server.record:
+                self.server.requests.append(request)
+            message_id = "message-%d" % self.server.request_count
+
+        self.send_response(self.server.get_status(request))
+        self.send_header("X-Message-Id", message_id)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSendgridServer(ThreadingHTTPServer):
+    """
+    An in-process stand-in for the mail/send endpoint, which parses the (possibly gzipped)
+    JSON body of every request and responds after sleeping for `latency` seconds.
+
+    Responds with `status`, unless status_for(request) returns another status.  Each
+    request is kept in `requests` unless `record` is False.
+
+    Usable as a context manager, which serves requests from a background thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        status: int = 202,
+        status_for: Optional[Callable[[FakeRequest], Optional[int]]] = None,
+        record: bool = True,
+    ):
+        super().__init__(("127.0.0.1", 0), FakeSendgridHandler)
+        self.latency = latency
+        self.status = status
+        self.status_for = status_for
+        self.record = record
+        self.request_count = 0
+        self.requests = []  # type: list[FakeRequest]
+        self.lock = threading.Lock()
+
+    @property
+    def host(self) -> str:
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def get_status(self, request: FakeRequest) -> int:
+        if self.status_for is not None:
+            status = self.status_for(request)
+            if status is not None:
+                return status
+        return self.status
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections.abc import Awaitable
+from typing import Any, Callable, Optional
+
+from python_http_client.exceptions import HTTPError, ServiceUnavailableError
+
+from sendgrid_backend.signals import sendgrid_circuit_breaker_state_changed
+from sendgrid_backend.util import get_django_setting
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """
+    Raised instead of posting a request while the circuit breaker is open.
+
+    Subclasses the error Sendgrid itself returns when it is unavailable, with a
+    Retry-After header for when the breaker will let a request through again, so that it
+    is handled (and retried, if it is worth waiting for) the same way.
+    """
+
+
+def is_outage(error: BaseException) -> bool:
+    """
+    Whether a request failed in a way that suggests Sendgrid is unavailable: a
+    connection error or timeout, or a server error response
+    """
+    if isinstance(error, OSError):
+        return True
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, HTTPError) and getattr(error, "status_code", 0) >= 500
+
+
+class CircuitBreaker:
+    """
+    Stops posting requests to Sendgrid while it appears to be down, so that sends fail
+    fast with CircuitOpenError instead of each waiting for a timeout.
+
+    The breaker opens after `failure_threshold` consecutive requests fail with an
+    outage (see is_outage).  After `reset_timeout` seconds it is half-open, letting up
+    to `half_open_requests` requests through at once to probe Sendgrid: it closes again
+    once one succeeds, and reopens if one fails.
+
+    Every change of state sends sendgrid_circuit_breaker_state_changed.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_requests: int = 1,
+        name: str = "",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_requests = half_open_requests
+        self.name = name
+        self.failures = 0
+        self.rejected = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            change = self._check_reset_timeout()
+            state = self._state
+        self._notify(change)
+        return state
+
+    def _check_reset_timeout(self) -> Optional[tuple[str, str]]:
+        if self._state == OPEN and (
+            self._clock() - self._opened_at >= self.reset_timeout
+        ):
+            return self._set_state(HALF_OPEN)
+        return None
+
+    def _set_state(self, state: str) -> Optional[tuple[str, str]]:
+        old_state = self._state
+        self._state = state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = self._clock()
+        elif state == CLOSED:
+            self.failures = 0
+        return (old_state, state) if old_state != state else None
+
+    def _notify(self, *changes: Optional[tuple[str, str]]) -> None:
+        # Sent outside of the lock, so that receivers can read the breaker's state
+        for change in changes:
+            if change is not None:
+                sendgrid_circuit_breaker_state_changed.send(
+                    sender=self.__class__,
+                    breaker=self,
+                    old_state=change[0],
+                    new_state=change[1],
+                )
+
+    def before_request(self) -> None:
+        """
+        Raises CircuitOpenError if a request may not be posted now
+        """
+        with self._lock:
+            change = self._check_reset_timeout()
+            if self._state == HALF_OPEN and self._probes < self.half_open_requests:
+                self._probes += 1
+                retry_after = None
+            elif self._state != CLOSED:
+                self.rejected += 1
+                retry_after = max(
+                    0.0, self._opened_at + self.reset_timeout - self._clock()
+                )
+            else:
+                retry_after = None
+        self._notify(change)
+
+        if retry_after is not None:
+            raise CircuitOpenError(
+                503,
+                "Circuit breaker open",
+                b"",
+                {"Retry-After": "{:.3f}".format(retry_after)},
+            )
+
+    def record_result(self, error: Optional[BaseException]) -> None:
+        """
+        Records the outcome of a request that before_request let through
+        """
+        failed = error is not None and is_outage(error)
+        with self._lock:
+            change = None
+            if failed:
+                self.failures += 1
+                if self._state == HALF_OPEN or (
+                    self._state == CLOSED and self.failures >= self.failure_threshold
+                ):
+                    change = self._set_state(OPEN)
+            elif self._state == HALF_OPEN:
+                change = self._set_state(CLOSED)
+            elif self._state == CLOSED:
+                self.failures = 0
+        self._notify(change)
+
+    def _release(self) -> None:
+        # A request that was cancelled says nothing about Sendgrid, but frees its probe
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def call(self, func: Callable[..., Any], *args) -> Any:
+        self.before_request()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.record_result(e)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self.record_result(None)
+        return result
+
+    async def acall(self, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        self.before_request()
+        try:
+            result = await func(*args)
+        except Exception as e:
+            self.record_result(e)
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self.record_result(None)
+        return result
+
+
+_breakers: dict[tuple, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host: str) -> Optional[CircuitBreaker]:
+    """
+    Returns the process-wide circuit breaker for requests to `host`, or None unless
+    SENDGRID_CIRCUIT_BREAKER_THRESHOLD is set.  Backends are usually created for each
+    send, so the breaker is shared by every backend with the same host and settings.
+    """
+    threshold = get_django_setting("SENDGRID_CIRCUIT_BREAKER_THRESHOLD")
+    if not threshold:
+        return None
+
+    key = (
+        host,
+        threshold,
+        get_django_setting("SENDGRID_CIRCUIT_BREAKER_RESET_TIMEOUT", 30.0),
+        get_django_setting("SENDGRID_CIRCUIT_BREAKER_HALF_OPEN_REQUESTS", 1),
+    )
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(*key[1:], name=host)
+        return breaker
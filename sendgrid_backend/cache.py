@@ -0,0 +1,200 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, Callable, Optional
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded least-recently-used cache, which counts its hits and misses so
+    that it can be sized.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # type: OrderedDict[Hashable, Any]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class _BloomGeneration:
+    __slots__ = ("bits", "count", "bits_set", "created")
+
+    def __init__(self, num_bits: int, created: float):
+        self.bits = bytearray((num_bits + 7) // 8)
+        self.count = 0
+        self.bits_set = 0
+        self.created = created
+
+    def __contains__(self, positions: list[int]) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, positions: list[int]) -> None:
+        bits = self.bits
+        for p in positions:
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                self.bits_set += 1
+        self.count += 1
+
+
+class RotatingBloomFilter:
+    """
+    A thread-safe set of strings in a fixed amount of memory, which remembers the keys
+    added to it for a limited time and may wrongly report that a key was added.
+
+    Keys are added to the newer of two Bloom filters, which replaces the older one once
+    it holds `capacity` keys or is `max_age` seconds old, so a key is remembered until
+    between `capacity` and twice as many keys were added after it (or for between
+    `max_age` and twice as many seconds).  Until then, lookups of keys that were never
+    added are found with probability up to `error_rate`.
+
+    Lookups are counted in `checks` and those that found a key in `hits`, and the
+    current chance of a false positive is estimated from how full the filters are.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        max_age: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_age = max_age
+        # Lookups check both filters, which may each give a false positive
+        self.num_bits = max(
+            8, math.ceil(-capacity * math.log(error_rate / 2) / math.log(2) ** 2)
+        )
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.checks = 0
+        self.hits = 0
+        self.rotations = 0
+        self._clock = clock
+        self._current = _BloomGeneration(self.num_bits, clock())
+        self._previous = None  # type: Optional[_BloomGeneration]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """
+        The number of keys added to the filter that it still remembers
+        """
+        with self._lock:
+            self._rotate()
+            previous = self._previous
+            return self._current.count + (previous.count if previous else 0)
+
+    def _positions(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _rotate(self) -> None:
+        now = self._clock()
+        current = self._current
+        expired = self.max_age is not None and now - current.created >= self.max_age
+        if current.count >= self.capacity or expired:
+            self._previous = current
+            self._current = _BloomGeneration(self.num_bits, now)
+            self.rotations += 1
+        previous = self._previous
+        if (
+            previous is not None
+            and self.max_age is not None
+            and now - previous.created >= 2 * self.max_age
+        ):
+            self._previous = None
+
+    def __contains__(self, key: str) -> bool:
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate()
+            found = positions in self._current or (
+                self._previous is not None and positions in self._previous
+            )
+            self.checks += 1
+            self.hits += found
+            return found
+
+    def add(self, key: str) -> None:
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate()
+            if positions not in self._current:
+                self._current.add(positions)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.checks if self.checks else 0.0
+
+    @property
+    def false_positive_rate(self) -> float:
+        """
+        The estimated chance that a lookup of a key that was never added finds it
+        """
+        with self._lock:
+            generations = [self._current, self._previous]
+        missed = 1.0
+        for generation in generations:
+            if generation is not None:
+                fill = generation.bits_set / self.num_bits
+                missed *= 1 - fill**self.num_hashes
+        return 1 - missed
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "checks": self.checks,
+            "hits": self.hits,
+            "hit_rate": self.hit_rate,
+            "false_positive_rate": self.false_positive_rate,
+            "rotations": self.rotations,
+            "size": len(self),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._current = _BloomGeneration(self.num_bits, self._clock())
+            self._previous = None
+            self.checks = 0
+            self.hits = 0
+            self.rotations = 0
@@ -1,37 +1,61 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from inspect import iscoroutinefunction
-from typing import Callable
+from typing import Any, Callable, Optional
 
-from django.conf import settings
-from django.http import HttpResponseNotFound
+from django.http import HttpRequest, HttpResponseNotFound
 
-from sendgrid_backend.util import SENDGRID_6
+from sendgrid_backend.signature import get_public_keys, verify_request
+from sendgrid_backend.util import SENDGRID_6, get_django_setting
 
-if SENDGRID_6:
-    from sendgrid.helpers.eventwebhook import EventWebhook
-    from sendgrid.helpers.eventwebhook.eventwebhook_header import EventWebhookHeader
+# The executor that async views verify signatures in, with its number of workers
+_executor: Optional[tuple[int, ThreadPoolExecutor]] = None
+_executor_lock = threading.Lock()
 
-    # Adapted from:
-    # https://stackoverflow.com/a/71672552
-    def check_sendgrid_signature(request):
-        event_webhook = EventWebhook()
-        key = settings.SENDGRID_WEBHOOK_VERIFICATION_KEY
-        ec_public_key = event_webhook.convert_public_key_to_ecdsa(key)
-
-        return event_webhook.verify_signature(
-            request.body.decode("utf-8"),
-            request.headers[EventWebhookHeader.SIGNATURE],
-            request.headers[EventWebhookHeader.TIMESTAMP],
-            ec_public_key,
-        )
 
-    def verify_sendgrid_webhook_signature(func: Callable) -> Callable:
-        """Check a view for a valid sendgrid webhook"""
+def get_verification_executor() -> Optional[ThreadPoolExecutor]:
+    """
+    Returns the executor in which async views verify webhook signatures, so that the
+    CPU-bound verification doesn't block the event loop, or None if they verify on the
+    event loop.  Its size is set by SENDGRID_WEBHOOK_VERIFICATION_WORKERS, which also
+    bounds how many requests are verified at once.
+    """
+    global _executor
+    max_workers = get_django_setting("SENDGRID_WEBHOOK_VERIFICATION_WORKERS")
+    if not max_workers:
+        return None
+
+    with _executor_lock:
+        if _executor is None or _executor[0] != max_workers:
+            if _executor is not None:
+                _executor[1].shutdown(wait=False)
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="sendgrid-webhook"
+            )
+            _executor = (max_workers, executor)
+        return _executor[1]
+
+
+def signature_check(check: Callable[[HttpRequest], bool]) -> Callable:
+    """
+    Returns a view decorator that responds with a 404 to requests for which
+    check(request) is false
+    """
+
+    def decorator(func: Callable) -> Callable:
         if iscoroutinefunction(func):
 
             @wraps(func)
             async def inner(request, *args, **kwargs):
-                if not check_sendgrid_signature(request):
+                executor = get_verification_executor()
+                if executor is None:
+                    valid = check(request)
+                else:
+                    loop = asyncio.get_running_loop()
+                    valid = await loop.run_in_executor(executor, check, request)
+                if not valid:
                     return HttpResponseNotFound()
                 return await func(request, *args, **kwargs)
 
@@ -39,8 +63,52 @@ if SENDGRID_6:
 
             @wraps(func)
             def inner(request, *args, **kwargs):
-                if not check_sendgrid_signature(request):
+                if not check(request):
                     return HttpResponseNotFound()
                 return func(request, *args, **kwargs)
 
         return inner
+
+    return decorator
+
+
+def verify_webhook_signature(func: Callable) -> Callable:
+    """
+    Check a view for a valid sendgrid webhook, verifying the raw request body with the
+    cryptography package.  A drop-in replacement for verify_sendgrid_webhook_signature,
+    which also works with sendgrid v5.
+    """
+    return signature_check(verify_request)(func)
+
+
+if SENDGRID_6:
+    from sendgrid.helpers.eventwebhook import EventWebhook
+    from sendgrid.helpers.eventwebhook.eventwebhook_header import EventWebhookHeader
+
+    def _convert_public_key(key: str) -> Any:
+        return EventWebhook().convert_public_key_to_ecdsa(key)
+
+    def get_verification_keys() -> list[Any]:
+        """
+        Returns the public key(s) in settings.SENDGRID_WEBHOOK_VERIFICATION_KEY, converted
+        for sendgrid's signature verification, through the same cache (and handling of
+        key rotation) as get_public_keys.
+        """
+        return get_public_keys(_convert_public_key)
+
+    # Adapted from:
+    # https://stackoverflow.com/a/71672552
+    def check_sendgrid_signature(request):
+        event_webhook = EventWebhook()
+        payload = request.body.decode("utf-8")
+        signature = request.headers[EventWebhookHeader.SIGNATURE]
+        timestamp = request.headers[EventWebhookHeader.TIMESTAMP]
+
+        return any(
+            event_webhook.verify_signature(payload, signature, timestamp, ec_public_key)
+            for ec_public_key in get_verification_keys()
+        )
+
+    def verify_sendgrid_webhook_signature(func: Callable) -> Callable:
+        """Check a view for a valid sendgrid webhook"""
+        return signature_check(check_sendgrid_signature)(func)
@@ -0,0 +1,189 @@
+import atexit
+import io
+import logging
+import os
+import queue
+import sys
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# How SendgridBackend echoes messages: as MIME, as their request body, or as a line per
+# request
+ECHO_FORMATS = ("mime", "json", "summary")
+
+
+class EchoWriter:
+    """
+    Writes echoed email to `stream`, or to the file at `path`, on a background thread, so
+    that sending threads only queue text instead of contending for the stream and waiting
+    on every flush.
+
+    At most queue_size pieces of text wait to be written.  While the queue is full, text
+    is dropped rather than blocking the sender, and a line saying how many were dropped
+    is written once the writer catches up.  The file at `path` is rotated once it would
+    exceed max_bytes (if set), keeping backup_count old files as path.1, path.2 and so on.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[io.TextIOBase] = None,
+        path: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        backup_count: int = 5,
+        queue_size: int = 10000,
+    ):
+        self.stream = stream
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self.closed = False
+        self._reported_drops = 0
+        self._file = None  # type: Optional[io.BufferedWriter]
+        self._size = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(queue_size)  # type: queue.Queue[Optional[str]]
+        self._thread = threading.Thread(
+            target=self._run, name="sendgrid-echo", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, text: str) -> bool:
+        """
+        Queues text to be written, without blocking.  Returns False if it was dropped.
+        """
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def flush(self) -> None:
+        """
+        Blocks until all text queued so far has been written and flushed
+        """
+        if not self.closed:
+            self._queue.join()
+
+    def close(self) -> None:
+        """
+        Writes the text that is still queued, and stops the writer thread
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        # Queued to stop the writer thread
+        self._queue.put(None)
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            # Write everything that is queued, then flush once
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for text in batch:
+                    if text is None:
+                        stopping = True
+                    else:
+                        self._write(text)
+                dropped = self.dropped - self._reported_drops
+                if dropped:
+                    self._reported_drops += dropped
+                    message = "[{} echoed email(s) dropped, the echo queue was full]\n"
+                    self._write(message.format(dropped))
+                self._flush()
+            except Exception:
+                logger.exception("Failed to echo email")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, text: str) -> None:
+        if self.path is None:
+            assert self.stream is not None
+            self.stream.write(text)
+            return
+
+        data = text.encode("utf-8")
+        if self._file is None:
+            self._open()
+        elif self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        assert self._file is not None
+        self._file.write(data)
+        self._size += len(data)
+
+    def _flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+        elif self.stream is not None:
+            self.stream.flush()
+
+    def _open(self) -> None:
+        assert self.path is not None
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _rotate(self) -> None:
+        assert self._file is not None and self.path is not None
+        self._file.close()
+        if self.backup_count:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = "{}.{}".format(self.path, i)
+                if os.path.exists(source):
+                    os.replace(source, "{}.{}".format(self.path, i + 1))
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+_writers: dict[tuple, EchoWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_echo_writer(
+    stream: Optional[io.TextIOBase] = None,
+    path: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    backup_count: int = 5,
+    queue_size: int = 10000,
+) -> EchoWriter:
+    """
+    Returns the process-wide EchoWriter for `path`, or for sys.stdout or sys.stderr, so
+    that every backend echoing to the same place shares one writer thread.  Writers are
+    closed, writing the text they still have queued, when the process exits.
+
+    Writers to other streams aren't shared, since they would keep their stream (and
+    thread) alive for the rest of the process: create an EchoWriter and close it instead.
+    """
+    if path is None and stream is not sys.stdout and stream is not sys.stderr:
+        raise ValueError("Only echo writers to a path, stdout or stderr are shared")
+    key = (stream if path is None else None, path, max_bytes, backup_count, queue_size)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer.closed:
+            writer = _writers[key] = EchoWriter(*key)
+        return writer
+
+
+@atexit.register
+def _close_writers() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
@@ -0,0 +1,82 @@
+import gzip
+import json
+from typing import Callable, Optional, Union
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+Serializer = Callable[[dict], bytes]
+
+
+def json_dumps(data: dict) -> bytes:
+    """
+    Serializes a request body the way python_http_client does
+    """
+    return json.dumps(data).encode("utf-8")
+
+
+def orjson_dumps(data: dict) -> bytes:
+    return orjson.dumps(data)
+
+
+SERIALIZERS = {"json": json_dumps, "orjson": orjson_dumps}
+
+
+def get_serializer(serializer: Union[str, Serializer, None]) -> Serializer:
+    """
+    Returns the serializer named by SENDGRID_JSON_SERIALIZER: "json", "orjson", the
+    dotted path of a function taking a request body dict and returning bytes, or such a
+    function itself.
+    """
+    if serializer is None:
+        return json_dumps
+    if callable(serializer):
+        return serializer
+    if serializer == "orjson" and orjson is None:
+        raise ImproperlyConfigured(
+            "The orjson serializer requires the orjson package.  "
+            + "Install it with `pip install django-sendgrid-v5[orjson]`."
+        )
+    if serializer in SERIALIZERS:
+        return SERIALIZERS[serializer]
+    return import_string(serializer)
+
+
+class BodyEncoder:
+    """
+    Encodes mail/send request bodies with `serializer`, gzip-compressing bodies of at
+    least `compress_min_size` bytes (if set) at `compress_level`.
+    """
+
+    def __init__(
+        self,
+        serializer: Serializer = json_dumps,
+        compress_min_size: Optional[int] = None,
+        compress_level: int = 6,
+    ):
+        self.serializer = serializer
+        self.compress_min_size = compress_min_size
+        self.compress_level = compress_level
+
+    @property
+    def is_default(self) -> bool:
+        """
+        Whether bodies are encoded the same way as by python_http_client
+        """
+        return self.serializer is json_dumps and self.compress_min_size is None
+
+    def encode(self, data: dict) -> tuple[bytes, dict[str, str]]:
+        """
+        Returns the encoded body, and the headers to send it with
+        """
+        body = self.serializer(data)
+        headers = {"Content-Type": "application/json"}
+        if self.compress_min_size is not None and len(body) >= self.compress_min_size:
+            body = gzip.compress(body, compresslevel=self.compress_level, mtime=0)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
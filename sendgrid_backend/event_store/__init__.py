@@ -0,0 +1,5 @@
+"""
+An optional Django app storing the events received by
+sendgrid_backend.events.event_webhook_view.  Add "sendgrid_backend.event_store" to
+INSTALLED_APPS to enable it.
+"""
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+
+# The dispatch_uid the app's signal receiver is connected with
+RECEIVER_UID = "sendgrid_backend.event_store"
+
+
+class EventStoreConfig(AppConfig):
+    name = "sendgrid_backend.event_store"
+    label = "sendgrid_event_store"
+    verbose_name = "Sendgrid events"
+    default_auto_field = "django.db.models.BigAutoField"
+
+    def ready(self):
+        from sendgrid_backend.signals import sendgrid_events_received
+
+        from .ingest import store_received_events
+
+        sendgrid_events_received.connect(
+            store_received_events, dispatch_uid=RECEIVER_UID
+        )
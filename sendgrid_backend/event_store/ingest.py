@@ -0,0 +1,77 @@
+import datetime
+from collections.abc import Iterable
+from itertools import islice
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from sendgrid_backend.events import WebhookEvent
+from sendgrid_backend.util import get_django_setting
+
+from .models import SendgridEvent
+
+# The fields of an event that are columns of SendgridEvent, rather than kept in its data
+COLUMN_FIELDS = frozenset(
+    ("sg_event_id", "sg_message_id", "event", "email", "timestamp")
+)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _event_time(timestamp: Optional[int]) -> Optional[datetime.datetime]:
+    if timestamp is None:
+        return None
+    value = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+    if not settings.USE_TZ:
+        value = timezone.make_naive(value, datetime.timezone.utc)
+    return value
+
+
+def to_model(event: WebhookEvent) -> SendgridEvent:
+    return SendgridEvent(
+        sg_event_id=event.sg_event_id,
+        message_id=event.message_id,
+        sg_message_id=event.sg_message_id,
+        event=event.event or "",
+        email=event.email or "",
+        timestamp=_event_time(event.timestamp),
+        data={k: v for k, v in event.data.items() if k not in COLUMN_FIELDS},
+    )
+
+
+def store_events(
+    events: Iterable[WebhookEvent], batch_size: Optional[int] = None
+) -> int:
+    """
+    Stores events as SendgridEvents, inserting up to batch_size of them
+    (SENDGRID_EVENT_STORE_BATCH_SIZE, or 1000) per query in a single transaction, so that
+    only one batch of events is in memory at a time.  Events that were already stored
+    are skipped.
+
+    Returns the number of events given.
+    """
+    if batch_size is None:
+        batch_size = get_django_setting(
+            "SENDGRID_EVENT_STORE_BATCH_SIZE", DEFAULT_BATCH_SIZE
+        )
+    models = map(to_model, events)
+    count = 0
+    with transaction.atomic():
+        while True:
+            batch = list(islice(models, batch_size))
+            if not batch:
+                return count
+            # ignore_conflicts skips events whose sg_event_id was already stored
+            SendgridEvent.objects.bulk_create(
+                batch, batch_size=batch_size, ignore_conflicts=True
+            )
+            count += len(batch)
+
+
+def store_received_events(sender, events, **kwargs) -> None:
+    """
+    Receiver of sendgrid_events_received, which stores the events of each request
+    """
+    store_events(events)
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies: list[tuple[str, str]] = []
+
+    operations = [
+        migrations.CreateModel(
+            name="SendgridEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sg_event_id",
+                    models.CharField(max_length=100, null=True, unique=True),
+                ),
+                (
+                    "message_id",
+                    models.CharField(db_index=True, max_length=100, null=True),
+                ),
+                ("event", models.CharField(max_length=32)),
+                ("email", models.CharField(max_length=254)),
+                ("timestamp", models.DateTimeField(null=True)),
+                ("data", models.JSONField(default=dict)),
+            ],
+        ),
+    ]
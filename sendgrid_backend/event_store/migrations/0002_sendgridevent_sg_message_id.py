@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sendgrid_event_store", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sendgridevent",
+            name="sg_message_id",
+            field=models.CharField(db_index=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class SendgridEventQuerySet(models.QuerySet):
+    def for_message(self, msg):
+        """
+        The events of an EmailMessage sent by SendgridBackend, which stores the
+        X-Message-Id of its request in msg.extra_headers["message_id"]
+        """
+        return self.filter(message_id=msg.extra_headers.get("message_id"))
+
+
+class SendgridEvent(models.Model):
+    """
+    An event from the event webhook.  The fields every event has are columns, and the
+    rest of the event (category, reason, url, custom args, ...) is kept in `data`.
+    """
+
+    # Unique, so that events Sendgrid delivers again are only stored once
+    sg_event_id = models.CharField(max_length=100, unique=True, null=True)
+    # The X-Message-Id of the request, and the id Sendgrid gave the recipient's copy
+    # (which starts with it), telling the recipients of one request apart
+    message_id = models.CharField(max_length=100, db_index=True, null=True)
+    sg_message_id = models.CharField(max_length=255, db_index=True, null=True)
+    event = models.CharField(max_length=32)
+    email = models.CharField(max_length=254)
+    timestamp = models.DateTimeField(null=True)
+    data = models.JSONField(default=dict)
+
+    objects = SendgridEventQuerySet.as_manager()
+
+    def __str__(self):
+        return "%s %s" % (self.event, self.email)
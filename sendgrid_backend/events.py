@@ -0,0 +1,276 @@
+"""
+Parsing of Sendgrid event webhook requests.
+
+Event webhook requests carry a JSON array of events, which is parsed one event at a time
+into WebhookEvent records rather than being loaded all at once, and handed to receivers
+of the sendgrid_events_received signal once per request.
+"""
+import codecs
+import json
+import re
+import threading
+from collections.abc import Iterable, Iterator
+from typing import Any, NamedTuple, Optional, Union
+
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from sendgrid_backend.cache import RotatingBloomFilter
+from sendgrid_backend.decorators import verify_webhook_signature
+from sendgrid_backend.signals import sendgrid_events_received
+from sendgrid_backend.util import get_django_setting
+
+# Request bodies are parsed in chunks of this many bytes
+EVENT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_SEPARATOR = re.compile(r"[ \t\n\r]*[,\]]")
+_DECODER = json.JSONDecoder()
+
+
+class WebhookEvent(NamedTuple):
+    """
+    A single event from the event webhook.  The fields every event has are attributes;
+    the rest (category, reason, url, custom args, ...) are only in `data`, the event as
+    Sendgrid sent it.
+    """
+
+    event: Optional[str]
+    email: Optional[str]
+    timestamp: Optional[int]
+    sg_event_id: Optional[str]
+    sg_message_id: Optional[str]
+    data: dict
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "WebhookEvent":
+        if not isinstance(data, dict):
+            raise ValueError("Webhook events must be JSON objects, got: %r" % data)
+        return cls(
+            data.get("event"),
+            data.get("email"),
+            data.get("timestamp"),
+            data.get("sg_event_id"),
+            data.get("sg_message_id"),
+            data,
+        )
+
+    @property
+    def message_id(self) -> Optional[str]:
+        """
+        The X-Message-Id of the mail/send request the event's message was sent by, as
+        stored in msg.extra_headers["message_id"] by SendgridBackend.send_messages.
+        """
+        if not self.sg_message_id:
+            return None
+        return self.sg_message_id.split(".", 1)[0]
+
+
+def _iter_chunks(source: Any, chunk_size: int) -> Iterator[bytes]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield bytes(view[start : start + chunk_size])  # noqa: E203
+    else:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _may_be_truncated(error: json.JSONDecodeError, length: int) -> bool:
+    """
+    Whether a decoding error may only be due to the value continuing in the next chunk
+    """
+    return error.pos >= length - 6 or error.msg.startswith("Unterminated string")
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Yields the elements of a JSON array whose UTF-8 encoding is split across `chunks`,
+    keeping no more than the current element and chunk in memory.
+    """
+    chunks = iter(chunks)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    eof = False
+    state = "start"
+
+    def read_more() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            text = utf8.decode(b"", final=True)
+        else:
+            text = utf8.decode(chunk)
+        buf = buf[pos:] + text
+        pos = 0
+        return True
+
+    while True:
+        # The pattern matches the empty string, so never fails
+        pos = _WHITESPACE.match(buf, pos).end()  # type: ignore[union-attr]
+        if pos == len(buf):
+            if read_more():
+                continue
+            if state == "done":
+                return
+            raise ValueError("Unexpected end of webhook events")
+
+        if state == "done":
+            raise ValueError("Unexpected data after webhook events")
+        if state == "start":
+            if buf[pos] != "[":
+                raise ValueError("Webhook events must be a JSON array")
+            pos += 1
+            state = "first"
+        elif state in ("first", "value"):
+            if state == "first" and buf[pos] == "]":
+                pos += 1
+                state = "done"
+                continue
+            try:
+                value, end = _DECODER.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if _may_be_truncated(e, len(buf)) and read_more():
+                    continue
+                raise ValueError("Invalid webhook events: %s" % e) from e
+            # Until a separator follows it, a number may continue in the next chunk
+            if not _SEPARATOR.match(buf, end) and read_more():
+                continue
+            yield value
+            pos = end
+            state = "separator"
+        else:
+            if buf[pos] == ",":
+                state = "value"
+            elif buf[pos] == "]":
+                state = "done"
+            else:
+                raise ValueError("Expected ',' or ']' between webhook events")
+            pos += 1
+
+
+def iter_events(
+    source: Union[bytes, Any], chunk_size: int = EVENT_CHUNK_SIZE
+) -> Iterator[WebhookEvent]:
+    """
+    Yields the events of an event webhook request body, given as bytes or as a readable
+    file-like object (such as the request itself), one at a time.
+    """
+    for data in iter_json_array(_iter_chunks(source, chunk_size)):
+        yield WebhookEvent.from_dict(data)
+
+
+_event_filter: Optional[tuple[tuple, RotatingBloomFilter]] = None
+_event_filter_lock = threading.Lock()
+
+
+def get_event_filter() -> Optional[RotatingBloomFilter]:
+    """
+    Returns the filter of the sg_event_ids event_webhook_view has handled, by which it
+    drops the events Sendgrid delivers again, or None unless
+    SENDGRID_WEBHOOK_DEDUP_CAPACITY is set.
+    """
+    global _event_filter
+    capacity = get_django_setting("SENDGRID_WEBHOOK_DEDUP_CAPACITY")
+    if not capacity:
+        return None
+
+    config = (
+        capacity,
+        get_django_setting("SENDGRID_WEBHOOK_DEDUP_ERROR_RATE", 0.001),
+        get_django_setting("SENDGRID_WEBHOOK_DEDUP_MAX_AGE", 24 * 60 * 60),
+    )
+    with _event_filter_lock:
+        if _event_filter is None or _event_filter[0] != config:
+            _event_filter = (config, RotatingBloomFilter(*config))
+        return _event_filter[1]
+
+
+class EventBatch:
+    """
+    The events of one webhook request.  They are parsed from the request body each time
+    the batch is iterated, so that all of a request's events are never in memory at
+    once; use list(batch) for random access.
+
+    Given an event_filter, events whose sg_event_id it holds, or that repeat an earlier
+    event of the batch, are left out of the batch, and counted in `duplicates`.  The
+    remaining events' ids are only added to the filter by mark_seen(), once they have
+    been handled, so that a request that fails is handled in full when it is retried.
+    """
+
+    def __init__(self, body: bytes, event_filter: Optional[RotatingBloomFilter] = None):
+        self.body = body
+        self.event_filter = event_filter
+        self.duplicates = 0
+        self._len: Optional[int] = None
+        self._duplicate_indexes: set[int] = set()
+        self._new_ids: list[str] = []
+
+    def _scan(self) -> None:
+        if self._len is not None:
+            return
+
+        count = 0
+        duplicate_indexes = set()
+        new_ids = {}  # type: dict[str, None]
+        for index, event in enumerate(iter_events(self.body)):
+            event_id = event.sg_event_id
+            if self.event_filter is not None and event_id is not None:
+                if event_id in new_ids or event_id in self.event_filter:
+                    duplicate_indexes.add(index)
+                    continue
+                new_ids[event_id] = None
+            count += 1
+
+        self._len = count
+        self._duplicate_indexes = duplicate_indexes
+        self._new_ids = list(new_ids)
+        self.duplicates = len(duplicate_indexes)
+
+    def __iter__(self) -> Iterator[WebhookEvent]:
+        self._scan()
+        for index, event in enumerate(iter_events(self.body)):
+            if index not in self._duplicate_indexes:
+                yield event
+
+    def __len__(self) -> int:
+        self._scan()
+        return self._len  # type: ignore[return-value]
+
+    def mark_seen(self) -> None:
+        """
+        Adds the ids of the batch's events to its event_filter
+        """
+        if self.event_filter is not None:
+            self._scan()
+            for event_id in self._new_ids:
+                self.event_filter.add(event_id)
+
+
+@csrf_exempt
+@require_POST
+@verify_webhook_signature
+def event_webhook_view(request):
+    """
+    An event webhook endpoint, which verifies the request's signature and sends
+    sendgrid_events_received with its events.
+    """
+    events = EventBatch(request.body, get_event_filter())
+    try:
+        # Checks the whole body parses before any receiver sees its events
+        len(events)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    if events or not events.duplicates:
+        sendgrid_events_received.send(sender=EventBatch, events=events, request=request)
+    events.mark_seen()
+    return HttpResponse()
@@ -1,20 +1,28 @@
-import base64
-import email.utils
+import asyncio
+import copy
+import hashlib
 import io
+import json
 import logging
 import mimetypes
+import os
 import sys
 import threading
+import time
 import uuid
 import warnings
+import weakref
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.base import MIMEBase
-from typing import TYPE_CHECKING, Optional, Union
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional, Union
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.core.files import File
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
 from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import DEFAULT_ATTACHMENT_MIME_TYPE
 from python_http_client.exceptions import HTTPError
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import (
@@ -33,16 +41,69 @@ from sendgrid.helpers.mail import (
     Substitution,
     TrackingSettings,
 )
-
-from sendgrid_backend.signals import sendgrid_email_sent
+from sendgrid.helpers.mail.validators import ValidateApiKey
+
+from sendgrid_backend.breaker import CircuitOpenError, get_circuit_breaker
+from sendgrid_backend.cache import LRUCache
+from sendgrid_backend.echo import ECHO_FORMATS, EchoWriter, get_echo_writer
+from sendgrid_backend.encoding import BodyEncoder, get_serializer
+from sendgrid_backend.retry import (
+    RETRY_STATUS_CODES,
+    DeadlineExceededError,
+    RetryPolicy,
+)
+from sendgrid_backend.signals import sendgrid_batch_sent, sendgrid_email_sent
+from sendgrid_backend.throttle import DEFAULT_THROTTLE_PATH, Throttle
+from sendgrid_backend.transport import AsyncTransport, ConnectionPool
 from sendgrid_backend.util import (
     SENDGRID_5,
     SENDGRID_6,
+    b64encode_chunks,
     dict_to_personalization,
     get_django_setting,
+    hash_attachment_content,
+    is_v3_personalization,
+    iter_attachment_chunks,
+    parse_email_address,
+    read_attachment_content,
 )
 
-DjangoAttachment = Union[tuple[str, Union[bytes, str], str], MIMEBase]
+# Attachment content may also be a path, a file object or a django File, which are read
+# in chunks when the message is sent
+DjangoAttachment = Union[tuple[str, Any, str], MIMEBase, File]
+
+# The messages covered by a single mail/send request, and its request body (if it has
+# already been built)
+SgRequest = tuple[list[EmailMessage], Optional[dict]]
+
+
+class SendResult(NamedTuple):
+    """
+    The outcome of sending one message, as sent with sendgrid_batch_sent
+    """
+
+    message: EmailMessage
+    # The status code of Sendgrid's response, or of the error the message failed with
+    status: Optional[int]
+    message_id: Optional[str]
+    error: Optional[Exception]
+    # Seconds spent sending the message's request, including any retries
+    latency: float
+    # Whether the message was sent through SENDGRID_CIRCUIT_BREAKER_FALLBACK instead
+    fallback: bool = False
+
+    @property
+    def sent(self) -> bool:
+        # A request that was cancelled has neither a status nor an error
+        return self.fallback or (self.error is None and self.status is not None)
+
+
+# The maximum number of personalizations Sendgrid accepts in a single mail/send request
+MAX_PERSONALIZATIONS = 1000
+
+# The maximum number of to, cc and bcc recipients Sendgrid accepts in a single mail/send
+# request, across all of its personalizations
+MAX_RECIPIENTS = 1000
 
 # Need to change imports because of breaking changes in sendgrid's v6 api
 # https://github.com/sendgrid/sendgrid-python/releases/tag/v6.0.0
@@ -54,6 +115,9 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# Checks message content for Sendgrid API keys, as sendgrid's Content helper does
+API_KEY_VALIDATOR = ValidateApiKey()
+
 
 class SendgridBackend(BaseEmailBackend):
     """
@@ -116,31 +180,302 @@ class SendgridBackend(BaseEmailBackend):
             "SENDGRID_TRACK_CLICKS_PLAIN", True
         )
 
-        # Configure echoing sent email messages to stdout (or another stream)
-        # for debugging purposes.
+        # The serialized mail and tracking settings above, which are added to the
+        # request body of every message that doesn't set its own
+        self._settings_template = self._build_settings_template()
+
+        # Configure the number of worker threads used to dispatch messages
+        # concurrently.  When unset (or 1), messages are sent one at a time.
+        if "max_workers" in kwargs:
+            self.max_workers = kwargs["max_workers"]
+        else:
+            self.max_workers = get_django_setting("SENDGRID_MAX_WORKERS")
+
+        # Configure coalescing of messages that only differ in their recipients (and other
+        # personalization data) into shared requests.
+        if "coalesce_messages" in kwargs:
+            self.coalesce_messages = kwargs["coalesce_messages"]
+        else:
+            self.coalesce_messages = get_django_setting(
+                "SENDGRID_COALESCE_MESSAGES", False
+            )
+
+        # Configure whether sendgrid_email_sent is sent for each message, in addition to
+        # sendgrid_batch_sent for each batch
+        self.per_message_signal = get_django_setting(
+            "SENDGRID_PER_MESSAGE_SIGNAL", True
+        )
+
+        # Configure how long connecting to Sendgrid and each read of its response may take
+        # before a request fails, and the deadline (in seconds from when it is called) by
+        # which send_messages gives up on messages it has not attempted yet.  None of
+        # these are limited unless set.
+        if "connect_timeout" in kwargs:
+            self.connect_timeout = kwargs["connect_timeout"]
+        else:
+            self.connect_timeout = get_django_setting("SENDGRID_CONNECT_TIMEOUT")
+        if "read_timeout" in kwargs:
+            self.read_timeout = kwargs["read_timeout"]
+        else:
+            self.read_timeout = get_django_setting("SENDGRID_READ_TIMEOUT")
+        if "send_deadline" in kwargs:
+            self.send_deadline = kwargs["send_deadline"]
+        else:
+            self.send_deadline = get_django_setting("SENDGRID_SEND_DEADLINE")
+
+        # python_http_client only has a single timeout for connecting and reading
+        timeouts = [
+            t for t in (self.connect_timeout, self.read_timeout) if t is not None
+        ]
+        if timeouts:
+            self.sg.client.timeout = max(timeouts)
+
+        # Configure retries of requests that Sendgrid rejected because of rate limits or
+        # while unavailable.  Requests are not retried unless SENDGRID_MAX_RETRIES is set.
+        self.retry_policy = RetryPolicy(
+            max_retries=get_django_setting("SENDGRID_MAX_RETRIES", 0),
+            backoff=get_django_setting("SENDGRID_RETRY_BACKOFF", 0.5),
+            backoff_max=get_django_setting("SENDGRID_RETRY_BACKOFF_MAX", 30.0),
+            status_codes=get_django_setting(
+                "SENDGRID_RETRY_STATUS_CODES", RETRY_STATUS_CODES
+            ),
+        )
+
+        # Configure the circuit breaker that stops posting requests while Sendgrid is
+        # down, and the email backend (if any) that messages are sent through meanwhile.
+        # The breaker is disabled unless SENDGRID_CIRCUIT_BREAKER_THRESHOLD is set.
+        self.circuit_breaker = get_circuit_breaker(self.sg.host)
+        self.circuit_breaker_fallback = get_django_setting(
+            "SENDGRID_CIRCUIT_BREAKER_FALLBACK"
+        )
+
+        # Configure a client-side throttle, which shares one request budget between all
+        # processes on this host that send with the same API key.
+        self.throttle = None  # type: Optional[Throttle]
+        throttle_rate = get_django_setting("SENDGRID_THROTTLE_RATE")
+        if throttle_rate:
+            self.throttle = Throttle(
+                sg_args["api_key"],
+                throttle_rate,
+                burst=get_django_setting("SENDGRID_THROTTLE_BURST"),
+                max_wait=get_django_setting("SENDGRID_THROTTLE_MAX_WAIT", 10.0),
+                path=get_django_setting(
+                    "SENDGRID_THROTTLE_PATH", DEFAULT_THROTTLE_PATH
+                ),
+            )
+
+        # Configure the pool of keep-alive connections that is set up by open() and torn
+        # down by close().  Pooling is disabled unless a pool size is set.
+        self.pool_size = get_django_setting("SENDGRID_CONNECTION_POOL_SIZE")
+        self.pool_idle_timeout = get_django_setting(
+            "SENDGRID_CONNECTION_IDLE_TIMEOUT", 60
+        )
+        self._pool = None  # type: Optional[ConnectionPool]
+
+        # Configure the cache of encoded attachments, which is shared by all messages sent
+        # through this backend.  Caching is disabled unless a cache size is set.
+        self.attachment_cache = None  # type: Optional[LRUCache]
+        attachment_cache_size = get_django_setting("SENDGRID_ATTACHMENT_CACHE_SIZE")
+        if attachment_cache_size:
+            self.attachment_cache = LRUCache(attachment_cache_size)
+
+        # Configure the number of requests that asend_messages keeps in flight at once
+        if "max_concurrent_requests" in kwargs:
+            self.max_concurrent_requests = kwargs["max_concurrent_requests"]
+        else:
+            self.max_concurrent_requests = get_django_setting(
+                "SENDGRID_MAX_CONCURRENT_REQUESTS", 10
+            )
+        self._async_transport = None  # type: Optional[AsyncTransport]
+
+        # Configure writing request bodies as dicts directly, instead of building a tree
+        # of sendgrid helper objects (requires sendgrid v6+)
+        self.fast_payload_builder = SENDGRID_6 and bool(
+            get_django_setting("SENDGRID_FAST_PAYLOAD_BUILDER", False)
+        )
+
+        # Configure how request bodies are serialized, and gzip compression of large
+        # ones.  python_http_client can only send json.dumps'ed bodies, so when either is
+        # set requests are posted over the backend's own connections (see open()).
+        self.body_encoder = BodyEncoder(
+            get_serializer(get_django_setting("SENDGRID_JSON_SERIALIZER")),
+            compress_min_size=get_django_setting("SENDGRID_COMPRESS_MIN_SIZE"),
+            compress_level=get_django_setting("SENDGRID_COMPRESS_LEVEL", 6),
+        )
+
+        # Configure echoing sent email messages to stdout (or another stream, or a file)
+        # for debugging purposes.  Messages are echoed as MIME by default, or as their
+        # request body ("json") or a line per request ("summary"), which reuse the request
+        # body that is built anyway.  Unless SENDGRID_ECHO_BUFFERED or SENDGRID_ECHO_PATH is
+        # set, senders write to the stream themselves, one at a time.  Writers to a path,
+        # stdout or stderr are shared process-wide; a writer to any other stream is created
+        # when first used and belongs to this backend, which closes it in close().
         self._lock = None  # type: Optional[threading._RLock]
         self.stream = None  # type: Optional[io.TextIOBase]
+        self.echo_writer = None  # type: Optional[EchoWriter]
+        self._echo_writer_options = None  # type: Optional[dict[str, Any]]
+        self._close_echo_writer = None  # type: Optional[weakref.finalize]
+        self.echo_format = get_django_setting("SENDGRID_ECHO_FORMAT", "mime")
+        if self.echo_format not in ECHO_FORMATS:
+            raise ImproperlyConfigured(
+                "SENDGRID_ECHO_FORMAT must be one of {}".format(", ".join(ECHO_FORMATS))
+            )
 
-        if get_django_setting("SENDGRID_ECHO_TO_STDOUT"):
+        echo_path = get_django_setting("SENDGRID_ECHO_PATH")
+        if get_django_setting("SENDGRID_ECHO_TO_STDOUT") or echo_path:
             self._lock = threading.RLock()
             self.stream = kwargs.pop("stream", sys.stdout)
+            if echo_path or get_django_setting("SENDGRID_ECHO_BUFFERED", False):
+                options = {
+                    "max_bytes": get_django_setting("SENDGRID_ECHO_MAX_BYTES"),
+                    "backup_count": get_django_setting("SENDGRID_ECHO_BACKUP_COUNT", 5),
+                    "queue_size": get_django_setting("SENDGRID_ECHO_QUEUE_SIZE", 10000),
+                }
+                if echo_path or self.stream is sys.stdout or self.stream is sys.stderr:
+                    self.echo_writer = get_echo_writer(
+                        self.stream, echo_path, **options
+                    )
+                else:
+                    self._echo_writer_options = options
 
-    @staticmethod
-    def _write_to_stream(stream: io.TextIOBase, message: EmailMessage) -> None:
+    def open(self) -> bool:
         """
-        Internal method used to serialize an email in plaintext to a stream
+        Sets up the pool of keep-alive connections, if one is configured (or request
+        bodies are encoded differently from python_http_client), so that all messages
+        sent until close() is called share warm connections.
+
+        Returns True if a new pool was created.
         """
-        assert stream is not None
+        if self._pool is not None:
+            return False
+        if not self.pool_size and self.body_encoder.is_default:
+            return False
+        self._pool = ConnectionPool(
+            self.sg.host,
+            dict(self.sg.client.request_headers),
+            maxsize=self.pool_size or 1,
+            idle_timeout=self.pool_idle_timeout,
+            timeout=self.read_timeout,
+            encoder=self.body_encoder,
+            connect_timeout=self.connect_timeout,
+        )
+        return True
+
+    def close(self) -> None:
+        self._close_pool()
+        if self._close_echo_writer is not None:
+            # Writes the text the backend's own echo writer still has queued
+            self._close_echo_writer()
+            self._close_echo_writer = None
+            self.echo_writer = None
+
+    def _close_pool(self) -> None:
+        """
+        Closes the pool opened by open(), leaving the echo writer open, as
+        send_messages() does for a pool it opened itself
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def _get_echo_writer(self) -> Optional[EchoWriter]:
+        """
+        Returns the writer that echoed email is queued to, if echoing is buffered,
+        creating the backend's own writer if it has none open.  That writer is closed by
+        close(), or once the backend is garbage collected.
+        """
+        if self.echo_writer is None and self._echo_writer_options is not None:
+            assert self._lock is not None
+            with self._lock:
+                if self.echo_writer is None:
+                    writer = EchoWriter(self.stream, **self._echo_writer_options)
+                    self._close_echo_writer = weakref.finalize(self, writer.close)
+                    self.echo_writer = writer
+        return self.echo_writer
 
+    @staticmethod
+    def _format_message(message: EmailMessage) -> str:
+        """
+        Serializes an email in plaintext, as MIME.  Attachments given as paths, files or
+        file objects (which EmailMessage.message() can't serialize) are read for the
+        echo, except for streams that couldn't be read again to send them.
+        """
+        attachments = [
+            SendgridBackend._format_attachment(attachment)
+            for attachment in message.attachments
+        ]
+        if attachments != message.attachments:
+            message = copy.copy(message)
+            message.attachments = attachments
         msg = message.message()
         msg_data = msg.as_bytes()
         charset = (
             msg.get_charset().get_output_charset() if msg.get_charset() else "utf-8"
         )
-        msg_data = msg_data.decode(charset)
-        stream.write("%s\n" % msg_data)
-        stream.write("-" * 79)
-        stream.write("\n")
+        return "%s\n%s\n" % (msg_data.decode(charset), "-" * 79)
+
+    @staticmethod
+    def _format_attachment(attachment: Any) -> Any:
+        """
+        Returns an attachment whose content EmailMessage.message() can serialize
+        """
+        if isinstance(attachment, MIMEBase):
+            return attachment
+        if isinstance(attachment, File):
+            filename = os.path.basename(attachment.name or "")
+            content = attachment  # type: Any
+            mimetype = None
+        else:
+            filename, content, mimetype = attachment
+            if isinstance(content, (str, bytes)):
+                return attachment
+        mimetype = (
+            mimetype
+            or mimetypes.guess_type(filename)[0]
+            or DEFAULT_ATTACHMENT_MIME_TYPE
+        )
+
+        data = read_attachment_content(content)
+        if data is None:
+            return (
+                filename,
+                "[attachment content not echoed, it can only be read once]",
+                "text/plain",
+            )
+        # As in EmailMessage.attach(), text is decoded, or sent as binary if it can't be
+        if mimetype.startswith("text/"):
+            try:
+                return (filename, data.decode(), mimetype)
+            except UnicodeDecodeError:
+                mimetype = DEFAULT_ATTACHMENT_MIME_TYPE
+        return (filename, data, mimetype)
+
+    @staticmethod
+    def _write_to_stream(stream: io.TextIOBase, message: EmailMessage) -> None:
+        """
+        Internal method used to serialize an email in plaintext to a stream
+        """
+        assert stream is not None
+        stream.write(SendgridBackend._format_message(message))
+
+    def _format_sg_request(self, data: dict) -> str:
+        """
+        Serializes a request body as echoed in the "json" and "summary" echo formats
+        """
+        if self.echo_format == "json":
+            return self.body_encoder.serializer(data).decode("utf-8") + "\n"
+
+        recipients = [
+            recipient["email"]
+            for personalization in data.get("personalizations", [])
+            for field in ("to", "cc", "bcc")
+            for recipient in personalization.get(field, [])
+        ]
+        return "{} -> {}: {}\n".format(
+            data.get("from", {}).get("email"),
+            ", ".join(recipients),
+            data.get("subject", data.get("template_id")),
+        )
 
     def echo_to_output_stream(self, email_messages: Iterable[EmailMessage]) -> None:
         """
@@ -149,7 +484,13 @@ class SendgridBackend(BaseEmailBackend):
         assert self._lock is not None
         assert self.stream is not None
 
-        if not email_messages:
+        if not email_messages or self.echo_format != "mime":
+            # Other formats are echoed by _echo_sg_request once requests are built
+            return
+        echo_writer = self._get_echo_writer()
+        if echo_writer is not None:
+            for message in email_messages:
+                echo_writer.write(self._format_message(message))
             return
         with self._lock:
             try:
@@ -158,7 +499,7 @@ class SendgridBackend(BaseEmailBackend):
                     self._write_to_stream(self.stream, message)
                     self.stream.flush()  # flush after each message
                 if stream_created:
-                    self.close()
+                    self._close_pool()
             except Exception:
                 if not self.fail_silently:
                     raise
@@ -170,38 +511,516 @@ class SendgridBackend(BaseEmailBackend):
 
         This implements django's BaseEmailBackend.send_messages method
         """
-        if self.stream:
-            self.echo_to_output_stream(email_messages)
-        success = 0
+        deadline = self._get_deadline()
+        results = self._new_results()
+        new_conn_created = self.open()
+        try:
+            if self.stream:
+                self.echo_to_output_stream(email_messages)
+
+            requests = self._prepare_sg_requests(email_messages)
+
+            if self.max_workers and self.max_workers > 1:
+                return self._send_concurrently(requests, deadline, results)
+
+            success = 0
+            expired = None
+            for msgs, data in requests:
+                try:
+                    success += self._send_sg_mail(msgs, data, deadline, results)
+                except DeadlineExceededError as e:
+                    # Every message past the deadline is still reported before raising
+                    expired = expired or e
+            if expired is not None:
+                raise expired
+            return success
+        finally:
+            if new_conn_created:
+                self._close_pool()
+            self._send_batch_signal(results)
+
+    def _new_results(self) -> Optional[list[SendResult]]:
+        """
+        Returns the list that the results of a batch are collected in, or None if nothing
+        receives sendgrid_batch_sent
+        """
+        return [] if sendgrid_batch_sent.has_listeners(self.__class__) else None
+
+    def _send_batch_signal(self, results: Optional[list[SendResult]]) -> None:
+        if results:
+            sendgrid_batch_sent.send(sender=self.__class__, results=results)
+
+    def _report_sent(
+        self,
+        msgs: list[EmailMessage],
+        resp: Any,
+        error: Optional[Exception],
+        attempts: int,
+        retry_wait: float,
+        started: float,
+        results: Optional[list[SendResult]],
+        fallback: bool = False,
+    ) -> None:
+        """
+        Sends sendgrid_email_sent for each message of a request (unless
+        per_message_signal is off), and adds their results to `results`.  Messages
+        sent through the fallback backend are reported as sent, with `fallback` set.
+        """
+        fail_flag = resp is None and not fallback
+        if self.per_message_signal:
+            for msg in msgs:
+                sendgrid_email_sent.send(
+                    sender=self.__class__,
+                    message=msg,
+                    fail_flag=fail_flag,
+                    attempts=attempts,
+                    retry_wait=retry_wait,
+                    fallback=fallback,
+                )
+
+        if results is not None:
+            if resp is None:
+                status = getattr(error, "status_code", None)
+                message_id = None
+            else:
+                status = resp.status_code
+                message_id = resp.headers.get("x-message-id", None) or None
+            latency = time.monotonic() - started
+            results.extend(
+                SendResult(msg, status, message_id, error, latency, fallback)
+                for msg in msgs
+            )
+
+    def _echo_sg_request(self, data: dict) -> None:
+        """
+        Echoes a request body in the "json" or "summary" echo formats
+        """
+        if self.stream is None or self.echo_format == "mime":
+            return
+        assert self._lock is not None
+        try:
+            text = self._format_sg_request(data)
+            echo_writer = self._get_echo_writer()
+            if echo_writer is not None:
+                echo_writer.write(text)
+                return
+            with self._lock:
+                self.stream.write(text)
+                self.stream.flush()
+        except Exception:
+            if not self.fail_silently:
+                raise
+
+    def _get_deadline(self) -> Optional[float]:
+        """
+        Returns the time.monotonic() time by which a batch of messages that is being sent
+        now must have been attempted, if send_deadline is set
+        """
+        if self.send_deadline is None:
+            return None
+        return time.monotonic() + self.send_deadline
+
+    @staticmethod
+    def _time_left(deadline: Optional[float]) -> Optional[float]:
+        """
+        Returns the number of seconds until the deadline, which is as long as a request
+        may wait on the throttle
+        """
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    @staticmethod
+    def _check_deadline(
+        deadline: Optional[float], delay: float = 0.0, error: Optional[HTTPError] = None
+    ) -> None:
+        """
+        Raises `error` (or DeadlineExceededError) if a request attempted after `delay`
+        seconds would start after the deadline
+        """
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise error or DeadlineExceededError()
+
+    def _prepare_sg_requests(
+        self, email_messages: Iterable[EmailMessage]
+    ) -> Iterable[SgRequest]:
+        """
+        Splits messages into the (messages, request body) pairs that are posted to Sendgrid.
+
+        Unless coalesce_messages is set, each message is posted on its own and its request
+        body is built lazily when it is sent.
+        """
+        if self.coalesce_messages:
+            return self._coalesce_sg_mail(email_messages)
+        return (([msg], None) for msg in email_messages)
+
+    def _coalesce_sg_mail(
+        self, email_messages: Iterable[EmailMessage]
+    ) -> list[SgRequest]:
+        """
+        Groups messages whose request bodies differ only in their personalizations, so that
+        each group is posted as a single request of at most MAX_PERSONALIZATIONS
+        personalizations and MAX_RECIPIENTS recipients.
+        """
+        requests = []  # type: list[SgRequest]
+        open_requests = {}  # type: dict[str, tuple[list[EmailMessage], dict]]
+        open_recipients = {}  # type: dict[str, int]
         for msg in email_messages:
             data = self._build_sg_mail(msg)
+            personalizations = data.pop("personalizations")
+            recipients = sum(
+                len(personalization.get(field, []))
+                for personalization in personalizations
+                for field in ("to", "cc", "bcc")
+            )
+            key = hashlib.sha256(
+                json.dumps(data, sort_keys=True, default=str).encode()
+            ).hexdigest()
+
+            request = open_requests.get(key)
+            if (
+                request is None
+                or len(request[1]["personalizations"]) + len(personalizations)
+                > MAX_PERSONALIZATIONS
+                or open_recipients[key] + recipients > MAX_RECIPIENTS
+            ):
+                request = ([], {"personalizations": [], **data})
+                open_requests[key] = request
+                open_recipients[key] = 0
+                requests.append(request)
+
+            request[0].append(msg)
+            request[1]["personalizations"].extend(personalizations)
+            open_recipients[key] += recipients
+        return requests
+
+    def _send_concurrently(
+        self,
+        requests: Iterable[SgRequest],
+        deadline: Optional[float] = None,
+        results: Optional[list[SendResult]] = None,
+    ) -> int:
+        """
+        Dispatches requests on a bounded pool of worker threads.
 
-            fail_flag = True
-            try:
-                resp = self.sg.client.mail.send.post(request_body=data)
-                msg.extra_headers["status"] = resp.status_code
-                x_message_id = resp.headers.get("x-message-id", None)
-                if x_message_id:
-                    msg.extra_headers["message_id"] = x_message_id
-                else:
-                    logger.warning("No x_message_id header received from sendgrid api")
-                success += 1
-                fail_flag = False
-            except HTTPError as e:
-                message = getattr(e, "body", None)
-                logger.error(
-                    "Failed to send email, error: {}, response body: {}".format(
-                        e, message
+        If fail_silently is False, the first error (in message order) is re-raised once
+        the requests that are already in flight have completed.  Requests that have not
+        been started yet are not sent, unless the error is DeadlineExceededError, which is
+        only raised once every message has been reported as failed.
+        """
+        requests = list(requests)
+        if not requests:
+            return 0
+
+        # Each request collects its own results, so that they are in message order
+        request_results = [
+            None if results is None else [] for _ in requests
+        ]  # type: list[Optional[list[SendResult]]]
+        max_workers = min(self.max_workers, len(requests))
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(
+                        self._send_sg_mail, msgs, data, deadline, request_result
                     )
-                )
-                if not self.fail_silently:
+                    for (msgs, data), request_result in zip(requests, request_results)
+                ]
+                try:
+                    success = 0
+                    expired = None
+                    for future in futures:
+                        try:
+                            success += future.result()
+                        except DeadlineExceededError as e:
+                            expired = expired or e
+                    if expired is not None:
+                        raise expired
+                    return success
+                except Exception:
+                    for future in futures:
+                        future.cancel()
                     raise
-            finally:
-                sendgrid_email_sent.send(
-                    sender=self.__class__, message=msg, fail_flag=fail_flag
-                )
+        finally:
+            if results is not None:
+                for request_result in request_results:
+                    results.extend(request_result or [])
+
+    def _send_sg_mail(
+        self,
+        msgs: list[EmailMessage],
+        data: Optional[dict] = None,
+        deadline: Optional[float] = None,
+        results: Optional[list[SendResult]] = None,
+    ) -> int:
+        """
+        Posts a single request to Sendgrid and records the response status and message id
+        in the extra_headers of each of its messages.  Requests are neither attempted nor
+        retried once `deadline` (a time.monotonic() time) has passed.  The result of each
+        message is added to `results`, if given.
+
+        Returns the number of messages accepted by Sendgrid.
+        """
+        if data is None:
+            data = self._build_sg_mail(msgs[0])
+        self._echo_sg_request(data)
+
+        resp = None
+        error = None  # type: Optional[Exception]
+        attempts = 0
+        retry_wait = 0.0
+        started = time.monotonic()
+        fallback = False
+        try:
+            self._check_deadline(deadline)
+            while True:
+                attempts += 1
+                try:
+                    if self.throttle is not None:
+                        self.throttle.acquire(self._time_left(deadline))
+                    resp = self._post(data)
+                    break
+                except HTTPError as e:
+                    delay = self.retry_policy.get_delay(e, attempts)
+                    if delay is None or self._should_fall_back(e):
+                        raise
+                    self._check_deadline(deadline, delay, e)
+                    self._log_retry(e, delay)
+                    time.sleep(delay)
+                    retry_wait += delay
+            self._record_response(msgs, resp)
+        except HTTPError as e:
+            error = e
+            if self._should_fall_back(e):
+                sent = self._fall_back(msgs)
+                if sent == len(msgs):
+                    error = None
+                    fallback = True
+                return sent
+            self._log_send_error(e)
+            if not self.fail_silently:
+                raise
+        except Exception as e:
+            resp = None
+            error = e
+            raise
+        finally:
+            self._report_sent(
+                msgs, resp, error, attempts, retry_wait, started, results, fallback
+            )
+        return 0 if resp is None else len(msgs)
+
+    def _should_fall_back(self, e: HTTPError) -> bool:
+        return isinstance(e, CircuitOpenError) and bool(self.circuit_breaker_fallback)
+
+    def _fall_back(self, msgs: list[EmailMessage]) -> int:
+        """
+        Sends messages through the SENDGRID_CIRCUIT_BREAKER_FALLBACK backend while the
+        circuit breaker is open
+        """
+        logger.warning(
+            "Circuit breaker open, sending {} email(s) through {}".format(
+                len(msgs), self.circuit_breaker_fallback
+            )
+        )
+        fallback = get_connection(
+            self.circuit_breaker_fallback, fail_silently=self.fail_silently
+        )
+        return fallback.send_messages(msgs)
+
+    def _post(self, data: dict):
+        """
+        Posts a request body to Sendgrid's mail/send endpoint, through the circuit breaker
+        if one is configured.
+        """
+        if self.circuit_breaker is not None:
+            return self.circuit_breaker.call(self._post_request, data)
+        return self._post_request(data)
+
+    def _post_request(self, data: dict):
+        """
+        Posts a request body over the connection pool if it is open, or else
+        python_http_client
+        """
+        if self._pool is not None:
+            return self._pool.post(data)
+        return self.sg.client.mail.send.post(request_body=data)
+
+    @staticmethod
+    def _record_response(msgs: list[EmailMessage], resp) -> None:
+        """
+        Writes the status code and message id of a successful response to the extra_headers
+        of each message in the request
+        """
+        x_message_id = resp.headers.get("x-message-id", None)
+        if not x_message_id:
+            logger.warning("No x_message_id header received from sendgrid api")
+
+        for msg in msgs:
+            msg.extra_headers["status"] = resp.status_code
+            if x_message_id:
+                msg.extra_headers["message_id"] = x_message_id
+
+    @staticmethod
+    def _log_retry(e: HTTPError, delay: float) -> None:
+        logger.warning(
+            "Failed to send email, error: {}, retrying in {:.2f}s".format(e, delay)
+        )
+
+    @staticmethod
+    def _log_send_error(e: HTTPError) -> None:
+        message = getattr(e, "body", None)
+        logger.error(
+            "Failed to send email, error: {}, response body: {}".format(e, message)
+        )
+
+    async def aopen(self) -> bool:
+        """
+        Opens the non-blocking HTTP transport used by asend_messages.
+
+        Returns True if a new transport was created.
+        """
+        if self._async_transport is not None:
+            return False
+        self._async_transport = AsyncTransport(
+            self.sg.host,
+            dict(self.sg.client.request_headers),
+            timeout=self.read_timeout,
+            pool_size=self.pool_size,
+            idle_timeout=self.pool_idle_timeout,
+            encoder=None if self.body_encoder.is_default else self.body_encoder,
+            connect_timeout=self.connect_timeout,
+        )
+        return True
+
+    async def aclose(self) -> None:
+        if self._async_transport is not None:
+            await self._async_transport.close()
+            self._async_transport = None
+
+    async def __aenter__(self):
+        await self.aopen()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def asend_messages(self, email_messages: Iterable[EmailMessage]) -> int:
+        """
+        Async counterpart of send_messages, which posts messages over a non-blocking
+        HTTP transport instead of tying up a thread for each round-trip.
+
+        At most max_concurrent_requests messages are in flight at the same time.  If
+        fail_silently is False, every message is still attempted and the first error
+        (in message order) is raised afterwards.
+        """
+        email_messages = list(email_messages)
+        if not email_messages:
+            return 0
+
+        if self.stream:
+            self.echo_to_output_stream(email_messages)
+
+        deadline = self._get_deadline()
+        requests = list(self._prepare_sg_requests(email_messages))
+        # Each request collects its own results, so that they are in message order
+        send_results = self._new_results()
+        request_results = [
+            None if send_results is None else [] for _ in requests
+        ]  # type: list[Optional[list[SendResult]]]
+        transport_created = await self.aopen()
+        try:
+            semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            results = await asyncio.gather(
+                *(
+                    self._asend_sg_mail(msgs, data, semaphore, deadline, request_result)
+                    for (msgs, data), request_result in zip(requests, request_results)
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            if transport_created:
+                await self.aclose()
+            if send_results is not None:
+                for request_result in request_results:
+                    send_results.extend(request_result or [])
+            self._send_batch_signal(send_results)
+
+        success = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            success += result
         return success
 
+    async def _asend_sg_mail(
+        self,
+        msgs: list[EmailMessage],
+        data: Optional[dict],
+        semaphore: asyncio.Semaphore,
+        deadline: Optional[float] = None,
+        results: Optional[list[SendResult]] = None,
+    ) -> int:
+        assert self._async_transport is not None
+
+        if data is None:
+            data = self._build_sg_mail(msgs[0])
+        self._echo_sg_request(data)
+
+        resp = None
+        error = None  # type: Optional[Exception]
+        attempts = 0
+        retry_wait = 0.0
+        started = time.monotonic()
+        fallback = False
+        try:
+            while True:
+                try:
+                    async with semaphore:
+                        # Checked once the request's turn comes, rather than when queued
+                        if attempts == 0:
+                            self._check_deadline(deadline)
+                        attempts += 1
+                        if self.throttle is not None:
+                            await self.throttle.aacquire(self._time_left(deadline))
+                        resp = await self._apost(data)
+                    break
+                except HTTPError as e:
+                    delay = self.retry_policy.get_delay(e, attempts)
+                    if delay is None or self._should_fall_back(e):
+                        raise
+                    self._check_deadline(deadline, delay, e)
+                    self._log_retry(e, delay)
+                    await asyncio.sleep(delay)
+                    retry_wait += delay
+            self._record_response(msgs, resp)
+        except HTTPError as e:
+            error = e
+            if self._should_fall_back(e):
+                loop = asyncio.get_running_loop()
+                sent = await loop.run_in_executor(None, self._fall_back, msgs)
+                if sent == len(msgs):
+                    error = None
+                    fallback = True
+                return sent
+            self._log_send_error(e)
+            if not self.fail_silently:
+                raise
+        except Exception as e:
+            resp = None
+            error = e
+            raise
+        finally:
+            self._report_sent(
+                msgs, resp, error, attempts, retry_wait, started, results, fallback
+            )
+        return 0 if resp is None else len(msgs)
+
+    async def _apost(self, data: dict):
+        assert self._async_transport is not None
+        if self.circuit_breaker is not None:
+            return await self.circuit_breaker.acall(self._async_transport.post, data)
+        return await self._async_transport.post(data)
+
     def _create_sg_attachment(self, django_attch: DjangoAttachment) -> Attachment:
         """
         Handles the conversion between a django attachment object and a sendgrid attachment object.
@@ -250,28 +1069,59 @@ class SendgridBackend(BaseEmailBackend):
                 sg_attch.disposition = "inline"
 
         else:
-            filename, content, mimetype = django_attch
+            if isinstance(django_attch, File):
+                filename = os.path.basename(django_attch.name or "")
+                content = django_attch  # type: Any
+                mimetype = (
+                    mimetypes.guess_type(filename)[0] or DEFAULT_ATTACHMENT_MIME_TYPE
+                )
+            else:
+                filename, content, mimetype = django_attch
+
+            # Reuse the encoded attachment if identical content was already attached
+            # (under the same filename and mimetype) to an earlier message
+            cache = self.attachment_cache
+            cache_key = None
+            if cache is not None:
+                digest = hash_attachment_content(content)
+                if digest is not None:
+                    cache_key = (digest, filename, mimetype)
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        return cached
 
             set_prop(sg_attch, "filename", filename)
-
-            # todo: Read content if stream?
-
-            if isinstance(content, str):
-                content = content.encode()
-
-            set_prop(sg_attch, "content", base64.b64encode(content).decode())
+            set_prop(
+                sg_attch, "content", b64encode_chunks(iter_attachment_chunks(content))
+            )
             set_prop(sg_attch, "type", mimetype)
 
+            if cache is not None and cache_key is not None:
+                cache.set(cache_key, sg_attch)
+
         return sg_attch
 
     def _parse_email_address(self, address: str) -> tuple[str, Optional[str]]:
         """
         Returns a tuple of (addr, name) from an address string
         """
-        name, addr = email.utils.parseaddr(address)  # type: Optional[str], str
-        if not name:
-            name = None
-        return addr, name
+        return parse_email_address(address)
+
+    def _parse_email_addresses(
+        self, addresses: Iterable[str]
+    ) -> list[tuple[str, Optional[str]]]:
+        """
+        Returns a list of (addr, name) tuples from a list of address strings, each parsed
+        by _parse_email_address
+        """
+        parse = self._parse_email_address
+        return [parse(address) for address in addresses]
+
+    def _sg_recipients(self, addresses: Iterable[str]) -> list[Email]:
+        """
+        Returns a sendgrid Email for each of a list of address strings
+        """
+        return [Email(*parsed) for parsed in self._parse_email_addresses(addresses)]
 
     def _build_sg_personalization(
         self,
@@ -279,6 +1129,8 @@ class SendgridBackend(BaseEmailBackend):
         extra_headers: Iterable[Header],
         to: Optional[list[str]] = None,
         existing_personalizations: Optional[Personalization] = None,
+        ccs: Optional[list[Email]] = None,
+        bccs: Optional[list[Email]] = None,
     ) -> Personalization:
         """
         Constructs a Sendgrid Personalization instance / row for the given recipients.
@@ -292,6 +1144,8 @@ class SendgridBackend(BaseEmailBackend):
             to: The email addresses for the given personalization.
             existing_personalizations: Personalization data, eg. dynamic_template_data or substitutions.
                 A given value should have key equivalent to the corresponding EmailMessage attr
+            ccs: msg.cc as sendgrid Emails, when already parsed for another personalization.
+            bccs: msg.bcc as sendgrid Emails, when already parsed for another personalization.
 
 
         Returns:
@@ -305,8 +1159,8 @@ class SendgridBackend(BaseEmailBackend):
                 )
 
             personalization = Personalization()
-            for addr in to:
-                personalization.add_to(Email(*self._parse_email_address(addr)))
+            for recipient in self._sg_recipients(to):
+                personalization.add_to(recipient)
 
         elif existing_personalizations.tos:
             personalization = existing_personalizations
@@ -314,12 +1168,16 @@ class SendgridBackend(BaseEmailBackend):
             raise ValueError("Each msg personalization must have recipients")
 
         if not personalization.ccs:
-            for addr in msg.cc:
-                personalization.add_cc(Email(*self._parse_email_address(addr)))
+            if ccs is None:
+                ccs = self._sg_recipients(msg.cc)
+            for cc in ccs:
+                personalization.add_cc(cc)
 
         if not personalization.bccs:
-            for addr in msg.bcc:
-                personalization.add_bcc(Email(*self._parse_email_address(addr)))
+            if bccs is None:
+                bccs = self._sg_recipients(msg.bcc)
+            for bcc in bccs:
+                personalization.add_bcc(bcc)
 
         if not personalization.custom_args:
             for k, v in getattr(msg, "custom_args", {}).items():
@@ -374,6 +1232,14 @@ class SendgridBackend(BaseEmailBackend):
 
         Returns a Dict of mail data to be consumed by the sendgrid api.
         """
+        if self.fast_payload_builder:
+            return self._build_sg_mail_fast(msg)
+        return self._build_sg_mail_from_helpers(msg)
+
+    def _build_sg_mail_from_helpers(self, msg: EmailMessage) -> dict:
+        """
+        Builds the JSON representation of a message out of sendgrid's helper objects.
+        """
         mail = Mail()
 
         mail.from_email = Email(*self._parse_email_address(msg.from_email))
@@ -473,12 +1339,17 @@ class SendgridBackend(BaseEmailBackend):
                     )
                 )
         elif getattr(msg, "make_private", False):
+            # cc and bcc are the same for every recipient, so are only parsed once
+            ccs = self._sg_recipients(msg.cc)
+            bccs = self._sg_recipients(msg.bcc)
             for to in msg.to:
                 mail.add_personalization(
                     self._build_sg_personalization(
                         msg,
                         personalization_headers,
                         to=[to],
+                        ccs=ccs,
+                        bccs=bccs,
                     )
                 )
         else:
@@ -512,18 +1383,43 @@ class SendgridBackend(BaseEmailBackend):
 
         # Add sandbox mode to mail settings
         mail_settings = getattr(msg, "mail_settings", None)
-        if not isinstance(mail_settings, MailSettings):
-            mail_settings = MailSettings()
-
-        mail_settings.sandbox_mode = SandBoxMode(self.sandbox_mode)
-
-        mail.mail_settings = mail_settings
+        if isinstance(mail_settings, MailSettings):
+            mail.mail_settings = self._apply_mail_settings(mail_settings)
 
         # Handle email tracking
         tracking_settings = getattr(msg, "tracking_settings", None)
-        if not isinstance(tracking_settings, TrackingSettings):
-            tracking_settings = TrackingSettings()
+        if isinstance(tracking_settings, TrackingSettings):
+            mail.tracking_settings = self._apply_tracking_settings(tracking_settings)
+
+        data = mail.get()
+
+        # Messages without their own settings get the backend's precomputed ones,
+        # placed where Mail.get() would have put them
+        for key in ("mail_settings", "tracking_settings"):
+            settings_data = data.pop(key, None)
+            if settings_data is None:
+                settings_data = self._get_settings_template(key)
+            data[key] = settings_data
+        for key in ("reply_to", "reply_to_list"):
+            if key in data:
+                data[key] = data.pop(key)
+
+        return data
+
+    def _apply_mail_settings(self, mail_settings: MailSettings) -> MailSettings:
+        """
+        Sets the backend's sandbox mode on a message's own MailSettings
+        """
+        mail_settings.sandbox_mode = SandBoxMode(self.sandbox_mode)
+        return mail_settings
 
+    def _apply_tracking_settings(
+        self, tracking_settings: TrackingSettings
+    ) -> TrackingSettings:
+        """
+        Fills in the backend's open and click tracking on a message's own
+        TrackingSettings, where the message doesn't configure them
+        """
         if tracking_settings.open_tracking is None:
             tracking_settings.open_tracking = OpenTracking(self.track_email)
 
@@ -531,10 +1427,403 @@ class SendgridBackend(BaseEmailBackend):
             tracking_settings.click_tracking = ClickTracking(
                 self.track_clicks_html, self.track_clicks_plain
             )
+        return tracking_settings
 
-        mail.tracking_settings = tracking_settings
+    def _build_settings_template(self) -> dict[str, dict]:
+        """
+        Serializes the mail and tracking settings that the backend applies to every
+        message without settings of its own.  Built once, when the backend is created.
+        """
+        return {
+            "mail_settings": self._apply_mail_settings(MailSettings()).get(),
+            "tracking_settings": self._apply_tracking_settings(
+                TrackingSettings()
+            ).get(),
+        }
+
+    def _get_settings_template(self, key: str) -> dict:
+        """
+        Returns a copy of the precomputed "mail_settings" or "tracking_settings", so
+        that changes to one request body don't leak into the next.
+        """
+        return {
+            name: dict(value) if isinstance(value, dict) else value
+            for name, value in self._settings_template[key].items()
+        }
+
+    @staticmethod
+    def _sg_email(addr: Optional[str], name: Optional[str] = None) -> dict:
+        """
+        Returns the same dict as sendgrid's Email(addr, name).get()
+        """
+        if addr and not name:
+            addr, name = parse_email_address(addr)
+            if "@" not in addr:
+                name, addr = addr or None, None
+            addr = addr or None
+
+        sg_email = {}
+        if name is not None:
+            sg_email["name"] = name
+        if addr is not None:
+            sg_email["email"] = addr
+        return sg_email
 
-        return mail.get()
+    @staticmethod
+    def _sg_content(mime_type: str, value: Optional[str]) -> dict:
+        """
+        Returns the same dict as sendgrid's Content(mime_type, value).get()
+        """
+        if value is None:
+            return {"type": mime_type}
+        API_KEY_VALIDATOR.validate_message_text(value)
+        return {"type": mime_type, "value": value}
+
+    @staticmethod
+    def _unique_recipients(recipients: list[dict]) -> list[dict]:
+        """
+        Drops recipients whose email already appears (case-insensitively), like sendgrid's
+        Personalization does
+        """
+        seen = set()
+        unique = []
+        for recipient in recipients:
+            addr = recipient["email"].lower()
+            if addr not in seen:
+                seen.add(addr)
+                unique.append(recipient)
+        return unique
+
+    def _build_sg_personalization_fast(
+        self, msg: EmailMessage, headers: Optional[dict], to: list[str]
+    ) -> dict:
+        """
+        Returns the same dict as _build_sg_personalization(msg, ..., to=to).get(), without
+        building sendgrid helper objects.
+        """
+        if not to:
+            raise ValueError(
+                "Either msg.to or msg.personalizations (with recipients) must be set"
+            )
+
+        sg_email = self._sg_email
+        parse = self._parse_email_addresses
+        personalization = {}  # type: dict[str, Any]
+
+        tos = self._unique_recipients([sg_email(*parsed) for parsed in parse(to)])
+        if tos:
+            personalization["to"] = tos
+        ccs = self._unique_recipients([sg_email(*parsed) for parsed in parse(msg.cc)])
+        if ccs:
+            personalization["cc"] = ccs
+        bccs = self._unique_recipients([sg_email(*parsed) for parsed in parse(msg.bcc)])
+        if bccs:
+            personalization["bcc"] = bccs
+
+        if self._is_transaction_template(msg) and msg.subject:
+            logger.warning(
+                "Message subject is ignored in transactional template, "
+                "please add it as template variable (e.g. {{ subject }}"
+            )
+        if msg.subject:
+            personalization["subject"] = msg.subject
+
+        if hasattr(msg, "send_at"):
+            if not isinstance(msg.send_at, int):
+                raise ValueError(
+                    "send_at must be an integer, got: {}; "
+                    "see https://sendgrid.com/docs/API_Reference/SMTP_API/scheduling_parameters.html#-Send-At".format(
+                        type(msg.send_at)
+                    )
+                )
+            if msg.send_at:
+                personalization["send_at"] = msg.send_at
+
+        substitutions = None
+        if hasattr(msg, "template_id"):
+            dtd = getattr(msg, "dynamic_template_data", None)
+            if dtd:
+                if not isinstance(dtd, dict):
+                    dtd = dtd.get()
+                personalization["dynamic_template_data"] = dtd
+            substitutions = getattr(msg, "substitutions", None)
+
+        if headers is not None:
+            personalization["headers"] = headers
+        if substitutions:
+            personalization["substitutions"] = {
+                k: v for k, v in substitutions.items() if v is not None
+            }
+        custom_args = getattr(msg, "custom_args", None)
+        if custom_args:
+            personalization["custom_args"] = {
+                k: v for k, v in custom_args.items() if v is not None
+            }
+
+        return personalization
+
+    def _build_sg_personalization_from_dict(
+        self, msg: EmailMessage, headers: Optional[dict], data: dict
+    ) -> dict:
+        """
+        Fills in a well-formed v3 personalization dict (see is_v3_personalization) from
+        msg the way _build_sg_personalization fills in an existing Personalization, but
+        without converting it to and from sendgrid helper objects.
+        """
+        sg_email = self._sg_email
+        parse = self._parse_email_addresses
+        personalization = {}  # type: dict[str, Any]
+
+        personalization["to"] = self._unique_recipients(data["to"])
+        ccs = self._unique_recipients(data.get("cc", []))
+        if not ccs:
+            ccs = self._unique_recipients(
+                [sg_email(*parsed) for parsed in parse(msg.cc)]
+            )
+        if ccs:
+            personalization["cc"] = ccs
+        bccs = self._unique_recipients(data.get("bcc", []))
+        if not bccs:
+            bccs = self._unique_recipients(
+                [sg_email(*parsed) for parsed in parse(msg.bcc)]
+            )
+        if bccs:
+            personalization["bcc"] = bccs
+
+        subject = data.get("subject")
+        if self._is_transaction_template(msg) and (subject or msg.subject):
+            logger.warning(
+                "Message subject is ignored in transactional template, "
+                "please add it as template variable (e.g. {{ subject }}"
+            )
+        subject = subject or msg.subject
+        if subject:
+            personalization["subject"] = subject
+
+        send_at = data.get("send_at")
+        if hasattr(msg, "send_at"):
+            if not isinstance(msg.send_at, int):
+                raise ValueError(
+                    "send_at must be an integer, got: {}; "
+                    "see https://sendgrid.com/docs/API_Reference/SMTP_API/scheduling_parameters.html#-Send-At".format(
+                        type(msg.send_at)
+                    )
+                )
+            send_at = msg.send_at
+        if send_at:
+            personalization["send_at"] = send_at
+
+        dtd = data.get("dynamic_template_data")
+        substitutions = data.get("substitutions")
+        if hasattr(msg, "template_id"):
+            dtd = dtd or getattr(msg, "dynamic_template_data", None)
+            if dtd and not isinstance(dtd, dict):
+                dtd = dtd.get()
+            if not substitutions:
+                substitutions = {
+                    k: v
+                    for k, v in getattr(msg, "substitutions", {}).items()
+                    if v is not None
+                }
+        if dtd:
+            personalization["dynamic_template_data"] = dtd
+
+        if data.get("headers") or headers is not None:
+            personalization["headers"] = {**data.get("headers", {}), **(headers or {})}
+        if substitutions:
+            personalization["substitutions"] = substitutions
+        custom_args = data.get("custom_args") or {
+            k: v for k, v in getattr(msg, "custom_args", {}).items() if v is not None
+        }
+        if custom_args:
+            personalization["custom_args"] = custom_args
+
+        return personalization
+
+    def _build_sg_mail_fast(self, msg: EmailMessage) -> dict:
+        """
+        Writes the JSON representation of a message directly, producing the same dict as
+        _build_sg_mail_from_helpers without building a tree of sendgrid helper objects.
+        Only supported with sendgrid v6+.
+        """
+        sg_email = self._sg_email
+        parse = self._parse_email_address
+
+        from_email = sg_email(*parse(msg.from_email))
+
+        reply_to = None
+        headers = None  # type: Optional[dict]
+        for k, v in msg.extra_headers.items():
+            if k.lower() == "reply-to":
+                reply_to = sg_email(v)
+            else:
+                if headers is None:
+                    headers = {}
+                if v is not None:
+                    headers[k] = v
+
+        ip_pool_name = None
+        if hasattr(msg, "ip_pool_name"):
+            if not isinstance(msg.ip_pool_name, str):
+                raise ValueError(
+                    "ip_pool_name must be a str, got: {}; ".format(
+                        type(msg.ip_pool_name)
+                    )
+                )
+            if not 2 <= len(msg.ip_pool_name) <= 64:
+                raise ValueError(
+                    "the number of characters of ip_pool_name must be min 2 and max 64, got: {}; "
+                    "see https://sendgrid.com/docs/API_Reference/Web_API_v3/Mail/"
+                    "index.html#-Request-Body-Parameters".format(len(msg.ip_pool_name))
+                )
+            ip_pool_name = msg.ip_pool_name
+
+        if hasattr(msg, "reply_to") and msg.reply_to:
+            if reply_to:
+                # If this code path is triggered, the reply_to was set in a header above
+                other = sg_email(*parse(msg.reply_to[0]))
+                if other.get("email") != reply_to.get("email") or other.get(
+                    "name"
+                ) != reply_to.get("name"):
+                    raise ValueError(
+                        "Sendgrid only allows 1 email in the reply-to field.  "
+                        + "Reply-To header value != reply_to property value."
+                    )
+
+            if not isinstance(msg.reply_to, str):
+                if len(msg.reply_to) > 1:
+                    raise ValueError(
+                        "Sendgrid only allows 1 email in the reply-to field"
+                    )
+                reply_to = sg_email(*parse(msg.reply_to[0]))
+            else:
+                reply_to = sg_email(*parse(msg.reply_to))
+
+        # Sendgrid's helpers insert attachments, personalizations and categories at the
+        # front of their lists, so they are reversed here to match
+        attachments = [
+            self._create_sg_attachment(attch).get()
+            for attch in reversed(msg.attachments)
+        ]
+
+        is_transaction_template = self._is_transaction_template(msg)
+        if is_transaction_template:
+            if msg.body:
+                logger.warning("Message body is ignored in transactional template")
+        else:
+            msg.body = " " if msg.body == "" else msg.body
+
+        subject = None
+        contents = []
+        if not is_transaction_template:
+            subject = msg.subject
+            if isinstance(msg, EmailMultiAlternatives):
+                contents.append(self._sg_content("text/plain", msg.body))
+                for alt in msg.alternatives:
+                    if alt[1] == "text/html":
+                        contents.append(self._sg_content(alt[1], alt[0]))
+            elif msg.content_subtype == "html":
+                contents.append(self._sg_content("text/plain", " "))
+                contents.append(self._sg_content("text/html", msg.body))
+            else:
+                contents.append(self._sg_content("text/plain", msg.body))
+
+        if hasattr(msg, "personalizations"):
+            personalization_headers = [
+                Header(k, v)
+                for k, v in msg.extra_headers.items()
+                if k.lower() != "reply-to"
+            ]
+            personalizations = []
+            for personalization in msg.personalizations:
+                if is_v3_personalization(personalization):
+                    personalizations.append(
+                        self._build_sg_personalization_from_dict(
+                            msg, headers, personalization
+                        )
+                    )
+                    continue
+                if isinstance(personalization, dict):
+                    personalization = dict_to_personalization(personalization)
+
+                assert isinstance(personalization, Personalization)
+
+                personalizations.append(
+                    self._build_sg_personalization(
+                        msg,
+                        personalization_headers,
+                        existing_personalizations=personalization,
+                    ).get()
+                )
+            personalizations.reverse()
+        elif getattr(msg, "make_private", False):
+            personalizations = [
+                self._build_sg_personalization_fast(msg, headers, to=[to])
+                for to in reversed(msg.to)
+            ]
+        else:
+            personalizations = [
+                self._build_sg_personalization_fast(msg, headers, to=msg.to)
+            ]
+
+        reply_to_list = None
+        if hasattr(msg, "reply_to_list"):
+            reply_to_list = []
+            for e in msg.reply_to_list:
+                reply_to_list.append(sg_email(*parse(e)))
+                if not isinstance(reply_to_list[-1].get("email"), str):
+                    raise ValueError(
+                        "You must provide an email for each entry in a reply_to_list"
+                    )
+
+        categories = None
+        if hasattr(msg, "categories"):
+            categories = list(reversed(msg.categories))
+
+        asm = None
+        if hasattr(msg, "asm"):
+            if "group_id" not in msg.asm:
+                raise KeyError("group_id not found in asm")
+
+            if "groups_to_display" in msg.asm:
+                asm = ASM(msg.asm["group_id"], msg.asm["groups_to_display"]).get()
+            else:
+                asm = ASM(msg.asm["group_id"]).get()
+
+        mail_settings = getattr(msg, "mail_settings", None)
+        if isinstance(mail_settings, MailSettings):
+            mail_settings_data = self._apply_mail_settings(mail_settings).get()
+        else:
+            mail_settings_data = self._get_settings_template("mail_settings")
+
+        tracking_settings = getattr(msg, "tracking_settings", None)
+        if isinstance(tracking_settings, TrackingSettings):
+            tracking_settings_data = self._apply_tracking_settings(
+                tracking_settings
+            ).get()
+        else:
+            tracking_settings_data = self._get_settings_template("tracking_settings")
+
+        mail = {
+            "from": from_email,
+            "subject": subject,
+            "personalizations": personalizations,
+            "content": contents,
+            "attachments": attachments,
+            "template_id": getattr(msg, "template_id", None),
+            "categories": categories,
+            "asm": asm,
+            "ip_pool_name": ip_pool_name,
+            "mail_settings": mail_settings_data,
+            "tracking_settings": tracking_settings_data,
+            "reply_to": reply_to,
+            "reply_to_list": reply_to_list,
+        }
+        return {
+            key: value
+            for key, value in mail.items()
+            if value is not None and value != [] and value != {}
+        }
 
     def _is_transaction_template(self, msg: EmailMessage) -> bool:
         return SENDGRID_6 and hasattr(msg, "template_id")
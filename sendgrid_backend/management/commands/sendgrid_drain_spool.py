@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.spool import drain_spool, get_spool
+from sendgrid_backend.util import get_django_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Posts the mail spooled by sendgrid_backend.spool.SpoolBackend to Sendgrid, "
+        "polling the spool for new mail until interrupted, or until it is empty with "
+        "--once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no spooled requests are due, instead of polling",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls of the spool (default: 1)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=get_django_setting("SENDGRID_SPOOL_BATCH_SIZE", 100),
+            help="Number of requests claimed from the spool at a time",
+        )
+        parser.add_argument(
+            "--lease",
+            type=float,
+            default=60.0,
+            help="Seconds after which requests claimed by a drain that died are "
+            "posted again (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        spool = get_spool()
+        backend = SendgridBackend()
+
+        try:
+            while True:
+                sent, failed = drain_spool(
+                    backend,
+                    spool,
+                    batch_size=options["batch_size"],
+                    lease=options["lease"],
+                )
+                if sent or failed:
+                    self.stdout.write(
+                        "Sent {} messages, {} failed".format(sent, failed)
+                    )
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            spool.close()
@@ -0,0 +1,106 @@
+import email.utils
+import random
+import time
+from collections.abc import Iterable
+from typing import Optional
+
+from python_http_client.exceptions import HTTPError
+
+# Responses that mean Sendgrid turned the request away without queuing its mail, so it
+# is safe to post again.  A 500, 502 or 504 may come back after the mail was queued, so
+# retrying them can deliver it twice; they are only retried if added to
+# SENDGRID_RETRY_STATUS_CODES.
+RETRY_STATUS_CODES = (429, 503)
+
+
+class DeadlineExceededError(HTTPError):
+    """
+    Raised for a message that was not sent because the backend's send deadline passed
+    before it could be attempted (or retried).
+
+    Like a 408 response, it is not retried.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*(args or (408, "Send deadline exceeded", b"", {})))
+
+
+class RetryPolicy:
+    """
+    Decides whether (and after how long) a failed mail/send request is retried.
+
+    Waits follow a "full jitter" exponential backoff of backoff * 2 ** (attempt - 1)
+    seconds, capped at backoff_max.  When Sendgrid says when to come back, through the
+    Retry-After or X-RateLimit-Reset response headers, that wait is used instead; if it
+    exceeds backoff_max, the request is not retried rather than blocking the caller.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 0,
+        backoff: float = 0.5,
+        backoff_max: float = 30.0,
+        status_codes: Iterable[int] = RETRY_STATUS_CODES,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.status_codes = frozenset(status_codes)
+
+    def get_delay(self, error: HTTPError, attempt: int) -> Optional[float]:
+        """
+        Returns the number of seconds to wait before retrying a request whose attempt
+        number `attempt` failed with `error`, or None if it should not be retried.
+        """
+        if attempt > self.max_retries or isinstance(error, DeadlineExceededError):
+            return None
+        if getattr(error, "status_code", None) not in self.status_codes:
+            return None
+
+        delay = self._get_header_delay(getattr(error, "headers", None))
+        if delay is None:
+            return self.get_backoff(attempt)
+
+        delay += random.uniform(0, self.backoff)
+        if delay > self.backoff_max:
+            return None
+        return delay
+
+    def get_backoff(self, attempt: int) -> float:
+        """
+        Returns a jittered exponential backoff for the retry of attempt number `attempt`
+        """
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+        )
+
+    @staticmethod
+    def _get_header_delay(headers) -> Optional[float]:
+        """
+        Returns the wait requested by the Retry-After (seconds or an HTTP date) or
+        X-RateLimit-Reset (unix timestamp) headers of a response, if any.
+        """
+        if not headers:
+            return None
+
+        retry_after = headers.get("Retry-After") or headers.get("retry-after")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                retry_at = email.utils.parsedate_to_datetime(retry_after).timestamp()
+            except (TypeError, ValueError):
+                pass
+            else:
+                return max(0.0, retry_at - time.time())
+
+        reset = headers.get("X-RateLimit-Reset") or headers.get("x-ratelimit-reset")
+        if reset:
+            try:
+                return max(0.0, float(reset) - time.time())
+            except ValueError:
+                pass
+
+        return None
@@ -1,3 +1,18 @@
 import django.dispatch
 
+# Sent by SendgridBackend for each message it attempts to send, with the message, its
+# fail_flag, attempts, retry_wait and whether it was sent through the circuit breaker's
+# fallback backend, unless SENDGRID_PER_MESSAGE_SIGNAL is False
 sendgrid_email_sent = django.dispatch.Signal()
+
+# Sent once per send_messages (or asend_messages) call, with the results of its messages
+# (a list of sendgrid_backend.mail.SendResult records)
+sendgrid_batch_sent = django.dispatch.Signal()
+
+# Sent once per event webhook request by sendgrid_backend.events.event_webhook_view, with
+# the request and its events (an EventBatch of WebhookEvent records)
+sendgrid_events_received = django.dispatch.Signal()
+
+# Sent by sendgrid_backend.breaker.CircuitBreaker when it opens, becomes half-open or
+# closes, with the breaker and its old_state and new_state
+sendgrid_circuit_breaker_state_changed = django.dispatch.Signal()
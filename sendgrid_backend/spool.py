@@ -0,0 +1,303 @@
+import asyncio
+import http.client
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from typing import NamedTuple, Optional
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMessage
+from python_http_client.exceptions import HTTPError
+
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.retry import RETRY_STATUS_CODES, RetryPolicy
+from sendgrid_backend.util import get_django_setting
+
+logger = logging.getLogger(__name__)
+
+
+class SpooledRequest(NamedTuple):
+    id: int
+    body: bytes
+    messages: int
+    attempts: int
+    # When the lease on the request runs out, as a time.time() time
+    available: float
+
+
+class Spool:
+    """
+    A durable queue of mail/send request bodies, kept in a SQLite database that any
+    number of processes on the host can add to and drain.
+
+    Requests are claimed for `lease` seconds at a time, and are only removed once they
+    have been posted, so requests claimed by a process that died are claimed again once
+    their lease runs out: every request is posted at least once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS requests ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, body BLOB NOT NULL, "
+                "messages INTEGER NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "available REAL NOT NULL, failed INTEGER NOT NULL DEFAULT 0, "
+                "error TEXT)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        return self._connect().execute(sql, tuple(params))
+
+    def put(self, requests: Iterable[tuple[bytes, int]]) -> None:
+        """
+        Adds (request body, number of messages) pairs to the spool, in one transaction
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO requests (body, messages, available) VALUES (?, ?, ?)",
+                ((body, messages, now) for body, messages in requests),
+            )
+
+    def claim(self, limit: int, lease: float = 60.0) -> list[SpooledRequest]:
+        """
+        Claims up to `limit` of the oldest requests that are due, for `lease` seconds
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, body, messages, attempts + 1 FROM requests "
+                "WHERE NOT failed AND available <= ? ORDER BY id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE requests SET attempts = attempts + 1, available = ? "
+                "WHERE id = ?",
+                ((now + lease, row[0]) for row in rows),
+            )
+        return [
+            SpooledRequest(id, body, messages, attempts, now + lease)
+            for id, body, messages, attempts in rows
+        ]
+
+    def ack(self, ids: Iterable[int]) -> None:
+        """
+        Removes requests that were posted
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM requests WHERE id = ?", ((i,) for i in ids))
+
+    def renew(
+        self, request: SpooledRequest, lease: float = 60.0
+    ) -> Optional[SpooledRequest]:
+        """
+        Extends the lease on a claimed request to `lease` seconds from now, unless it was
+        claimed again since (once its lease ran out), in which case None is returned
+        """
+        available = time.time() + lease
+        cursor = self._execute(
+            "UPDATE requests SET available = ? WHERE id = ? AND available = ?",
+            (available, request.id, request.available),
+        )
+        if not cursor.rowcount:
+            return None
+        return request._replace(available=available)
+
+    def retry(self, id: int, delay: float) -> None:
+        """
+        Makes a claimed request due again in `delay` seconds
+        """
+        self._execute(
+            "UPDATE requests SET available = ? WHERE id = ?", (time.time() + delay, id)
+        )
+
+    def fail(self, id: int, error: str) -> None:
+        """
+        Keeps a request that can't be posted in the spool, but stops claiming it
+        """
+        self._execute(
+            "UPDATE requests SET failed = 1, error = ? WHERE id = ?", (error, id)
+        )
+
+    def pending(self) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM requests WHERE NOT failed"
+        ).fetchone()[0]
+
+    def failed(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM requests WHERE failed").fetchone()[0]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def get_spool() -> Spool:
+    """
+    Returns the Spool at SENDGRID_SPOOL_PATH, which has no default: spooled mail must be
+    kept somewhere that survives a reboot, which the system temp directory may not.
+    """
+    path = get_django_setting("SENDGRID_SPOOL_PATH")
+    if not path:
+        raise ImproperlyConfigured(
+            "settings.py must contain a value for SENDGRID_SPOOL_PATH to spool email."
+        )
+    return Spool(path)
+
+
+class SpoolBackend(SendgridBackend):
+    """
+    An email backend that writes the request bodies of messages to the Spool at
+    SENDGRID_SPOOL_PATH instead of posting them, so that sending mail never waits on
+    Sendgrid, and spooled mail survives the process.  Spooled requests are posted by
+    drain_spool, usually through the sendgrid_drain_spool management command.
+
+    Messages are counted as sent once they are spooled.  Their extra_headers get no
+    status or message id, and sendgrid_email_sent is not sent for them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spool = get_spool()
+
+    def open(self) -> bool:
+        return False
+
+    async def asend_messages(self, email_messages: Iterable[EmailMessage]) -> int:
+        # Spooled in the default executor, since writing to the spool waits on its lock
+        # (for as long as its busy timeout) and on fsync
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.send_messages, email_messages)
+
+    def send_messages(self, email_messages: Iterable[EmailMessage]) -> int:
+        email_messages = list(email_messages)
+        if self.stream:
+            self.echo_to_output_stream(email_messages)
+
+        requests = []
+        for msgs, data in self._prepare_sg_requests(email_messages):
+            if data is None:
+                data = self._build_sg_mail(msgs[0])
+            self._echo_sg_request(data)
+            requests.append((self.body_encoder.serializer(data), len(msgs)))
+
+        try:
+            self.spool.put(requests)
+        except sqlite3.Error:
+            logger.exception("Failed to spool email")
+            if not self.fail_silently:
+                raise
+            return 0
+        return sum(messages for _, messages in requests)
+
+
+def get_spool_retry_policy() -> RetryPolicy:
+    """
+    The policy by which drain_spool retries requests: far more patiently than
+    SendgridBackend, since nobody is waiting on them.
+    """
+    return RetryPolicy(
+        max_retries=get_django_setting("SENDGRID_SPOOL_MAX_RETRIES", 10),
+        backoff=get_django_setting("SENDGRID_SPOOL_RETRY_BACKOFF", 5.0),
+        backoff_max=get_django_setting("SENDGRID_SPOOL_RETRY_BACKOFF_MAX", 3600.0),
+        status_codes=get_django_setting(
+            "SENDGRID_RETRY_STATUS_CODES", RETRY_STATUS_CODES
+        ),
+    )
+
+
+def drain_spool(
+    backend: SendgridBackend,
+    spool: Spool,
+    batch_size: int = 100,
+    lease: float = 60.0,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> tuple[int, int]:
+    """
+    Posts the spooled requests that are due, `batch_size` at a time, until there are
+    none left.  Requests that fail with a rate limit, unavailable or connection error
+    (or another of SENDGRID_RETRY_STATUS_CODES) are retried later, by retry_policy;
+    those that fail otherwise, or too many times, are marked as failed.
+
+    Each request is removed from the spool as soon as it is posted, so a drain that is
+    interrupted only re-sends the request it was posting.  Before a request is posted,
+    its lease is renewed if half of it has run out, and it is skipped if another drain
+    claimed it once it ran out (e.g. while this one waited on the throttle).
+
+    Returns the numbers of messages that were sent and that failed.
+    """
+    if retry_policy is None:
+        retry_policy = get_spool_retry_policy()
+
+    sent = failed = 0
+    with backend:
+        while True:
+            requests = spool.claim(batch_size, lease)
+            if not requests:
+                return sent, failed
+
+            for request in requests:
+                try:
+                    if backend.throttle is not None:
+                        backend.throttle.acquire()
+                    if time.time() >= request.available - lease / 2:
+                        renewed = spool.renew(request, lease)
+                        if renewed is None:
+                            # Another drain claimed it once its lease ran out
+                            continue
+                        request = renewed
+                    backend._post(json.loads(request.body))
+                except HTTPError as e:
+                    delay = retry_policy.get_delay(e, request.attempts)
+                    error = "{}, response body: {}".format(e, getattr(e, "body", None))
+                except (OSError, http.client.HTTPException) as e:
+                    # The request may or may not have reached Sendgrid, so it is retried
+                    # like an unavailable error, at the risk of sending it twice
+                    delay = None
+                    if request.attempts <= retry_policy.max_retries:
+                        delay = retry_policy.get_backoff(request.attempts)
+                    error = "{}: {}".format(type(e).__name__, e)
+                except (TypeError, ValueError) as e:
+                    # The body can't be decoded, or encoded by the backend's serializer,
+                    # which won't change by trying again
+                    delay = None
+                    error = "Invalid spooled request: {}: {}".format(
+                        type(e).__name__, e
+                    )
+                else:
+                    spool.ack([request.id])
+                    sent += request.messages
+                    continue
+
+                if delay is None:
+                    logger.error("Failed to send spooled email, error: %s", error)
+                    spool.fail(request.id, error)
+                    failed += request.messages
+                else:
+                    logger.warning(
+                        "Failed to send spooled email, error: %s, retrying in %.2fs",
+                        error,
+                        delay,
+                    )
+                    spool.retry(request.id, delay)
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from python_http_client.exceptions import TooManyRequestsError
+
+DEFAULT_THROTTLE_PATH = os.path.join(
+    tempfile.gettempdir(), "sendgrid_backend_throttle.sqlite3"
+)
+
+
+class ThrottledError(TooManyRequestsError):
+    """
+    Raised when the client-side throttle has no request budget left within max_wait.
+
+    Subclasses the error Sendgrid itself returns for rate-limited requests, so that it is
+    handled (and retried) the same way.
+    """
+
+
+class Throttle:
+    """
+    A token bucket allowing `rate` requests per second (with bursts of up to `burst`
+    requests), whose state is kept in a SQLite database so that every process on the host
+    that uses the same path and API key draws from one shared request budget.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        rate: float,
+        burst: Optional[float] = None,
+        max_wait: float = 10.0,
+        path: str = DEFAULT_THROTTLE_PATH,
+    ):
+        # Buckets are keyed by a hash of the API key, since rate limits are per account
+        # and the key itself should not be written to disk.
+        self.name = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        self.rate = rate
+        self.burst = burst or rate
+        self.max_wait = max_wait
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token from the bucket if one is available.
+
+        Returns 0 if a token was taken, or else the number of seconds until one will be.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def _check_wait(
+        self, wait: float, waited: float, max_wait: Optional[float]
+    ) -> None:
+        if max_wait is None or max_wait > self.max_wait:
+            max_wait = self.max_wait
+        if waited + wait > max_wait:
+            raise ThrottledError(
+                429,
+                "Client-side throttle exceeded",
+                b"",
+                {"Retry-After": "{:.3f}".format(wait)},
+            )
+
+    def acquire(self, max_wait: Optional[float] = None) -> float:
+        """
+        Blocks until a token is taken, for at most max_wait seconds (or the throttle's
+        max_wait, if that is less).
+
+        Returns the number of seconds spent waiting, or raises ThrottledError.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return waited
+            self._check_wait(wait, waited, max_wait)
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, max_wait: Optional[float] = None) -> float:
+        """
+        Async counterpart of acquire, which waits without blocking the event loop.
+
+        Tokens are taken in the default executor, since the database may be locked by
+        other processes for as long as its busy timeout.
+        """
+        loop = asyncio.get_running_loop()
+        waited = 0.0
+        while True:
+            wait = await loop.run_in_executor(None, self.try_acquire)
+            if not wait:
+                return waited
+            self._check_wait(wait, waited, max_wait)
+            await asyncio.sleep(wait)
+            waited += wait
@@ -0,0 +1,253 @@
+import base64
+import http.client
+import queue
+import time
+import urllib.request
+from typing import Any, Optional
+from urllib.parse import SplitResult, unquote, urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+from python_http_client.exceptions import HTTPError, err_dict
+
+from sendgrid_backend.encoding import BodyEncoder
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore
+
+
+def raise_for_status(status_code: int, reason: str, body: bytes, headers: Any) -> None:
+    """
+    Raises the python_http_client exception matching an error response, so that callers
+    can handle responses from any transport the same way as those from SendGridAPIClient.
+    """
+    if status_code >= 400:
+        raise err_dict.get(status_code, HTTPError)(status_code, reason, body, headers)
+
+
+def get_proxy(url: SplitResult) -> Optional[SplitResult]:
+    """
+    Returns the proxy that requests to url are sent through, taken from the environment
+    (HTTPS_PROXY, HTTP_PROXY and NO_PROXY) as urllib, and so python_http_client, does.
+    """
+    proxy = urllib.request.getproxies().get(url.scheme)
+    if not proxy or urllib.request.proxy_bypass(url.hostname or ""):
+        return None
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    return urlsplit(proxy)
+
+
+class Response:
+    """
+    Mirrors python_http_client's Response for responses read from a pooled connection
+    """
+
+    def __init__(self, status_code: int, body: bytes, headers: http.client.HTTPMessage):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of persistent (keep-alive) connections to the Sendgrid API, used in
+    place of python_http_client, which opens a new connection for every request.
+
+    At most maxsize idle connections are kept open, and connections that have been idle
+    for longer than idle_timeout seconds are discarded instead of being reused.  When more
+    than maxsize requests are in flight, extra connections are opened and closed once
+    their request completes.
+
+    Like python_http_client, requests go through the proxy set by the HTTPS_PROXY or
+    HTTP_PROXY environment variables unless NO_PROXY excludes the host.
+
+    New connections must be established within connect_timeout seconds (which defaults
+    to timeout), after which each read may block for up to timeout seconds.
+
+    Request bodies are encoded by `encoder`, which defaults to serializing them with
+    json.dumps like python_http_client.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        headers: dict[str, str],
+        maxsize: int = 10,
+        idle_timeout: Optional[float] = 60.0,
+        timeout: Optional[float] = None,
+        encoder: Optional[BodyEncoder] = None,
+        connect_timeout: Optional[float] = None,
+    ):
+        url = urlsplit(host)
+        if url.scheme == "http":
+            self.connection_class = http.client.HTTPConnection  # type: type
+        else:
+            self.connection_class = http.client.HTTPSConnection
+        self.netloc = url.netloc
+        self.path = f"{url.path.rstrip('/')}/v3/mail/send"
+        self.headers = {**headers, "Content-Type": "application/json"}
+        # The host and headers of the CONNECT tunnel opened through an HTTPS proxy
+        self.tunnel = None  # type: Optional[tuple[str, dict[str, str]]]
+
+        proxy = get_proxy(url)
+        if proxy is not None:
+            proxy_headers = {}
+            if proxy.username is not None:
+                credentials = (
+                    f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+                )
+                proxy_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(
+                    credentials.encode()
+                ).decode("ascii")
+            self.netloc = proxy.netloc.rpartition("@")[2]
+            if url.scheme == "http":
+                # Plain HTTP requests are sent to the proxy with the full URL
+                self.path = f"http://{url.netloc}{self.path}"
+                self.headers.update(proxy_headers)
+            else:
+                self.tunnel = (url.netloc, proxy_headers)
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connect_timeout = timeout if connect_timeout is None else connect_timeout
+        self.encoder = encoder or BodyEncoder()
+        self._idle = queue.LifoQueue(
+            maxsize
+        )  # type: queue.LifoQueue[tuple[http.client.HTTPConnection, float]]
+
+    def _get_connection(self) -> tuple[http.client.HTTPConnection, bool]:
+        """
+        Returns an idle connection (or a new one if none is available), and whether the
+        connection is being reused.
+        """
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new_connection(), False
+            if self.idle_timeout is None or (
+                time.monotonic() - last_used < self.idle_timeout
+            ):
+                return conn, True
+            conn.close()
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        conn = self.connection_class(self.netloc, timeout=self.connect_timeout)
+        if self.tunnel is not None:
+            conn.set_tunnel(self.tunnel[0], headers=self.tunnel[1])
+        conn.connect()
+        # Once connected, reads time out after timeout rather than connect_timeout
+        conn.sock.settimeout(self.timeout)
+        return conn
+
+    def _put_connection(self, conn: http.client.HTTPConnection) -> None:
+        try:
+            self._idle.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            conn.close()
+
+    def _read_response(self, conn: http.client.HTTPConnection) -> Response:
+        resp = conn.getresponse()
+        response = Response(resp.status, resp.read(), resp.headers)
+        if resp.will_close:
+            conn.close()
+        else:
+            self._put_connection(conn)
+        raise_for_status(response.status_code, resp.reason, response.body, resp.headers)
+        return response
+
+    def post(self, request_body: dict) -> Response:
+        body, body_headers = self.encoder.encode(request_body)
+        headers = {**self.headers, **body_headers}
+        conn, reused = self._get_connection()
+        sent = False
+        try:
+            try:
+                conn.request("POST", self.path, body=body, headers=headers)
+                sent = True
+                return self._read_response(conn)
+            except ConnectionError as e:
+                # A reused connection may have been closed by the server while it was
+                # idle, in which case writing the request fails, or the server hangs up
+                # without sending a byte of response (RemoteDisconnected).  Either way
+                # the request wasn't processed and is safe to send on a new connection.
+                # Failures after that may come once Sendgrid has accepted the request,
+                # so they are raised rather than risk sending it twice.
+                if not reused or (
+                    sent and not isinstance(e, http.client.RemoteDisconnected)
+                ):
+                    raise
+                conn.close()
+                conn = self._new_connection()
+                conn.request("POST", self.path, body=body, headers=headers)
+                return self._read_response(conn)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+
+class AsyncTransport:
+    """
+    Posts mail/send requests over a non-blocking httpx.AsyncClient.
+
+    Requires the optional httpx package (pip install django-sendgrid-v5[async]).  When
+    pool_size is set, it bounds the number of keep-alive connections, which are expired
+    after idle_timeout seconds.  Connections must be established within connect_timeout
+    seconds, if set, and otherwise within timeout.  Request bodies are encoded by
+    `encoder` if it is given, and otherwise by httpx.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        headers: dict[str, str],
+        timeout: Optional[float] = None,
+        pool_size: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        encoder: Optional[BodyEncoder] = None,
+        connect_timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        if httpx is None:
+            raise ImproperlyConfigured(
+                "The httpx package is required to send email asynchronously.  "
+                + "Install it with `pip install django-sendgrid-v5[async]`."
+            )
+
+        if pool_size:
+            kwargs["limits"] = httpx.Limits(
+                max_keepalive_connections=pool_size, keepalive_expiry=idle_timeout
+            )
+
+        client_timeout = httpx.Timeout(timeout)
+        if connect_timeout is not None:
+            client_timeout = httpx.Timeout(timeout, connect=connect_timeout)
+
+        self.url = f"{host}/v3/mail/send"
+        self.encoder = encoder
+        self.client = httpx.AsyncClient(
+            headers=headers, timeout=client_timeout, **kwargs
+        )
+
+    async def post(self, request_body: dict) -> "httpx.Response":
+        if self.encoder is None:
+            resp = await self.client.post(self.url, json=request_body)
+        else:
+            body, headers = self.encoder.encode(request_body)
+            resp = await self.client.post(self.url, content=body, headers=headers)
+        raise_for_status(
+            resp.status_code, resp.reason_phrase, resp.content, resp.headers
+        )
+        return resp
+
+    async def close(self) -> None:
+        await self.client.aclose()
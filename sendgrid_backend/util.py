@@ -1,7 +1,15 @@
-from typing import Any
+import base64
+import email.utils
+import functools
+import hashlib
+import io
+import os
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional, Union
 
 import sendgrid
 from django.conf import settings
+from django.core.files import File
 from sendgrid.helpers.mail import Personalization
 
 SENDGRID_VERSION = sendgrid.__version__
@@ -9,6 +17,14 @@ SENDGRID_VERSION = sendgrid.__version__
 SENDGRID_5 = SENDGRID_VERSION < "6"
 SENDGRID_6 = SENDGRID_VERSION >= "6"
 
+# Attachments are read and base64-encoded in chunks of this many bytes.  It is a
+# multiple of 3, so that each chunk encodes to base64 without padding.
+ATTACHMENT_CHUNK_SIZE = 3 * 64 * 1024
+
+# The number of distinct address strings whose parsed form is kept by
+# parse_email_address
+ADDRESS_CACHE_SIZE = 4096
+
 
 def get_django_setting(setting_str, default=None):
     """
@@ -19,6 +35,43 @@ def get_django_setting(setting_str, default=None):
     return default
 
 
+@functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def parse_email_address(address: str) -> tuple[str, Optional[str]]:
+    """
+    Returns a tuple of (addr, name) from an address string.
+
+    Results are memoized, since the same cc, bcc, from and reply-to addresses tend to
+    be parsed over and over (once per recipient of a make_private message, and once per
+    message of a batch); see parse_email_address.cache_info() for hit rates.
+    """
+    name, addr = email.utils.parseaddr(address)
+    return addr, name or None
+
+
+# Personalization's properties, each with the key of Personalization.get()'s output
+# that it is read from
+PERSONALIZATION_PROPERTIES = tuple(
+    (attr, attr[:-1] if attr in ("tos", "ccs", "bccs") else attr)
+    for attr in dir(Personalization)
+    if isinstance(getattr(Personalization, attr), property)
+)
+
+# The keys of a v3 personalization that is_v3_personalization accepts
+V3_PERSONALIZATION_KEYS = frozenset(
+    [
+        "to",
+        "cc",
+        "bcc",
+        "subject",
+        "send_at",
+        "dynamic_template_data",
+        "headers",
+        "substitutions",
+        "custom_args",
+    ]
+)
+
+
 def dict_to_personalization(data: dict[Any, Any]) -> Personalization:
     """
     Reverses Sendgrid's Personalization.get() method to create a Personalization
@@ -26,17 +79,7 @@ def dict_to_personalization(data: dict[Any, Any]) -> Personalization:
     """
     personalization = Personalization()
 
-    properties = [
-        p
-        for p in dir(Personalization)
-        if isinstance(getattr(Personalization, p), property)
-    ]
-    for attr in properties:
-        if attr in ["tos", "ccs", "bccs"]:
-            key = attr[:-1]  # this searches the data for ["to", "cc", "bcc"]
-        else:
-            key = attr
-
+    for attr, key in PERSONALIZATION_PROPERTIES:
         value = data.get(key, None)
 
         if value:
@@ -44,3 +87,156 @@ def dict_to_personalization(data: dict[Any, Any]) -> Personalization:
             getattr(personalization, attr)
 
     return personalization
+
+
+def _is_v3_recipients(value: Any) -> bool:
+    return isinstance(value, list) and all(
+        isinstance(recipient, dict)
+        and isinstance(recipient.get("email"), str)
+        and isinstance(recipient.get("name", ""), str)
+        and recipient.keys() <= {"email", "name"}
+        for recipient in value
+    )
+
+
+def _is_str_dict(value: Any) -> bool:
+    return isinstance(value, dict) and all(
+        isinstance(k, str) and isinstance(v, str) for k, v in value.items()
+    )
+
+
+def is_v3_personalization(data: Any) -> bool:
+    """
+    Returns True if data is already a well-formed personalization, as Sendgrid's v3 API
+    expects it, which can be sent as is rather than through dict_to_personalization.
+    """
+    if not isinstance(data, dict) or not data.keys() <= V3_PERSONALIZATION_KEYS:
+        return False
+    if not data.get("to") or not _is_v3_recipients(data["to"]):
+        return False
+    for key in ("cc", "bcc"):
+        if key in data and not _is_v3_recipients(data[key]):
+            return False
+    for key in ("headers", "substitutions", "custom_args"):
+        if key in data and not _is_str_dict(data[key]):
+            return False
+    if "dynamic_template_data" in data and not isinstance(
+        data["dynamic_template_data"], dict
+    ):
+        return False
+    if "subject" in data and not isinstance(data["subject"], str):
+        return False
+    if "send_at" in data and not isinstance(data["send_at"], int):
+        return False
+    return True
+
+
+def iter_attachment_chunks(
+    content: Any, chunk_size: int = ATTACHMENT_CHUNK_SIZE
+) -> Iterator[Union[bytes, memoryview, str]]:
+    """
+    Yields the content of an attachment in chunks, without reading it into memory all at
+    once.  Accepts bytes, str, paths, file objects and django File (or FieldFile) objects.
+    """
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        view = memoryview(content)
+        for start in range(0, len(view), chunk_size):
+            yield view[start : start + chunk_size]  # noqa: E203
+    elif isinstance(content, str):
+        for start in range(0, len(content), chunk_size):
+            yield content[start : start + chunk_size]  # noqa: E203
+    elif isinstance(content, os.PathLike):
+        with open(content, "rb") as f:
+            yield from iter(lambda: f.read(chunk_size), b"")
+    elif isinstance(content, File):
+        opened = content.closed
+        if opened:
+            content.open("rb")
+        try:
+            yield from content.chunks(chunk_size)
+        finally:
+            if opened:
+                content.close()
+    elif hasattr(content, "read"):
+        while True:
+            chunk = content.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        raise TypeError("Unsupported attachment content type: {}".format(type(content)))
+
+
+def b64encode_chunks(chunks: Iterable[Union[bytes, memoryview, str]]) -> str:
+    """
+    Base64-encodes a stream of chunks (str chunks are utf-8 encoded) into a single str,
+    holding no more than one chunk of the unencoded content in memory at a time.
+    """
+    encoded = []
+    remainder = b""
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if remainder:
+            chunk = remainder + bytes(chunk)
+        # Only encode whole 3-byte groups, so that no padding ends up mid-stream
+        cut = len(chunk) - len(chunk) % 3
+        encoded.append(base64.b64encode(chunk[:cut]).decode("ascii"))
+        remainder = bytes(chunk[cut:])
+    encoded.append(base64.b64encode(remainder).decode("ascii"))
+    return "".join(encoded)
+
+
+def hash_attachment_content(content: Any) -> Optional[str]:
+    """
+    Returns a digest of an attachment's content, or None if the content is a stream that
+    cannot be read again afterwards.
+    """
+    position = None
+    if not isinstance(content, (os.PathLike, File)) and hasattr(content, "read"):
+        position = _rewind_position(content)
+        if position is None:
+            return None
+
+    digest = hashlib.sha256()
+    for chunk in iter_attachment_chunks(content):
+        digest.update(chunk.encode() if isinstance(chunk, str) else chunk)
+
+    if position is not None:
+        content.seek(position)
+    return digest.hexdigest()
+
+
+def read_attachment_content(content: Any) -> Optional[bytes]:
+    """
+    Reads an attachment's content into bytes (str content is utf-8 encoded), or returns
+    None if the content is a stream that cannot be read again afterwards.
+    """
+    position = None
+    if not isinstance(content, (os.PathLike, File)) and hasattr(content, "read"):
+        position = _rewind_position(content)
+        if position is None:
+            return None
+
+    data = b"".join(
+        chunk.encode() if isinstance(chunk, str) else bytes(chunk)
+        for chunk in iter_attachment_chunks(content)
+    )
+
+    if position is not None:
+        content.seek(position)
+    return data
+
+
+def _rewind_position(stream: Any) -> Optional[int]:
+    """
+    Returns the position of a stream to seek back to once it has been read, or None if
+    it can't be
+    """
+    try:
+        position = stream.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    if not getattr(stream, "seekable", lambda: True)():
+        return None
+    return position
@@ -1,3 +1,7 @@
+import django
 from django.conf import settings
 
-settings.configure()
+settings.configure(
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+)
+django.setup()
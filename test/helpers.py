@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock
+
+from django.core.mail import EmailMessage
+
+from benchmarks.fake_server import FakeSendgridServer, decode  # noqa: F401
+from sendgrid_backend.mail import SendgridBackend
+
+
+def make_message(
+    to="John Doe <john.doe@example.com>",
+    subject="Hello, World!",
+    body="Hello, World!",
+    **kwargs,
+):
+    return EmailMessage(
+        subject=subject,
+        body=body,
+        from_email="Sam Smith <sam.smith@example.com>",
+        to=[to],
+        **kwargs,
+    )
+
+
+def make_messages(count):
+    return [make_message(f"recipient{i}@example.com") for i in range(count)]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def connect_receiver(test_case, signal, receiver):
+    """
+    Connects receiver to signal until test_case finishes
+    """
+    signal.connect(receiver, weak=False, dispatch_uid="test")
+    test_case.addCleanup(signal.disconnect, dispatch_uid="test")
+
+
+def mock_backend(side_effect=None, message_id="abc", **kwargs):
+    """
+    Returns a SendgridBackend whose requests are posted to a mock, which calls
+    side_effect if it is given, and otherwise accepts them with `message_id`
+    """
+    backend = SendgridBackend(api_key="stub", **kwargs)
+    backend.sg = MagicMock()
+    post = backend.sg.client.mail.send.post
+    post.return_value = MagicMock(status_code=202, headers={"x-message-id": message_id})
+    post.side_effect = side_effect
+    return backend
+
+
+def start_fake_sendgrid(test_case, **kwargs):
+    """
+    Starts a FakeSendgridServer, which is stopped once test_case finishes
+    """
+    server = FakeSendgridServer(**kwargs).__enter__()
+    test_case.addCleanup(server.__exit__)
+    return server
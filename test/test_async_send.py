@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import httpx
+from django.test.testcases import SimpleTestCase
+from python_http_client.exceptions import BadRequestsError
+
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.signals import sendgrid_email_sent
+from sendgrid_backend.transport import AsyncTransport
+
+from .helpers import connect_receiver, make_messages
+
+
+class TestAsyncSend(SimpleTestCase):
+    def setUp(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.signals = []
+
+        def receiver(sender, message, fail_flag, **kwargs):
+            self.signals.append((message, fail_flag))
+
+        connect_receiver(self, sendgrid_email_sent, receiver)
+
+    async def handler(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        data = json.loads(request.content)
+        to = data["personalizations"][0]["to"][0]["email"]
+        if to == "recipient3@example.com":
+            return httpx.Response(400, json={"errors": []})
+        return httpx.Response(202, headers={"X-Message-Id": to})
+
+    def make_backend(self, **kwargs):
+        backend = SendgridBackend(api_key="stub", **kwargs)
+        backend._async_transport = AsyncTransport(
+            backend.sg.host,
+            dict(backend.sg.client.request_headers),
+            transport=httpx.MockTransport(self.handler),
+        )
+        return backend
+
+    async def test_asend_messages(self):
+        backend = self.make_backend(max_concurrent_requests=4, fail_silently=True)
+        msgs = make_messages(20)
+
+        self.assertEqual(await backend.asend_messages(msgs), 19)
+        self.assertEqual(self.max_in_flight, 4)
+        self.assertEqual(len(self.signals), 20)
+        self.assertEqual(
+            [msg.to[0] for msg, fail_flag in self.signals if fail_flag],
+            ["recipient3@example.com"],
+        )
+        self.assertEqual(msgs[0].extra_headers["status"], 202)
+        self.assertEqual(msgs[0].extra_headers["message_id"], msgs[0].to[0])
+        self.assertNotIn("status", msgs[3].extra_headers)
+
+    async def test_asend_messages_raises(self):
+        backend = self.make_backend()
+
+        with self.assertRaises(BadRequestsError):
+            await backend.asend_messages(make_messages(5))
+        self.assertEqual(len(self.signals), 5)
+
+    async def test_aopen_aclose(self):
+        backend = SendgridBackend(api_key="stub")
+
+        async with backend:
+            self.assertIsInstance(backend._async_transport, AsyncTransport)
+            self.assertEqual(
+                backend._async_transport.url, "https://api.sendgrid.com/v3/mail/send"
+            )
+            self.assertFalse(await backend.aopen())
+        self.assertIsNone(backend._async_transport)
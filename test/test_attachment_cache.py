@@ -0,0 +1,87 @@
+import io
+
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+
+from sendgrid_backend.cache import LRUCache
+from sendgrid_backend.mail import SendgridBackend
+
+from .helpers import make_message
+
+
+def with_attachments(*attachments):
+    msg = make_message()
+    msg.attachments.extend(attachments)
+    return msg
+
+
+class TestLRUCache(SimpleTestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+
+class TestAttachmentCache(SimpleTestCase):
+    def setUp(self):
+        with override_settings(SENDGRID_ATTACHMENT_CACHE_SIZE=8):
+            self.backend = SendgridBackend(api_key="stub")
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(SendgridBackend(api_key="stub").attachment_cache)
+
+    def test_cache_hits(self):
+        logo = ("logo.png", b"\x89PNG" * 100, "image/png")
+        terms = ("terms.txt", "Terms and conditions", "text/plain")
+
+        first = self.backend._build_sg_mail(with_attachments(logo, terms))
+        second = self.backend._build_sg_mail(with_attachments(logo, terms))
+        self.assertEqual(first["attachments"], second["attachments"])
+
+        cache = self.backend.attachment_cache
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+        # The same content under another filename or mimetype is a different attachment
+        self.backend._build_sg_mail(with_attachments(("logo2.png",) + logo[1:]))
+        self.backend._build_sg_mail(with_attachments(logo[:2] + ("image/x-png",)))
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_file_objects(self):
+        f = io.BytesIO(b"some content")
+        result = self.backend._build_sg_mail(
+            with_attachments(("file.txt", f, "text/plain"))
+        )
+        self.assertEqual(result["attachments"][0]["content"], "c29tZSBjb250ZW50")
+
+        f.seek(0)
+        self.backend._build_sg_mail(with_attachments(("file.txt", f, "text/plain")))
+        cache = self.backend.attachment_cache
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_unseekable_streams_not_cached(self):
+        class Stream(io.RawIOBase):
+            def __init__(self, data):
+                self.data = io.BytesIO(data)
+
+            def readable(self):
+                return True
+
+            def readinto(self, b):
+                return self.data.readinto(b)
+
+        result = self.backend._build_sg_mail(
+            with_attachments(("file.txt", Stream(b"some content"), "text/plain"))
+        )
+        self.assertEqual(result["attachments"][0]["content"], "c29tZSBjb250ZW50")
+        self.assertEqual(len(self.backend.attachment_cache), 0)
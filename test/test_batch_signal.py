@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock
+
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+from python_http_client.exceptions import BadRequestsError
+
+from sendgrid_backend.mail import SendgridBackend, SendResult
+from sendgrid_backend.signals import sendgrid_batch_sent, sendgrid_email_sent
+
+from .helpers import connect_receiver, make_message, mock_backend
+
+
+def response(message_id):
+    return MagicMock(status_code=202, headers={"x-message-id": message_id})
+
+
+def post_by_recipient(request_body, **kwargs):
+    # Fails messages to bad.address@example.com, so results don't depend on the order
+    # in which concurrent requests are posted
+    emails = [
+        recipient["email"]
+        for personalization in request_body["personalizations"]
+        for recipient in personalization["to"]
+    ]
+    if "bad.address@example.com" in emails:
+        raise BadRequestsError(400, "Bad Request", b"", {})
+    return response("id-" + emails[0])
+
+
+class TestBatchSignal(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+        self.sent = []
+
+        def batch_receiver(sender, results, **kwargs):
+            self.batches.append(results)
+
+        def receiver(sender, message, fail_flag, **kwargs):
+            self.sent.append(fail_flag)
+
+        connect_receiver(self, sendgrid_batch_sent, batch_receiver)
+        connect_receiver(self, sendgrid_email_sent, receiver)
+
+        self.msgs = [
+            make_message("a@example.com"),
+            make_message("bad.address@example.com"),
+            make_message("c@example.com"),
+        ]
+
+    def backend(self, **kwargs):
+        return mock_backend(post_by_recipient, **kwargs)
+
+    def assertResults(self, results, msgs=None):
+        msgs = self.msgs if msgs is None else msgs
+        self.assertEqual([r.message for r in results], msgs)
+        self.assertEqual(
+            [(r.status, r.message_id, r.sent) for r in results],
+            [
+                (202, "id-a@example.com", True),
+                (400, None, False),
+                (202, "id-c@example.com", True),
+            ][: len(msgs)],
+        )
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error, BadRequestsError)
+        for result in results:
+            self.assertGreaterEqual(result.latency, 0)
+
+    def test_batch_signal(self):
+        backend = self.backend(fail_silently=True)
+        self.assertEqual(backend.send_messages(self.msgs), 2)
+
+        (results,) = self.batches
+        self.assertResults(results)
+        self.assertIsInstance(results[0], SendResult)
+        # The per-message signal is still sent by default
+        self.assertEqual(self.sent, [False, True, False])
+
+    def test_per_message_signal_off(self):
+        with override_settings(SENDGRID_PER_MESSAGE_SIGNAL=False):
+            backend = self.backend(fail_silently=True)
+        backend.send_messages(self.msgs)
+
+        self.assertEqual(self.sent, [])
+        self.assertEqual(len(self.batches), 1)
+
+    def test_sent_on_error(self):
+        with self.assertRaises(BadRequestsError):
+            self.backend().send_messages(self.msgs)
+        (results,) = self.batches
+        self.assertResults(results, self.msgs[:2])
+
+    def test_concurrent(self):
+        self.backend(fail_silently=True, max_workers=3).send_messages(self.msgs)
+        (results,) = self.batches
+        self.assertResults(results)
+
+    def test_coalesced(self):
+        msgs = [make_message("a@example.com"), make_message("b@example.com")]
+        self.backend(coalesce_messages=True).send_messages(msgs)
+        (results,) = self.batches
+        self.assertEqual([r.message for r in results], msgs)
+        self.assertEqual({r.message_id for r in results}, {"id-a@example.com"})
+
+    def test_no_receivers(self):
+        sendgrid_batch_sent.disconnect(dispatch_uid="test")
+        backend = self.backend(fail_silently=True)
+        self.assertIsNone(backend._new_results())
+        self.assertEqual(backend.send_messages(self.msgs), 2)
+
+    async def test_async(self):
+        async def post(request_body):
+            return post_by_recipient(request_body)
+
+        backend = SendgridBackend(api_key="stub", fail_silently=True)
+        backend._async_transport = MagicMock(post=post)
+        self.assertEqual(await backend.asend_messages(self.msgs), 2)
+
+        (results,) = self.batches
+        self.assertResults(results)
@@ -0,0 +1,36 @@
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+
+from django.test.testcases import SimpleTestCase
+
+from benchmarks.__main__ import main
+from benchmarks.cases import BENCHMARKS
+from sendgrid_backend.mail import SendgridBackend
+
+
+class TestBenchmarks(SimpleTestCase):
+    def test_run_and_save_baseline(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        baseline = os.path.join(tmpdir.name, "baseline.json")
+        args = ["-n", "1", "--warmup", "0", "-k", "[plain]", "--baseline", baseline]
+
+        with redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(main(args + ["--save"]), 0)
+            self.assertTrue(os.path.exists(baseline))
+            self.assertEqual(main(args + ["--threshold", "1"]), 0)
+
+        self.assertIn("build_sg_mail[plain]", out.getvalue())
+        self.assertIn("send_messages[plain]", out.getvalue())
+        self.assertIn("%", out.getvalue())
+
+    def test_every_shape_builds(self):
+        backend = SendgridBackend(api_key="stub")
+        for name, bench in BENCHMARKS.items():
+            if name.startswith("send_messages"):
+                continue
+            step, messages = bench(backend)
+            step()
+            self.assertGreater(messages, 0)
@@ -0,0 +1,272 @@
+import os
+import tempfile
+
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+from python_http_client.exceptions import BadRequestsError, ServiceUnavailableError
+
+from sendgrid_backend import breaker
+from sendgrid_backend.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    get_circuit_breaker,
+    is_outage,
+)
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.signals import (
+    sendgrid_batch_sent,
+    sendgrid_circuit_breaker_state_changed,
+    sendgrid_email_sent,
+)
+from sendgrid_backend.spool import Spool
+
+from .helpers import FakeClock, make_message, start_fake_sendgrid
+
+
+def server_error():
+    return ServiceUnavailableError(503, "Service Unavailable", b"", {})
+
+
+class TestCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_threshold=3, reset_timeout=10, clock=self.clock
+        )
+        self.changes = []
+
+        def receiver(sender, breaker, old_state, new_state, **kwargs):
+            self.changes.append((old_state, new_state))
+
+        sendgrid_circuit_breaker_state_changed.connect(receiver, weak=False)
+        self.addCleanup(sendgrid_circuit_breaker_state_changed.disconnect, receiver)
+
+    def post_failure(self):
+        with self.assertRaises(ServiceUnavailableError):
+            self.breaker.call(self._raise, server_error())
+
+    @staticmethod
+    def _raise(error):
+        raise error
+
+    def test_is_outage(self):
+        self.assertTrue(is_outage(server_error()))
+        self.assertTrue(is_outage(TimeoutError()))
+        self.assertTrue(is_outage(ConnectionRefusedError()))
+        self.assertFalse(is_outage(BadRequestsError(400, "Bad Request", b"", {})))
+        self.assertFalse(is_outage(ValueError()))
+
+    def test_opens_after_consecutive_failures(self):
+        self.post_failure()
+        self.post_failure()
+        # A success resets the count
+        self.assertEqual(self.breaker.call(lambda: "ok"), "ok")
+        self.post_failure()
+        self.post_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.post_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.changes, [(CLOSED, OPEN)])
+
+    def test_client_errors_are_not_failures(self):
+        for _ in range(5):
+            with self.assertRaises(BadRequestsError):
+                self.breaker.call(
+                    self._raise, BadRequestsError(400, "Bad Request", b"", {})
+                )
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_fails_fast_while_open(self):
+        for _ in range(3):
+            self.post_failure()
+        self.clock.now = 4
+
+        calls = []
+        with self.assertRaises(CircuitOpenError) as cm:
+            self.breaker.call(calls.append, 1)
+        self.assertEqual(calls, [])
+        self.assertEqual(cm.exception.status_code, 503)
+        self.assertEqual(cm.exception.headers["Retry-After"], "6.000")
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_half_open_probe_succeeds(self):
+        for _ in range(3):
+            self.post_failure()
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+        # Only one probe is let through at a time
+        self.breaker.before_request()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_request()
+        self.breaker.record_result(None)
+
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(
+            self.changes, [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)]
+        )
+
+    def test_half_open_probe_fails(self):
+        for _ in range(3):
+            self.post_failure()
+        self.clock.now = 10
+        self.post_failure()
+
+        self.assertEqual(self.breaker.state, OPEN)
+        self.clock.now = 19
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_request()
+        self.clock.now = 20
+        self.breaker.before_request()
+
+    def test_cancelled_probe(self):
+        for _ in range(3):
+            self.post_failure()
+        self.clock.now = 10
+        with self.assertRaises(KeyboardInterrupt):
+            self.breaker.call(self._raise, KeyboardInterrupt())
+        # Another probe may be sent instead
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.breaker.before_request()
+
+    async def test_acall(self):
+        async def post(error):
+            if error is not None:
+                raise error
+            return "ok"
+
+        for _ in range(3):
+            with self.assertRaises(ServiceUnavailableError):
+                await self.breaker.acall(post, server_error())
+        with self.assertRaises(CircuitOpenError):
+            await self.breaker.acall(post, None)
+
+        self.clock.now = 10
+        self.assertEqual(await self.breaker.acall(post, None), "ok")
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+class TestGetCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        breaker._breakers.clear()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(get_circuit_breaker("https://api.sendgrid.com"))
+        self.assertIsNone(SendgridBackend(api_key="stub").circuit_breaker)
+
+    @override_settings(
+        SENDGRID_CIRCUIT_BREAKER_THRESHOLD=3,
+        SENDGRID_CIRCUIT_BREAKER_RESET_TIMEOUT=5,
+    )
+    def test_shared(self):
+        first = SendgridBackend(api_key="stub").circuit_breaker
+        self.assertIs(SendgridBackend(api_key="other").circuit_breaker, first)
+        self.assertEqual(first.failure_threshold, 3)
+        self.assertEqual(first.reset_timeout, 5)
+        self.assertIsNot(
+            SendgridBackend(api_key="stub", host="http://localhost").circuit_breaker,
+            first,
+        )
+
+
+@override_settings(SENDGRID_CIRCUIT_BREAKER_THRESHOLD=2)
+class TestBackendCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        breaker._breakers.clear()
+        self.addCleanup(breaker._breakers.clear)
+
+        self.server = start_fake_sendgrid(self, status=503)
+        self.host = self.server.host
+
+        self.sent = []
+
+        def receiver(sender, message, fail_flag, fallback, **kwargs):
+            self.sent.append((fail_flag, fallback))
+
+        sendgrid_email_sent.connect(receiver, weak=False)
+        self.addCleanup(sendgrid_email_sent.disconnect, receiver)
+
+    def backend(self):
+        return SendgridBackend(api_key="stub", host=self.host, fail_silently=True)
+
+    def test_fails_fast(self):
+        self.assertEqual(self.backend().send_messages([make_message()] * 2), 0)
+        self.assertEqual(len(self.server.requests), 2)
+
+        # A new backend shares the open breaker, so posts nothing
+        backend = self.backend()
+        self.assertEqual(backend.circuit_breaker.state, OPEN)
+        self.assertEqual(backend.send_messages([make_message()] * 3), 0)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.sent, [(True, False)] * 5)
+
+        with self.assertRaises(CircuitOpenError):
+            SendgridBackend(api_key="stub", host=self.host).send_messages(
+                [make_message()]
+            )
+
+    @override_settings(SENDGRID_CIRCUIT_BREAKER_RESET_TIMEOUT=0)
+    def test_recovers(self):
+        self.backend().send_messages([make_message()] * 2)
+        self.server.status = 202
+        self.assertEqual(self.backend().send_messages([make_message()]), 1)
+        self.assertEqual(self.backend().circuit_breaker.state, CLOSED)
+
+    async def test_async_fails_fast(self):
+        backend = self.backend()
+        self.assertEqual(await backend.asend_messages([make_message()] * 2), 0)
+        self.assertEqual(backend.circuit_breaker.state, OPEN)
+        self.assertEqual(await backend.asend_messages([make_message()] * 3), 0)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_fallback(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "spool.sqlite3")
+
+        with override_settings(
+            SENDGRID_CIRCUIT_BREAKER_FALLBACK="sendgrid_backend.spool.SpoolBackend",
+            SENDGRID_SPOOL_PATH=path,
+            SENDGRID_API_KEY="stub",
+        ):
+            backend = self.backend()
+            # Failures before the breaker opens aren't diverted
+            self.assertEqual(backend.send_messages([make_message()] * 2), 0)
+            self.assertEqual(backend.send_messages([make_message()] * 3), 3)
+
+        self.assertEqual(len(self.server.requests), 2)
+        spool = Spool(path)
+        self.addCleanup(spool.close)
+        self.assertEqual(spool.pending(), 3)
+        # Diverted messages are reported as sent, through the fallback
+        self.assertEqual(self.sent, [(True, False)] * 2 + [(False, True)] * 3)
+
+    def test_fallback_batch_results(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        batches = []
+
+        def receiver(sender, results, **kwargs):
+            batches.append(results)
+
+        sendgrid_batch_sent.connect(receiver, weak=False)
+        self.addCleanup(sendgrid_batch_sent.disconnect, receiver)
+
+        with override_settings(
+            SENDGRID_CIRCUIT_BREAKER_FALLBACK="sendgrid_backend.spool.SpoolBackend",
+            SENDGRID_SPOOL_PATH=os.path.join(tmpdir.name, "spool.sqlite3"),
+            SENDGRID_API_KEY="stub",
+        ):
+            backend = self.backend()
+            backend.send_messages([make_message()] * 2)
+            self.assertEqual(backend.send_messages([make_message()]), 1)
+
+        ((result,),) = batches[1:]
+        self.assertTrue(result.sent)
+        self.assertTrue(result.fallback)
+        self.assertIsNone(result.error)
+        self.assertFalse(batches[0][0].sent)
+        self.assertFalse(batches[0][0].fallback)
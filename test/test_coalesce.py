@@ -0,0 +1,103 @@
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+from python_http_client.exceptions import BadRequestsError
+
+from sendgrid_backend.mail import MAX_PERSONALIZATIONS, MAX_RECIPIENTS, SendgridBackend
+from sendgrid_backend.signals import sendgrid_email_sent
+
+from .helpers import connect_receiver, make_message, mock_backend
+
+
+class TestCoalesce(SimpleTestCase):
+    def setUp(self):
+        self.signals = []
+
+        def receiver(sender, message, fail_flag, **kwargs):
+            self.signals.append((message, fail_flag))
+
+        connect_receiver(self, sendgrid_email_sent, receiver)
+
+    def make_backend(self, **kwargs):
+        return mock_backend(message_id="coalesced", coalesce_messages=True, **kwargs)
+
+    def test_coalesce_messages_setting(self):
+        self.assertFalse(SendgridBackend(api_key="stub").coalesce_messages)
+        with override_settings(SENDGRID_COALESCE_MESSAGES=True):
+            self.assertTrue(SendgridBackend(api_key="stub").coalesce_messages)
+
+    def test_coalesce(self):
+        backend = self.make_backend()
+        msgs = [make_message(f"recipient{i}@example.com") for i in range(5)]
+        msgs.append(make_message("other@example.com", subject="Something else"))
+
+        self.assertEqual(backend.send_messages(msgs), 6)
+
+        post = backend.sg.client.mail.send.post
+        self.assertEqual(post.call_count, 2)
+        first = post.call_args_list[0].kwargs["request_body"]
+        self.assertEqual(
+            [p["to"][0]["email"] for p in first["personalizations"]],
+            [f"recipient{i}@example.com" for i in range(5)],
+        )
+        self.assertEqual(first["subject"], "Hello, World!")
+        expected = backend._build_sg_mail(msgs[0])
+        expected["personalizations"] = first["personalizations"]
+        self.assertDictEqual(first, expected)
+
+        second = post.call_args_list[1].kwargs["request_body"]
+        self.assertEqual(len(second["personalizations"]), 1)
+        self.assertEqual(second["subject"], "Something else")
+
+        self.assertEqual(len(self.signals), 6)
+        for msg in msgs:
+            self.assertEqual(msg.extra_headers["status"], 202)
+            self.assertEqual(msg.extra_headers["message_id"], "coalesced")
+
+    def test_coalesce_personalization_limit(self):
+        backend = self.make_backend()
+        msgs = [
+            make_message(f"recipient{i}@example.com")
+            for i in range(MAX_PERSONALIZATIONS + 1)
+        ]
+
+        self.assertEqual(backend.send_messages(msgs), MAX_PERSONALIZATIONS + 1)
+
+        calls = backend.sg.client.mail.send.post.call_args_list
+        self.assertEqual(
+            [len(c.kwargs["request_body"]["personalizations"]) for c in calls],
+            [MAX_PERSONALIZATIONS, 1],
+        )
+
+    def test_coalesce_recipient_limit(self):
+        backend = self.make_backend()
+        msgs = []
+        for i in range(900):
+            msg = make_message(f"recipient{i}@example.com")
+            msg.cc = [f"cc{i}@example.com"]
+            msg.bcc = [f"bcc{i}@example.com"]
+            msgs.append(msg)
+
+        self.assertEqual(backend.send_messages(msgs), 900)
+
+        calls = backend.sg.client.mail.send.post.call_args_list
+        counts = [
+            sum(
+                len(p.get(field, []))
+                for p in c.kwargs["request_body"]["personalizations"]
+                for field in ("to", "cc", "bcc")
+            )
+            for c in calls
+        ]
+        self.assertEqual(counts, [999, 999, 702])
+        self.assertLessEqual(max(counts), MAX_RECIPIENTS)
+
+    def test_coalesce_failure(self):
+        backend = self.make_backend(fail_silently=True)
+        backend.sg.client.mail.send.post.side_effect = BadRequestsError(
+            400, "Bad Request", b"", {}
+        )
+        msgs = [make_message(f"recipient{i}@example.com") for i in range(3)]
+
+        self.assertEqual(backend.send_messages(msgs), 0)
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 1)
+        self.assertEqual([fail_flag for _, fail_flag in self.signals], [True] * 3)
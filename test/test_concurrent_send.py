@@ -0,0 +1,96 @@
+import threading
+from unittest.mock import MagicMock
+
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+from python_http_client.exceptions import BadRequestsError
+
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.signals import sendgrid_email_sent
+
+from .helpers import connect_receiver, make_messages, mock_backend
+
+
+class TestConcurrentSend(SimpleTestCase):
+    def setUp(self):
+        self.thread_ids = set()
+        self.lock = threading.Lock()
+        self.signals = []
+
+        def post(request_body):
+            with self.lock:
+                self.thread_ids.add(threading.get_ident())
+            resp = MagicMock()
+            resp.status_code = 202
+            resp.headers = {
+                "x-message-id": request_body["personalizations"][0]["to"][0]["email"]
+            }
+            return resp
+
+        self.post = post
+
+        def receiver(sender, message, fail_flag, **kwargs):
+            with self.lock:
+                self.signals.append((message, fail_flag))
+
+        connect_receiver(self, sendgrid_email_sent, receiver)
+
+    def make_backend(self, **kwargs):
+        return mock_backend(self.post, **kwargs)
+
+    def test_max_workers_setting(self):
+        with override_settings(SENDGRID_MAX_WORKERS=4):
+            self.assertEqual(SendgridBackend(api_key="stub").max_workers, 4)
+            self.assertEqual(
+                SendgridBackend(api_key="stub", max_workers=2).max_workers, 2
+            )
+        self.assertIsNone(SendgridBackend(api_key="stub").max_workers)
+
+    def test_concurrent_send(self):
+        backend = self.make_backend(max_workers=4)
+        msgs = make_messages(50)
+
+        self.assertEqual(backend.send_messages(msgs), 50)
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 50)
+        self.assertEqual(len(self.signals), 50)
+        self.assertTrue(all(not fail_flag for _, fail_flag in self.signals))
+        for msg in msgs:
+            self.assertEqual(msg.extra_headers["status"], 202)
+            self.assertEqual(msg.extra_headers["message_id"], msg.to[0])
+
+    def test_concurrent_send_fail_silently(self):
+        backend = self.make_backend(max_workers=4, fail_silently=True)
+        msgs = make_messages(10)
+
+        def post(request_body):
+            if request_body["personalizations"][0]["to"][0]["email"] in (
+                "recipient3@example.com",
+                "recipient7@example.com",
+            ):
+                raise BadRequestsError(400, "Bad Request", b"", {})
+            return self.post(request_body)
+
+        backend.sg.client.mail.send.post.side_effect = post
+
+        self.assertEqual(backend.send_messages(msgs), 8)
+        self.assertEqual(len(self.signals), 10)
+        failed = {msg.to[0] for msg, fail_flag in self.signals if fail_flag}
+        self.assertEqual(failed, {"recipient3@example.com", "recipient7@example.com"})
+        self.assertNotIn("status", msgs[3].extra_headers)
+
+    def test_concurrent_send_raises(self):
+        backend = self.make_backend(max_workers=4)
+        backend.sg.client.mail.send.post.side_effect = BadRequestsError(
+            400, "Bad Request", b"", {}
+        )
+
+        with self.assertRaises(BadRequestsError):
+            backend.send_messages(make_messages(10))
+
+    def test_serial_send(self):
+        backend = self.make_backend()
+        msgs = make_messages(5)
+
+        self.assertEqual(backend.send_messages(msgs), 5)
+        self.assertEqual(len(self.thread_ids), 1)
+        self.assertEqual(len(self.signals), 5)
@@ -1,4 +1,4 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from django.http import HttpResponseNotFound
 from django.test import SimpleTestCase
@@ -8,10 +8,12 @@ from sendgrid_backend.util import SENDGRID_6
 if SENDGRID_6:
     from ellipticcurve.ecdsa import Ecdsa
     from ellipticcurve.privateKey import PrivateKey
+    from sendgrid.helpers.eventwebhook import EventWebhook
     from sendgrid.helpers.eventwebhook.eventwebhook_header import EventWebhookHeader
 
     from sendgrid_backend.decorators import (
         check_sendgrid_signature,
+        get_verification_keys,
         verify_sendgrid_webhook_signature,
     )
 
@@ -29,6 +31,7 @@ if SENDGRID_6:
     """
     )
     PUBLIC_KEY_STRING = "".join(PRIVATE_KEY.publicKey().toPem().splitlines()[2:-1])
+    OTHER_KEY_STRING = "".join(PrivateKey().publicKey().toPem().splitlines()[2:-1])
     TIMESTAMP = "2025-05-13 07:42:18.792332+00:00"
 
     class TestDecoratorTestCase(SimpleTestCase):
@@ -62,6 +65,33 @@ if SENDGRID_6:
             with self.settings(SENDGRID_WEBHOOK_VERIFICATION_KEY=PUBLIC_KEY_STRING):
                 self.assertFalse(check_sendgrid_signature(self.bad_request))
 
+        def test_verification_key_cached(self):
+            with patch.object(
+                EventWebhook,
+                "convert_public_key_to_ecdsa",
+                autospec=True,
+                side_effect=EventWebhook.convert_public_key_to_ecdsa,
+            ) as convert:
+                with self.settings(SENDGRID_WEBHOOK_VERIFICATION_KEY=PUBLIC_KEY_STRING):
+                    for _ in range(3):
+                        self.assertTrue(check_sendgrid_signature(self.good_request))
+                    self.assertEqual(convert.call_count, 1)
+
+                # Changing the setting clears the cache
+                with self.settings(SENDGRID_WEBHOOK_VERIFICATION_KEY=OTHER_KEY_STRING):
+                    self.assertFalse(check_sendgrid_signature(self.good_request))
+                with self.settings(SENDGRID_WEBHOOK_VERIFICATION_KEY=PUBLIC_KEY_STRING):
+                    self.assertTrue(check_sendgrid_signature(self.good_request))
+                self.assertEqual(convert.call_count, 3)
+
+        def test_key_rotation(self):
+            with self.settings(
+                SENDGRID_WEBHOOK_VERIFICATION_KEY=[OTHER_KEY_STRING, PUBLIC_KEY_STRING]
+            ):
+                self.assertEqual(len(get_verification_keys()), 2)
+                self.assertTrue(check_sendgrid_signature(self.good_request))
+                self.assertFalse(check_sendgrid_signature(self.bad_request))
+
         def test_verify_sendgrid_webhook_signature_decorator(self):
             @verify_sendgrid_webhook_signature
             def test_func(request):
@@ -0,0 +1,146 @@
+import json
+from unittest.mock import MagicMock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from sendgrid_backend.cache import RotatingBloomFilter
+from sendgrid_backend.events import EventBatch, event_webhook_view, get_event_filter
+from sendgrid_backend.signals import sendgrid_events_received
+from sendgrid_backend.signature import SIGNATURE_HEADER, TIMESTAMP_HEADER
+
+from .helpers import FakeClock
+from .test_events import make_events
+from .test_signature import PRIVATE_KEY, TIMESTAMP, public_key_string, sign
+
+
+class TestRotatingBloomFilter(SimpleTestCase):
+    def test_membership(self):
+        seen = RotatingBloomFilter(capacity=100)
+        self.assertNotIn("a", seen)
+        seen.add("a")
+        seen.add("a")
+        self.assertIn("a", seen)
+        self.assertEqual(len(seen), 1)
+        self.assertEqual((seen.checks, seen.hits, seen.hit_rate), (2, 1, 0.5))
+
+        seen.clear()
+        self.assertNotIn("a", seen)
+        self.assertEqual(len(seen), 0)
+
+    def test_false_positive_rate(self):
+        seen = RotatingBloomFilter(capacity=10000, error_rate=0.01)
+        for i in range(9999):
+            seen.add("seen-%d" % i)
+
+        estimate = seen.false_positive_rate
+        false_positives = sum("unseen-%d" % i in seen for i in range(10000))
+        self.assertLess(estimate, 0.01)
+        self.assertLess(false_positives / 10000, 0.02)
+        self.assertAlmostEqual(false_positives / 10000, estimate, delta=0.005)
+        self.assertEqual(seen.stats()["false_positive_rate"], estimate)
+
+    def test_rotation_by_capacity(self):
+        seen = RotatingBloomFilter(capacity=10)
+        for i in range(25):
+            seen.add(str(i))
+
+        self.assertEqual(seen.rotations, 2)
+        self.assertEqual(len(seen), 15)
+        # Keys are remembered for between one and two generations
+        self.assertNotIn("9", seen)
+        self.assertTrue(all(str(i) in seen for i in range(10, 25)))
+
+    def test_rotation_by_age(self):
+        clock = FakeClock()
+        seen = RotatingBloomFilter(capacity=100, max_age=60, clock=clock)
+        seen.add("a")
+        clock.now = 90
+        self.assertIn("a", seen)
+        seen.add("b")
+        clock.now = 150
+        self.assertNotIn("a", seen)
+        self.assertIn("b", seen)
+        # The filter forgets everything after being idle for two generations
+        clock.now = 1000
+        self.assertNotIn("b", seen)
+        self.assertEqual(len(seen), 0)
+
+
+class TestEventBatchDedup(SimpleTestCase):
+    def test_duplicates(self):
+        seen = RotatingBloomFilter()
+        data = make_events(5)
+        body = json.dumps(data).encode()
+
+        first = EventBatch(body, seen)
+        self.assertEqual(len(first), 5)
+        first.mark_seen()
+
+        # A retry with a new event, and an event repeated within the batch
+        retry_data = data[3:] + make_events(7)[5:] + [data[0], make_events(6)[5]]
+        retry = EventBatch(json.dumps(retry_data).encode(), seen)
+        self.assertEqual([event.sg_event_id for event in retry], ["event-5", "event-6"])
+        self.assertEqual(len(retry), 2)
+        self.assertEqual(retry.duplicates, 4)
+
+    def test_not_seen_until_marked(self):
+        seen = RotatingBloomFilter()
+        body = json.dumps(make_events(3)).encode()
+        self.assertEqual(len(EventBatch(body, seen)), 3)
+        self.assertEqual(len(EventBatch(body, seen)), 3)
+
+    def test_events_without_ids(self):
+        seen = RotatingBloomFilter()
+        body = b'[{"event": "open"}, {"event": "open"}]'
+        batch = EventBatch(body, seen)
+        batch.mark_seen()
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(len(EventBatch(body, seen)), 2)
+
+
+@override_settings(
+    SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY),
+    SENDGRID_WEBHOOK_DEDUP_CAPACITY=1000,
+)
+class TestEventWebhookViewDedup(SimpleTestCase):
+    body = json.dumps(make_events(3)).encode()
+
+    def setUp(self):
+        self.receiver = MagicMock()
+        sendgrid_events_received.connect(self.receiver)
+        self.addCleanup(sendgrid_events_received.disconnect, self.receiver)
+        get_event_filter().clear()
+
+    def post(self, body):
+        request = RequestFactory().post(
+            "/events/",
+            body,
+            content_type="application/json",
+            headers={SIGNATURE_HEADER: sign(body), TIMESTAMP_HEADER: TIMESTAMP},
+        )
+        return event_webhook_view(request)
+
+    def test_get_event_filter(self):
+        event_filter = get_event_filter()
+        self.assertIs(get_event_filter(), event_filter)
+        with self.settings(SENDGRID_WEBHOOK_DEDUP_ERROR_RATE=0.01):
+            self.assertIsNot(get_event_filter(), event_filter)
+        with self.settings(SENDGRID_WEBHOOK_DEDUP_CAPACITY=None):
+            self.assertIsNone(get_event_filter())
+
+    def test_retry(self):
+        self.assertEqual(self.post(self.body).status_code, 200)
+        # Every event was a duplicate, so receivers aren't called again
+        self.assertEqual(self.post(self.body).status_code, 200)
+        self.assertEqual(self.receiver.call_count, 1)
+        self.assertEqual(get_event_filter().hits, 3)
+
+    def test_failed_request_not_deduplicated(self):
+        self.receiver.side_effect = [RuntimeError, None]
+        with self.assertRaises(RuntimeError):
+            self.post(self.body)
+        self.post(self.body)
+
+        events = self.receiver.call_args.kwargs["events"]
+        self.assertEqual(len(events), 3)
+        self.assertEqual(events.duplicates, 0)
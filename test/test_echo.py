@@ -0,0 +1,277 @@
+import base64
+import gc
+import io
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.mail import EmailMessage
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+
+from sendgrid_backend.echo import EchoWriter, get_echo_writer
+from sendgrid_backend.mail import SendgridBackend
+
+from .helpers import make_message, start_fake_sendgrid
+
+RESPONSE = MagicMock(status_code=202, headers={"x-message-id": "abc"})
+
+
+class BlockingStream(io.StringIO):
+    """
+    A stream whose writes wait until it is released
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.released = threading.Event()
+
+    def write(self, text):
+        self.writing.set()
+        self.released.wait()
+        return super().write(text)
+
+
+class TestEchoWriter(SimpleTestCase):
+    def writer(self, *args, **kwargs):
+        writer = EchoWriter(*args, **kwargs)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_write(self):
+        stream = io.StringIO()
+        writer = self.writer(stream)
+        for i in range(100):
+            self.assertTrue(writer.write("%d\n" % i))
+        writer.flush()
+        self.assertEqual(stream.getvalue(), "".join("%d\n" % i for i in range(100)))
+
+    def test_close_writes_queued_text(self):
+        stream = io.StringIO()
+        writer = EchoWriter(stream)
+        writer.write("a\n")
+        writer.close()
+        self.assertEqual(stream.getvalue(), "a\n")
+        writer.close()
+
+    def test_full_queue_drops(self):
+        stream = BlockingStream()
+        writer = self.writer(stream, queue_size=2)
+        writer.write("first\n")
+        stream.writing.wait()
+
+        results = [writer.write("%d\n" % i) for i in range(10)]
+        self.assertEqual(results, [True] * 2 + [False] * 8)
+        self.assertEqual(writer.dropped, 8)
+
+        stream.released.set()
+        writer.flush()
+        # Drops are reported once the text being written when they happened is written
+        self.assertEqual(
+            stream.getvalue().splitlines(),
+            [
+                "first",
+                "[8 echoed email(s) dropped, the echo queue was full]",
+                "0",
+                "1",
+            ],
+        )
+
+    def test_rotation(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "echo.log")
+
+        writer = self.writer(path=path, max_bytes=100, backup_count=2)
+        for i in range(10):
+            writer.write("%029d\n" % i)
+        writer.flush()
+
+        self.assertEqual(
+            sorted(os.listdir(tmpdir.name)), ["echo.log", "echo.log.1", "echo.log.2"]
+        )
+        for name in os.listdir(tmpdir.name):
+            self.assertLessEqual(os.path.getsize(os.path.join(tmpdir.name, name)), 100)
+        with open(path) as f:
+            self.assertEqual(f.read().split(), ["%029d" % 9])
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_shared(self, stdout):
+        writer = get_echo_writer(stdout)
+        self.addCleanup(writer.close)
+        self.assertIs(get_echo_writer(stdout), writer)
+        writer.close()
+        self.assertIsNot(get_echo_writer(stdout), writer)
+
+    def test_other_streams_not_shared(self):
+        with self.assertRaises(ValueError):
+            get_echo_writer(io.StringIO())
+
+
+@override_settings(SENDGRID_ECHO_TO_STDOUT=True)
+class TestEchoFormats(SimpleTestCase):
+    def backend(self, stream, **kwargs):
+        backend = SendgridBackend(api_key="stub", stream=stream, **kwargs)
+        backend.sg = MagicMock()
+        backend.sg.client.mail.send.post.return_value = RESPONSE
+        if backend.echo_writer is not None:
+            self.addCleanup(backend.echo_writer.close)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_mime_by_default(self):
+        stream = io.StringIO()
+        self.backend(stream).send_messages([make_message()])
+        self.assertIn("Subject: Hello, World!", stream.getvalue())
+
+    def test_mime_file_attachments(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "report.txt")
+        with open(path, "w") as f:
+            f.write("From a path")
+
+        stream = io.StringIO()
+        backend = self.backend(stream)
+        msg = make_message()
+        msg.attach("path.txt", Path(path), "text/plain")
+        msg.attach("stream.txt", io.BytesIO(b"From a stream"), "text/plain")
+        msg.attachments.append(File(io.BytesIO(b"From a File"), name="file.txt"))
+        backend.send_messages([msg])
+
+        echoed = stream.getvalue()
+        self.assertIn("From a path", echoed)
+        self.assertIn("From a stream", echoed)
+        self.assertIn("From a File", echoed)
+        # Echoing doesn't consume the content that is sent
+        posted = backend.sg.client.mail.send.post.call_args.kwargs["request_body"]
+        self.assertEqual(
+            sorted(base64.b64decode(a["content"]) for a in posted["attachments"]),
+            [b"From a File", b"From a path", b"From a stream"],
+        )
+
+    def test_mime_unreadable_attachment(self):
+        stream = io.StringIO()
+        backend = self.backend(stream)
+        read, write = os.pipe()
+        os.write(write, b"From a pipe")
+        os.close(write)
+        msg = make_message()
+        with open(read, "rb") as pipe:
+            msg.attach("pipe.txt", pipe, "text/plain")
+            backend.send_messages([msg])
+
+        self.assertIn("it can only be read once", stream.getvalue())
+        posted = backend.sg.client.mail.send.post.call_args.kwargs["request_body"]
+        self.assertEqual(
+            base64.b64decode(posted["attachments"][0]["content"]), b"From a pipe"
+        )
+
+    def test_invalid_format(self):
+        with override_settings(SENDGRID_ECHO_FORMAT="xml"):
+            with self.assertRaises(ImproperlyConfigured):
+                SendgridBackend(api_key="stub")
+
+    @override_settings(SENDGRID_ECHO_FORMAT="json", SENDGRID_ECHO_BUFFERED=True)
+    def test_json(self):
+        stream = io.StringIO()
+        backend = self.backend(stream)
+        with patch.object(EmailMessage, "message", side_effect=AssertionError):
+            backend.send_messages([make_message()])
+        backend.echo_writer.flush()
+
+        posted = backend.sg.client.mail.send.post.call_args.kwargs["request_body"]
+        self.assertEqual(json.loads(stream.getvalue()), posted)
+
+    @override_settings(SENDGRID_ECHO_FORMAT="summary", SENDGRID_COALESCE_MESSAGES=True)
+    def test_summary(self):
+        stream = io.StringIO()
+        self.backend(stream).send_messages(
+            [make_message(), make_message("jane.doe@example.com")]
+        )
+        self.assertEqual(
+            stream.getvalue(),
+            "sam.smith@example.com -> john.doe@example.com, jane.doe@example.com: "
+            + "Hello, World!\n",
+        )
+
+    @override_settings(SENDGRID_ECHO_BUFFERED=True)
+    def test_owned_writer(self):
+        stream = io.StringIO()
+        backend = self.backend(stream)
+        # A writer to a stream other than stdout or stderr is only created when needed
+        self.assertIsNone(backend.echo_writer)
+
+        backend.send_messages([make_message()])
+        writer = backend.echo_writer
+        self.assertIsNotNone(writer)
+        self.assertIsNot(self.backend(stream).echo_writer, writer)
+
+        backend.close()
+        self.assertTrue(writer.closed)
+        self.assertIsNone(backend.echo_writer)
+        self.assertIn("Subject: Hello, World!", stream.getvalue())
+
+        # Another is created once the backend is used again
+        backend.send_messages([make_message()])
+        self.assertIsNot(backend.echo_writer, writer)
+
+    @override_settings(SENDGRID_ECHO_BUFFERED=True, SENDGRID_CONNECTION_POOL_SIZE=2)
+    def test_owned_writer_kept_open_between_sends(self):
+        server = start_fake_sendgrid(self)
+        backend = SendgridBackend(
+            api_key="stub", host=server.host, stream=io.StringIO()
+        )
+        self.addCleanup(backend.close)
+
+        # Each send closes the pool it opens, but not the writer
+        backend.send_messages([make_message()])
+        writer = backend.echo_writer
+        backend.send_messages([make_message()])
+        self.assertIs(backend.echo_writer, writer)
+        self.assertFalse(writer.closed)
+        self.assertIsNone(backend._pool)
+        self.assertEqual(len(server.requests), 2)
+
+    @override_settings(SENDGRID_ECHO_BUFFERED=True)
+    def test_owned_writer_closed_on_collection(self):
+        backend = SendgridBackend(api_key="stub", stream=io.StringIO())
+        writer = backend._get_echo_writer()
+        del backend
+        gc.collect()
+        self.assertTrue(writer.closed)
+
+    @override_settings(SENDGRID_ECHO_BUFFERED=True)
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_stdout_writer_shared(self, stdout):
+        backend = SendgridBackend(api_key="stub")
+        self.addCleanup(backend.echo_writer.close)
+        self.assertIs(SendgridBackend(api_key="stub").echo_writer, backend.echo_writer)
+        backend.close()
+        self.assertFalse(backend.echo_writer.closed)
+
+    def test_file(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "echo.log")
+
+        with override_settings(
+            SENDGRID_ECHO_TO_STDOUT=False,
+            SENDGRID_ECHO_PATH=path,
+            SENDGRID_ECHO_FORMAT="summary",
+        ):
+            backend = self.backend(io.StringIO())
+        backend.send_messages([make_message()])
+        backend.echo_writer.flush()
+
+        with open(path) as f:
+            self.assertEqual(
+                f.read(),
+                "sam.smith@example.com -> john.doe@example.com: Hello, World!\n",
+            )
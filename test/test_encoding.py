@@ -0,0 +1,119 @@
+import json
+from unittest.mock import patch
+
+import httpx
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+
+from sendgrid_backend import encoding
+from sendgrid_backend.encoding import (
+    BodyEncoder,
+    get_serializer,
+    json_dumps,
+    orjson_dumps,
+)
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.transport import AsyncTransport
+
+from .helpers import decode, make_message, start_fake_sendgrid
+
+DATA = {"subject": "Hello, Wörld!", "personalizations": [{"to": [{"email": "a@b"}]}]}
+
+
+class TestSerializers(SimpleTestCase):
+    def test_get_serializer(self):
+        self.assertIs(get_serializer(None), json_dumps)
+        self.assertIs(get_serializer("json"), json_dumps)
+        self.assertIs(get_serializer("orjson"), orjson_dumps)
+        self.assertIs(
+            get_serializer("sendgrid_backend.encoding.orjson_dumps"), orjson_dumps
+        )
+        self.assertIs(get_serializer(len), len)
+
+    def test_orjson_missing(self):
+        with patch.object(encoding, "orjson", None):
+            with self.assertRaises(ImproperlyConfigured):
+                get_serializer("orjson")
+            with self.assertRaises(ImproperlyConfigured):
+                with override_settings(SENDGRID_JSON_SERIALIZER="orjson"):
+                    SendgridBackend(api_key="stub")
+
+    def test_same_json(self):
+        self.assertEqual(json.loads(orjson_dumps(DATA)), json.loads(json_dumps(DATA)))
+
+
+class TestBodyEncoder(SimpleTestCase):
+    def test_default(self):
+        encoder = BodyEncoder()
+        self.assertTrue(encoder.is_default)
+        self.assertEqual(
+            encoder.encode(DATA),
+            (json.dumps(DATA).encode(), {"Content-Type": "application/json"}),
+        )
+
+    def test_compression(self):
+        encoder = BodyEncoder(compress_min_size=100)
+        self.assertFalse(encoder.is_default)
+
+        body, headers = encoder.encode({"subject": "short"})
+        self.assertNotIn("Content-Encoding", headers)
+
+        data = {"subject": "long " * 100}
+        body, headers = encoder.encode(data)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertLess(len(body), 100)
+        self.assertEqual(decode(body, headers), data)
+        # Bodies are reproducible, since gzip's timestamp isn't set
+        self.assertEqual(encoder.encode(data)[0], body)
+
+
+class TestBackendEncoding(SimpleTestCase):
+    def setUp(self):
+        self.server = start_fake_sendgrid(self)
+        self.host = self.server.host
+
+    def test_python_http_client_by_default(self):
+        backend = SendgridBackend(api_key="stub", host=self.host)
+        self.assertFalse(backend.open())
+
+    @override_settings(
+        SENDGRID_JSON_SERIALIZER="orjson", SENDGRID_COMPRESS_MIN_SIZE=2000
+    )
+    def test_send_messages(self):
+        backend = SendgridBackend(api_key="stub", host=self.host)
+        msgs = [make_message(), make_message(body="Hello, World! " * 1000)]
+        self.assertEqual(backend.send_messages(msgs), 2)
+        # The connection used for the messages is closed afterwards
+        self.assertIsNone(backend._pool)
+
+        small, large = self.server.requests
+        self.assertNotIn("Content-Encoding", small.headers)
+        self.assertEqual(large.headers["Content-Encoding"], "gzip")
+        self.assertEqual(large.headers["Content-Type"], "application/json")
+        self.assertTrue(large.headers["Authorization"].endswith("stub"))
+        self.assertLess(large.size, 2000)
+        self.assertEqual(large.body["content"][0]["value"], msgs[1].body)
+        self.assertEqual(msgs[1].extra_headers["message_id"], "message-2")
+
+
+class TestAsyncTransportEncoding(SimpleTestCase):
+    async def test_encoder(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(202)
+
+        transport = AsyncTransport(
+            "https://api.sendgrid.com",
+            {},
+            encoder=BodyEncoder(orjson_dumps, compress_min_size=0),
+            transport=httpx.MockTransport(handler),
+        )
+        await transport.post(DATA)
+        await transport.close()
+
+        (request,) = requests
+        self.assertEqual(request.headers["Content-Encoding"], "gzip")
+        self.assertEqual(decode(request.content, request.headers), DATA)
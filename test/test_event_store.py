@@ -0,0 +1,136 @@
+import datetime
+import json
+import math
+import time
+
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from sendgrid_backend.events import event_webhook_view, iter_events
+from sendgrid_backend.signals import sendgrid_events_received
+from sendgrid_backend.signature import SIGNATURE_HEADER, TIMESTAMP_HEADER
+
+from .test_events import make_events
+from .test_signature import PRIVATE_KEY, TIMESTAMP, public_key_string, sign
+
+
+@override_settings(
+    INSTALLED_APPS=["sendgrid_backend.event_store"],
+    SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY),
+)
+class TestEventStore(SimpleTestCase):
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The app's models can only be imported once it is installed
+        from sendgrid_backend.event_store.apps import RECEIVER_UID
+        from sendgrid_backend.event_store.ingest import store_events
+        from sendgrid_backend.event_store.models import SendgridEvent
+
+        cls.receiver_uid = RECEIVER_UID
+        cls.store_events = staticmethod(store_events)
+        cls.model = SendgridEvent
+        call_command("migrate", "sendgrid_event_store", verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        sendgrid_events_received.disconnect(dispatch_uid=cls.receiver_uid)
+        super().tearDownClass()
+
+    def tearDown(self):
+        self.model.objects.all().delete()
+
+    def events(self, count):
+        return list(iter_events(json.dumps(make_events(count)).encode()))
+
+    def test_store_events(self):
+        self.assertEqual(self.store_events(self.events(3)), 3)
+
+        event = self.model.objects.get(sg_event_id="event-1")
+        self.assertEqual(event.event, "delivered")
+        self.assertEqual(event.email, "recipient1@example.com")
+        self.assertEqual(event.message_id, "message0")
+        self.assertEqual(event.sg_message_id, "message0.filter0001.16648.5515E0B88.0")
+        self.assertEqual(
+            event.timestamp,
+            datetime.datetime(2024, 5, 13, 7, 42, 19, tzinfo=datetime.timezone.utc),
+        )
+        self.assertEqual(
+            event.data, {"category": ["cat", "ünïcode ✓"], "ip": "192.168.1.1"}
+        )
+
+    def test_recipients_told_apart(self):
+        body = json.dumps(
+            [
+                {
+                    "event": "delivered",
+                    "email": "recipient%d@example.com" % i,
+                    "sg_event_id": "event-%d" % i,
+                    "sg_message_id": "message0.filter0001.16648.5515E0B88.%d" % i,
+                }
+                for i in range(2)
+            ]
+        ).encode()
+        self.store_events(iter_events(body))
+
+        event = self.model.objects.get(
+            sg_message_id="message0.filter0001.16648.5515E0B88.1"
+        )
+        self.assertEqual(event.email, "recipient1@example.com")
+        self.assertEqual(self.model.objects.filter(message_id="message0").count(), 2)
+
+    def test_duplicates(self):
+        self.store_events(self.events(3))
+        self.store_events(self.events(5))
+        self.assertEqual(self.model.objects.count(), 5)
+
+        # Events without ids can't be told apart, so are all stored
+        body = b'[{"event": "open", "email": "john.doe@example.com"}]'
+        self.store_events(iter_events(body))
+        self.store_events(iter_events(body))
+        self.assertEqual(self.model.objects.filter(sg_event_id=None).count(), 2)
+
+    def test_for_message(self):
+        self.store_events(self.events(25))
+        msg = EmailMessage(to=["john.doe@example.com"])
+        msg.extra_headers["message_id"] = "message1"
+        self.assertEqual(
+            sorted(self.model.objects.for_message(msg).values_list("email", flat=True)),
+            sorted("recipient%d@example.com" % i for i in range(10, 20)),
+        )
+
+    def test_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.store_events(self.events(2500), batch_size=1000)
+
+        # Batches of 1000, 1000 and 500 events, each inserted in as few queries as the
+        # database's limit on query parameters allows
+        fields = [f for f in self.model._meta.concrete_fields if not f.primary_key]
+        per_query = min(1000, connection.ops.bulk_batch_size(fields, [None] * 1000))
+        expected = 2 * math.ceil(1000 / per_query) + math.ceil(500 / per_query)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), expected)
+        self.assertEqual(self.model.objects.count(), 2500)
+
+    def test_webhook(self):
+        body = json.dumps(make_events(10000)).encode()
+        request = RequestFactory().post(
+            "/events/",
+            body,
+            content_type="application/json",
+            headers={SIGNATURE_HEADER: sign(body), TIMESTAMP_HEADER: TIMESTAMP},
+        )
+
+        start = time.monotonic()
+        response = event_webhook_view(request)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.model.objects.count(), 10000)
+        # Well within Sendgrid's webhook timeout
+        self.assertLess(elapsed, 5)
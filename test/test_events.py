@@ -0,0 +1,169 @@
+import io
+import json
+import tracemalloc
+from unittest.mock import MagicMock
+
+from django.http import HttpResponseBadRequest, HttpResponseNotFound
+from django.test import RequestFactory, SimpleTestCase
+
+from sendgrid_backend.events import (
+    EventBatch,
+    WebhookEvent,
+    event_webhook_view,
+    iter_events,
+    iter_json_array,
+)
+from sendgrid_backend.signals import sendgrid_events_received
+from sendgrid_backend.signature import SIGNATURE_HEADER, TIMESTAMP_HEADER
+
+from .test_signature import PRIVATE_KEY, TIMESTAMP, public_key_string, sign
+
+
+def make_events(count):
+    return [
+        {
+            "email": "recipient%d@example.com" % i,
+            "timestamp": 1715586138 + i,
+            "event": "delivered" if i % 2 else "open",
+            "sg_event_id": "event-%d" % i,
+            "sg_message_id": "message%d.filter0001.16648.5515E0B88.0" % (i // 10),
+            "category": ["cat", "ünïcode ✓"],
+            "ip": "192.168.1.%d" % (i % 256),
+        }
+        for i in range(count)
+    ]
+
+
+class TestIterJsonArray(SimpleTestCase):
+    def parse(self, body, chunk_size):
+        if isinstance(body, str):
+            body = body.encode()
+        starts = range(0, len(body), chunk_size)
+        chunks = [body[i : i + chunk_size] for i in starts]  # noqa: E203
+        return list(iter_json_array(chunks))
+
+    def test_chunk_sizes(self):
+        bodies = [
+            json.dumps(make_events(5)),
+            json.dumps(make_events(5), indent=2),
+            '[1, 22, 333.5e1, -4, true, false, null, "a\\"b", [1, [2]], {"a": {}}]',
+            " [ ] ",
+            "[]",
+        ]
+        for body in bodies:
+            for chunk_size in range(1, 8):
+                with self.subTest(body=body[:20], chunk_size=chunk_size):
+                    self.assertEqual(self.parse(body, chunk_size), json.loads(body))
+
+    def test_invalid(self):
+        for body in (
+            "",
+            "   ",
+            '{"event": "open"}',
+            "[1, 2",
+            "[1, 2,]",
+            "[1 2]",
+            "[1, 2] 3",
+            '[{"event": "open"',
+            '[{"event": op}]',
+        ):
+            for chunk_size in (1, 3, 1024):
+                with self.subTest(body=body, chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        self.parse(body, chunk_size)
+
+
+class TestIterEvents(SimpleTestCase):
+    def test_events(self):
+        data = make_events(3)
+        body = json.dumps(data).encode()
+        for source in (body, io.BytesIO(body)):
+            events = list(iter_events(source, chunk_size=7))
+            self.assertEqual([event.data for event in events], data)
+            self.assertEqual(events[1].event, "delivered")
+            self.assertEqual(events[1].email, "recipient1@example.com")
+            self.assertEqual(events[1].sg_event_id, "event-1")
+            self.assertEqual(events[1].message_id, "message0")
+
+    def test_missing_fields(self):
+        (event,) = iter_events(b'[{"event": "processed"}]')
+        self.assertEqual(
+            event,
+            WebhookEvent("processed", None, None, None, None, {"event": "processed"}),
+        )
+        self.assertIsNone(event.message_id)
+
+    def test_non_object_event(self):
+        with self.assertRaises(ValueError):
+            list(iter_events(b'[{"event": "open"}, "open"]'))
+
+    def test_memory(self):
+        body = json.dumps(make_events(10000)).encode()
+
+        tracemalloc.start()
+        try:
+            json.loads(body)
+            _, loaded_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            count = sum(1 for _ in iter_events(body))
+            _, streamed_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(count, 10000)
+        self.assertLess(streamed_peak * 10, loaded_peak)
+
+
+class TestEventWebhookView(SimpleTestCase):
+    body = json.dumps(make_events(3)).encode()
+
+    def setUp(self):
+        self.receiver = MagicMock()
+        sendgrid_events_received.connect(self.receiver)
+        self.addCleanup(sendgrid_events_received.disconnect, self.receiver)
+
+    def post(self, body, signature=None):
+        return event_webhook_view(
+            RequestFactory().post(
+                "/events/",
+                body,
+                content_type="application/json",
+                headers={
+                    SIGNATURE_HEADER: signature or sign(body),
+                    TIMESTAMP_HEADER: TIMESTAMP,
+                },
+            )
+        )
+
+    def test_view(self):
+        with self.settings(
+            SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY)
+        ):
+            response = self.post(self.body)
+
+        self.assertEqual(response.status_code, 200)
+        self.receiver.assert_called_once()
+        kwargs = self.receiver.call_args.kwargs
+        self.assertIs(kwargs["sender"], EventBatch)
+        self.assertEqual(len(kwargs["events"]), 3)
+        self.assertEqual(
+            [event.data for event in kwargs["events"]], json.loads(self.body)
+        )
+
+    def test_bad_signature(self):
+        with self.settings(
+            SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY)
+        ):
+            response = self.post(self.body, sign(self.body + b" "))
+
+        self.assertIsInstance(response, HttpResponseNotFound)
+        self.receiver.assert_not_called()
+
+    def test_malformed_body(self):
+        with self.settings(
+            SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY)
+        ):
+            response = self.post(self.body[:-1])
+
+        self.assertIsInstance(response, HttpResponseBadRequest)
+        self.receiver.assert_not_called()
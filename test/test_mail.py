@@ -1,6 +1,13 @@
 import base64
+import json
+import unittest
+import uuid
 from email.mime.image import MIMEImage
+from pathlib import Path
+from unittest import mock
 
+from django.core.files import File
+from django.core.files.base import ContentFile
 from django.core.mail import EmailMessage, EmailMultiAlternatives
 from django.test import override_settings
 from django.test.testcases import SimpleTestCase
@@ -18,7 +25,15 @@ from sendgrid.helpers.mail import (
 )
 
 from sendgrid_backend.mail import SendgridBackend
-from sendgrid_backend.util import SENDGRID_5, SENDGRID_6, dict_to_personalization
+from sendgrid_backend.util import (
+    SENDGRID_5,
+    SENDGRID_6,
+    b64encode_chunks,
+    dict_to_personalization,
+    is_v3_personalization,
+    iter_attachment_chunks,
+    parse_email_address,
+)
 
 if SENDGRID_6:
     from sendgrid.helpers.mail import Bcc, Cc, To
@@ -286,6 +301,82 @@ class TestMailGeneration(SimpleTestCase):
 
         self.assertDictEqual(result, expected)
 
+    def test_file_attachments(self):
+        """
+        Tests that paths, file objects and django File objects are accepted as attachment
+        content, and encode to the same base64 as their bytes.
+        """
+        with open("test/linux-penguin.png", "rb") as f:
+            data = f.read()
+        expected = base64.b64encode(data).decode()
+
+        msg = EmailMessage(
+            subject="Hello, World!",
+            body="Hello, World!",
+            from_email="Sam Smith <sam.smith@example.com>",
+            to=["John Doe <john.doe@example.com>"],
+        )
+        msg.attachments.append(
+            ("path.png", Path("test/linux-penguin.png"), "image/png")
+        )
+        msg.attachments.append(("content-file.png", ContentFile(data), "image/png"))
+        django_file = File(open("test/linux-penguin.png", "rb"))
+        self.addCleanup(django_file.close)
+        msg.attachments.append(django_file)
+
+        with open("test/linux-penguin.png", "rb") as f:
+            msg.attachments.append(("file.png", f, "image/png"))
+            result = self.backend._build_sg_mail(msg)
+
+        self.assertEqual(
+            sorted((a["filename"], a["type"]) for a in result["attachments"]),
+            [
+                ("content-file.png", "image/png"),
+                ("file.png", "image/png"),
+                ("linux-penguin.png", "image/png"),
+                ("path.png", "image/png"),
+            ],
+        )
+        for attch in result["attachments"]:
+            self.assertEqual(attch["content"], expected)
+
+    def test_str_attachment_is_content(self):
+        """
+        Tests that str content is sent as the text itself, even if it names a file.
+        """
+        msg = EmailMessage(
+            subject="Hello, World!",
+            body="Hello, World!",
+            from_email="Sam Smith <sam.smith@example.com>",
+            to=["John Doe <john.doe@example.com>"],
+        )
+        msg.attachments.append(("path.txt", "test/linux-penguin.png", "text/plain"))
+        result = self.backend._build_sg_mail(msg)
+
+        self.assertEqual(
+            result["attachments"][0]["content"],
+            base64.b64encode(b"test/linux-penguin.png").decode(),
+        )
+
+    def test_b64encode_chunks(self):
+        """
+        Tests that chunked base64 encoding matches encoding the content in one go, for
+        chunk sizes that do not line up with base64's 3-byte groups.
+        """
+        data = bytes(range(256)) * 5
+        text = "C\xf4te d\u2019Ivoire" * 50
+
+        for chunk_size in [1, 2, 3, 4, 7, 1024, 4096]:
+            self.assertEqual(
+                b64encode_chunks(iter_attachment_chunks(data, chunk_size)),
+                base64.b64encode(data).decode(),
+            )
+            self.assertEqual(
+                b64encode_chunks(iter_attachment_chunks(text, chunk_size)),
+                base64.b64encode(text.encode()).decode(),
+            )
+        self.assertEqual(b64encode_chunks(iter_attachment_chunks(b"")), "")
+
     def test_reply_to(self):
         """
         Tests reply-to functionality
@@ -572,6 +663,79 @@ class TestMailGeneration(SimpleTestCase):
             self.assertIn(test_key_str, data)
             self.assertEqual(test_val_str, data[test_key_str])
 
+    def test_make_private(self):
+        """
+        Tests that make_private sends a personalization per recipient, parsing each
+        distinct address only once.
+        """
+        msg = EmailMessage(
+            subject="Hello, World!",
+            body="Hello, World!",
+            from_email="Sam Smith <sam.smith@example.com>",
+            to=["Recipient %d <recipient-%d@example.com>" % (i, i) for i in range(50)],
+            cc=["Stephanie Smith <stephanie.smith@example.com>"],
+            bcc=["Sarah Smith <sarah.smith@example.com>", "sam.smith@example.com"],
+        )
+        msg.make_private = True
+
+        parse_email_address.cache_clear()
+        self.backend._build_sg_mail(msg)
+        result = self.backend._build_sg_mail(msg)
+
+        # 50 recipients, 1 cc, 2 bcc and the sender
+        self.assertEqual(parse_email_address.cache_info().misses, 54)
+
+        personalizations = sorted(
+            result["personalizations"], key=lambda p: p["to"][0]["email"]
+        )
+        self.assertEqual(len(personalizations), 50)
+        self.assertEqual(
+            personalizations[0],
+            {
+                "to": [{"name": "Recipient 0", "email": "recipient-0@example.com"}],
+                "cc": [
+                    {"name": "Stephanie Smith", "email": "stephanie.smith@example.com"}
+                ],
+                "bcc": [
+                    {"name": "Sarah Smith", "email": "sarah.smith@example.com"},
+                    {"email": "sam.smith@example.com"},
+                ],
+                "subject": "Hello, World!",
+            },
+        )
+
+    def test_parse_email_address_override(self):
+        """
+        Tests that recipients are parsed through _parse_email_address, so that subclasses
+        can override it.
+        """
+
+        class LowercaseBackend(SendgridBackend):
+            def _parse_email_address(self, address):
+                addr, name = super()._parse_email_address(address)
+                return addr.lower(), name
+
+        backend = LowercaseBackend(api_key="DUMMY_API_KEY")
+        msg = EmailMessage(
+            subject="Hello, World!",
+            body="Hello, World!",
+            from_email="Sam Smith <Sam.Smith@example.com>",
+            to=["John Doe <John.Doe@example.com>"],
+            cc=["Stephanie.Smith@example.com"],
+            bcc=["Sarah.Smith@example.com"],
+        )
+        for make_private in (False, True):
+            msg.make_private = make_private
+            (personalization,) = backend._build_sg_mail(msg)["personalizations"]
+            self.assertEqual(
+                [personalization[field][0]["email"] for field in ("to", "cc", "bcc")],
+                [
+                    "john.doe@example.com",
+                    "stephanie.smith@example.com",
+                    "sarah.smith@example.com",
+                ],
+            )
+
     def test_dict_to_personalization(self):
         """
         Tests that dict_to_personalization works
@@ -727,6 +891,31 @@ class TestMailGeneration(SimpleTestCase):
         assert "ganalytics" in tracking_settings
         assert tracking_settings["ganalytics"]["utm_source"] == "my-source"
 
+    def test_settings_template(self):
+        """
+        Tests that the backend's precomputed settings are copied into each request body
+        """
+        msg = EmailMessage(
+            subject="Hello, World!",
+            body="Hello, World!",
+            from_email="Sam Smith <sam.smith@example.com>",
+            to=["John Doe <john.doe@example.com>"],
+        )
+
+        first = self.backend._build_sg_mail(msg)
+        first["tracking_settings"]["click_tracking"]["enable"] = False
+        first["mail_settings"]["sandbox_mode"]["enable"] = True
+        second = self.backend._build_sg_mail(msg)
+
+        self.assertEqual(
+            second["tracking_settings"],
+            {
+                "click_tracking": {"enable": True, "enable_text": True},
+                "open_tracking": {"enable": True},
+            },
+        )
+        self.assertEqual(second["mail_settings"], {"sandbox_mode": {"enable": False}})
+
     def test_reply_to_list(self):
         msg = EmailMessage(
             subject="Hello, World!",
@@ -751,3 +940,150 @@ class TestMailGeneration(SimpleTestCase):
             assert reply_to_list[0].get("name") == "John Doe"
             assert reply_to_list[1].get("email") == "jane.doe@example.com"
             assert not reply_to_list[1].get("name")
+
+
+@unittest.skipUnless(SENDGRID_6, "The fast payload builder requires sendgrid v6")
+class TestFastPayloadBuilder(TestMailGeneration):
+    """
+    Runs every TestMailGeneration case against the fast payload builder, checking that
+    its output serializes to exactly the same JSON as the helper-based builder.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with override_settings(
+            SENDGRID_API_KEY="DUMMY_API_KEY", SENDGRID_FAST_PAYLOAD_BUILDER=True
+        ):
+            cls.backend = SendgridBackend()
+
+        backend = cls.backend
+
+        def build_sg_mail(msg):
+            # Attachments without a filename get a random one, and
+            # file-like attachments are read to the end, so both builders must see the same state.
+            with mock.patch("uuid.uuid4", return_value=uuid.UUID(int=0)):
+                fast = backend._build_sg_mail_fast(msg)
+                for attachment in msg.attachments:
+                    if isinstance(attachment, tuple):
+                        attachment = attachment[1]
+                    if hasattr(attachment, "seek"):
+                        attachment.seek(0)
+                expected = backend._build_sg_mail_from_helpers(msg)
+            assert json.dumps(fast) == json.dumps(expected), (fast, expected)
+            return fast
+
+        backend._build_sg_mail = build_sg_mail
+
+    def test_v3_personalizations(self):
+        """
+        Tests that well-formed v3 personalization dicts are passed through, filled in
+        from the message the same way as Personalization objects
+        """
+        msg = EmailMessage(
+            subject="Hello, World!",
+            body="Hello, World!",
+            from_email="Sam Smith <sam.smith@example.com>",
+            cc=["Stephanie Smith <stephanie.smith@example.com>"],
+            headers={"X-Campaign": "spring"},
+        )
+        msg.template_id = "d-123"
+        msg.dynamic_template_data = {"greeting": "Hi"}
+        msg.personalizations = [
+            {"to": [{"email": "john.doe@example.com", "name": "John Doe"}]},
+            {
+                "to": [{"email": "jane.doe@example.com"}],
+                "bcc": [{"email": "sarah.smith@example.com"}],
+                "dynamic_template_data": {"greeting": "Hello"},
+            },
+        ]
+
+        # These dicts are also understood by the helper-based builder, which the
+        # test's _build_sg_mail compares against
+        self.assertTrue(all(map(is_v3_personalization, msg.personalizations)))
+        result = self.backend._build_sg_mail(msg)
+
+        self.assertEqual(
+            sorted(result["personalizations"], key=lambda p: p["to"][0]["email"]),
+            [
+                {
+                    "to": [{"email": "jane.doe@example.com"}],
+                    "cc": [
+                        {
+                            "name": "Stephanie Smith",
+                            "email": "stephanie.smith@example.com",
+                        }
+                    ],
+                    "bcc": [{"email": "sarah.smith@example.com"}],
+                    "subject": "Hello, World!",
+                    "dynamic_template_data": {"greeting": "Hello"},
+                    "headers": {"X-Campaign": "spring"},
+                },
+                {
+                    "to": [{"email": "john.doe@example.com", "name": "John Doe"}],
+                    "cc": [
+                        {
+                            "name": "Stephanie Smith",
+                            "email": "stephanie.smith@example.com",
+                        }
+                    ],
+                    "subject": "Hello, World!",
+                    "dynamic_template_data": {"greeting": "Hi"},
+                    "headers": {"X-Campaign": "spring"},
+                },
+            ],
+        )
+
+    def test_v3_personalization_dict_values(self):
+        """
+        Tests that headers given as a dict are merged with the message's, while
+        substitutions and custom_args are used as given: a personalization's own
+        custom_args replace the message's rather than being merged with them
+        """
+        msg = EmailMessage(
+            subject="Hello, World!",
+            body="Hello, World!",
+            from_email="Sam Smith <sam.smith@example.com>",
+            headers={"X-Campaign": "spring"},
+        )
+        msg.custom_args = {"campaign": "spring"}
+        msg.personalizations = [
+            {
+                "to": [{"email": "john.doe@example.com"}],
+                "headers": {"X-Recipient": "1"},
+                "substitutions": {":name": "John"},
+                "custom_args": {"recipient": "1"},
+            }
+        ]
+
+        result = self.backend._build_sg_mail_fast(msg)
+        self.assertEqual(
+            result["personalizations"],
+            [
+                {
+                    "to": [{"email": "john.doe@example.com"}],
+                    "subject": "Hello, World!",
+                    "headers": {"X-Recipient": "1", "X-Campaign": "spring"},
+                    "substitutions": {":name": "John"},
+                    "custom_args": {"recipient": "1"},
+                }
+            ],
+        )
+
+    def test_is_v3_personalization(self):
+        self.assertTrue(is_v3_personalization({"to": [{"email": "a@example.com"}]}))
+        for data in [
+            {},
+            {"to": []},
+            {"to": [{"name": "No address"}]},
+            {"to": [{"email": "a@example.com", "name": None}]},
+            {"to": [{"email": "a@example.com"}], "custom_args": {"id": 1}},
+            {"to": [{"email": "a@example.com"}], "send_at": "tomorrow"},
+            {"to": [{"email": "a@example.com"}], "from": {"email": "b@example.com"}},
+            Personalization(),
+        ]:
+            self.assertFalse(is_v3_personalization(data), data)
+
+    def test_enabled(self):
+        self.assertTrue(self.backend.fast_payload_builder)
+        self.assertFalse(SendgridBackend(api_key="stub").fast_payload_builder)
@@ -0,0 +1,121 @@
+import time
+from unittest.mock import MagicMock
+
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+from python_http_client.exceptions import (
+    BadRequestsError,
+    HTTPError,
+    ServiceUnavailableError,
+    TooManyRequestsError,
+)
+
+from sendgrid_backend.retry import RetryPolicy
+from sendgrid_backend.signals import sendgrid_email_sent
+
+from .helpers import connect_receiver, make_message, mock_backend
+
+
+class TestRetryPolicy(SimpleTestCase):
+    def test_no_retries_by_default(self):
+        policy = RetryPolicy()
+        self.assertIsNone(
+            policy.get_delay(TooManyRequestsError(429, "", b"", {}), attempt=1)
+        )
+
+    def test_exponential_backoff(self):
+        policy = RetryPolicy(max_retries=5, backoff=1, backoff_max=4)
+        error = ServiceUnavailableError(503, "", b"", {})
+
+        for attempt, cap in [(1, 1), (2, 2), (3, 4), (4, 4), (5, 4)]:
+            delay = policy.get_delay(error, attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, cap)
+        self.assertIsNone(policy.get_delay(error, 6))
+
+    def test_status_codes(self):
+        policy = RetryPolicy(max_retries=1)
+        self.assertIsNone(policy.get_delay(BadRequestsError(400, "", b"", {}), 1))
+        self.assertIsNotNone(
+            policy.get_delay(ServiceUnavailableError(503, "", b"", {}), 1)
+        )
+
+        # A gateway timeout may follow a send that went through, so isn't retried
+        # unless asked for
+        error = HTTPError(504, "Gateway Timeout", b"", {})
+        self.assertIsNone(policy.get_delay(error, 1))
+        policy = RetryPolicy(max_retries=1, status_codes=[429, 503, 504])
+        self.assertIsNotNone(policy.get_delay(error, 1))
+
+        policy = RetryPolicy(max_retries=1, status_codes=[429])
+        self.assertIsNone(
+            policy.get_delay(ServiceUnavailableError(503, "", b"", {}), 1)
+        )
+
+    def test_retry_after(self):
+        policy = RetryPolicy(max_retries=1, backoff=0.5, backoff_max=10)
+
+        delay = policy.get_delay(
+            TooManyRequestsError(429, "", b"", {"Retry-After": "3"}), 1
+        )
+        self.assertGreaterEqual(delay, 3)
+        self.assertLessEqual(delay, 3.5)
+
+        # Waits longer than backoff_max are not retried
+        self.assertIsNone(
+            policy.get_delay(
+                TooManyRequestsError(429, "", b"", {"Retry-After": "60"}), 1
+            )
+        )
+
+    def test_rate_limit_reset(self):
+        policy = RetryPolicy(max_retries=1, backoff=0.5, backoff_max=10)
+        headers = {"X-RateLimit-Reset": str(int(time.time()) + 5)}
+
+        delay = policy.get_delay(TooManyRequestsError(429, "", b"", headers), 1)
+        self.assertGreater(delay, 3)
+        self.assertLessEqual(delay, 5.5)
+
+
+class TestSendWithRetries(SimpleTestCase):
+    def setUp(self):
+        self.signals = []
+
+        def receiver(sender, message, fail_flag, **kwargs):
+            self.signals.append((fail_flag, kwargs["attempts"], kwargs["retry_wait"]))
+
+        connect_receiver(self, sendgrid_email_sent, receiver)
+
+    def make_backend(self, side_effect, **kwargs):
+        with override_settings(
+            SENDGRID_MAX_RETRIES=2, SENDGRID_RETRY_BACKOFF=0.01, **kwargs
+        ):
+            return mock_backend(side_effect)
+
+    def test_retry_then_succeed(self):
+        resp = MagicMock(status_code=202, headers={"x-message-id": "abc"})
+        backend = self.make_backend([ServiceUnavailableError(503, "", b"", {}), resp])
+
+        self.assertEqual(backend.send_messages([make_message()]), 1)
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 2)
+        fail_flag, attempts, retry_wait = self.signals[0]
+        self.assertFalse(fail_flag)
+        self.assertEqual(attempts, 2)
+        self.assertGreaterEqual(retry_wait, 0)
+        self.assertLessEqual(retry_wait, 0.01)
+
+    def test_retries_exhausted(self):
+        backend = self.make_backend(TooManyRequestsError(429, "", b"", {}))
+
+        with self.assertRaises(TooManyRequestsError):
+            backend.send_messages([make_message()])
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 3)
+        self.assertEqual(self.signals[0][:2], (True, 3))
+
+    def test_not_retried(self):
+        backend = self.make_backend(BadRequestsError(400, "", b"", {}))
+        backend.fail_silently = True
+
+        self.assertEqual(backend.send_messages([make_message()]), 0)
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 1)
+        self.assertEqual(self.signals[0], (True, 1, 0.0))
@@ -0,0 +1,261 @@
+import asyncio
+import base64
+import threading
+import time
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.http import HttpRequest, HttpResponseNotFound
+from django.test import SimpleTestCase
+
+from sendgrid_backend.decorators import (
+    get_verification_executor,
+    signature_check,
+    verify_webhook_signature,
+)
+from sendgrid_backend.signature import (
+    SIGNATURE_HEADER,
+    TIMESTAMP_HEADER,
+    get_public_keys,
+    load_public_key,
+    verify_request,
+    verify_signature,
+)
+from sendgrid_backend.util import SENDGRID_6
+
+if SENDGRID_6:
+    from sendgrid.helpers.eventwebhook import EventWebhook
+
+# Sendgrid signs webhook requests with a P-256 key
+PRIVATE_KEY = ec.generate_private_key(ec.SECP256R1())
+OTHER_PRIVATE_KEY = ec.generate_private_key(ec.SECP256R1())
+TIMESTAMP = "1715586138"
+
+
+def public_key_string(private_key):
+    der = private_key.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return base64.b64encode(der).decode()
+
+
+def sign(body, private_key=PRIVATE_KEY, timestamp=TIMESTAMP):
+    signature = private_key.sign(timestamp.encode() + body, ec.ECDSA(hashes.SHA256()))
+    return base64.b64encode(signature).decode()
+
+
+def make_request(body, signature, timestamp=TIMESTAMP):
+    request = HttpRequest()
+    request.method = "POST"
+    request._body = body
+    for header, value in ((SIGNATURE_HEADER, signature), (TIMESTAMP_HEADER, timestamp)):
+        request.META["HTTP_" + header.upper().replace("-", "_")] = value
+    return request
+
+
+class TestSignature(SimpleTestCase):
+    body = b'[{"email":"john.doe@example.com","event":"delivered"}]'
+
+    def test_verify_signature(self):
+        keys = [load_public_key(public_key_string(PRIVATE_KEY))]
+        signature = sign(self.body)
+
+        self.assertTrue(verify_signature(self.body, signature, TIMESTAMP, keys))
+        self.assertTrue(
+            verify_signature(self.body, signature.encode(), TIMESTAMP.encode(), keys)
+        )
+        self.assertFalse(verify_signature(self.body + b" ", signature, TIMESTAMP, keys))
+        self.assertFalse(verify_signature(self.body, signature, TIMESTAMP + "1", keys))
+        self.assertFalse(verify_signature(self.body, "not base64!", TIMESTAMP, keys))
+        self.assertFalse(verify_signature(self.body, signature, TIMESTAMP, []))
+
+    def test_raw_body(self):
+        # The body is verified as sent, without being decoded as UTF-8
+        body = b"\xff\xfe not utf-8"
+        keys = [load_public_key(public_key_string(PRIVATE_KEY))]
+        self.assertTrue(verify_signature(body, sign(body), TIMESTAMP, keys))
+
+    def test_verify_request(self):
+        with self.settings(
+            SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY)
+        ):
+            self.assertTrue(verify_request(make_request(self.body, sign(self.body))))
+            self.assertFalse(
+                verify_request(
+                    make_request(self.body, sign(self.body, OTHER_PRIVATE_KEY))
+                )
+            )
+            self.assertFalse(verify_request(make_request(self.body, "")))
+
+            request = HttpRequest()
+            request._body = self.body
+            self.assertFalse(verify_request(request))
+
+    def test_key_rotation(self):
+        keys = [public_key_string(OTHER_PRIVATE_KEY), public_key_string(PRIVATE_KEY)]
+        with self.settings(SENDGRID_WEBHOOK_VERIFICATION_KEY=keys):
+            self.assertEqual(len(get_public_keys()), 2)
+            self.assertTrue(verify_request(make_request(self.body, sign(self.body))))
+            self.assertTrue(
+                verify_request(
+                    make_request(self.body, sign(self.body, OTHER_PRIVATE_KEY))
+                )
+            )
+
+    def test_keys_cached_per_loader(self):
+        loads = []
+
+        def loader(key):
+            loads.append(key)
+            return "loaded " + key
+
+        with self.settings(SENDGRID_WEBHOOK_VERIFICATION_KEY=["a", "b"]):
+            for _ in range(3):
+                self.assertEqual(get_public_keys(loader), ["loaded a", "loaded b"])
+            self.assertEqual(loads, ["a", "b"])
+            # Keys loaded another way are cached separately
+            self.assertEqual(get_public_keys(str.upper), ["A", "B"])
+        with self.settings(SENDGRID_WEBHOOK_VERIFICATION_KEY="a"):
+            self.assertEqual(get_public_keys(loader), ["loaded a"])
+        self.assertEqual(loads, ["a", "b", "a"])
+
+    def test_same_result_as_sendgrid(self):
+        if not SENDGRID_6:
+            self.skipTest("EventWebhook requires sendgrid v6")
+
+        key = public_key_string(PRIVATE_KEY)
+        signature = sign(self.body)
+        for timestamp in (TIMESTAMP, TIMESTAMP + "1"):
+            self.assertEqual(
+                verify_signature(
+                    self.body, signature, timestamp, [load_public_key(key)]
+                ),
+                EventWebhook(key).verify_signature(
+                    self.body.decode(), signature, timestamp
+                ),
+            )
+
+    def test_decorator(self):
+        @verify_webhook_signature
+        def view(request):
+            return "The function was successfully run"
+
+        with self.settings(
+            SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY)
+        ):
+            self.assertEqual(
+                view(make_request(self.body, sign(self.body))),
+                "The function was successfully run",
+            )
+            self.assertIsInstance(
+                view(make_request(self.body + b" ", sign(self.body))),
+                HttpResponseNotFound,
+            )
+
+    async def test_async_decorator(self):
+        @verify_webhook_signature
+        async def view(request):
+            return "The function was successfully run"
+
+        with self.settings(
+            SENDGRID_WEBHOOK_VERIFICATION_KEY=public_key_string(PRIVATE_KEY)
+        ):
+            self.assertEqual(
+                await view(make_request(self.body, sign(self.body))),
+                "The function was successfully run",
+            )
+            self.assertIsInstance(
+                await view(make_request(self.body, sign(self.body), "0")),
+                HttpResponseNotFound,
+            )
+
+
+class TestAsyncVerification(SimpleTestCase):
+    """
+    Async views verify signatures in a bounded executor when
+    SENDGRID_WEBHOOK_VERIFICATION_WORKERS is set, leaving the event loop free.
+    """
+
+    def setUp(self):
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def slow_check(self, request):
+        # Stands in for verifying a very large batch of events
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.1)
+        with self.lock:
+            self.running -= 1
+        return request.body == b"valid"
+
+    async def measure_loop_stalls(self, requests):
+        """
+        Handles requests concurrently, returning the responses and the longest time the
+        event loop went without running a ticking coroutine.
+        """
+
+        @signature_check(self.slow_check)
+        async def view(request):
+            return "The function was successfully run"
+
+        longest_gap = 0.0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal longest_gap
+            last = time.monotonic()
+            while not done.is_set():
+                await asyncio.sleep(0.005)
+                now = time.monotonic()
+                longest_gap = max(longest_gap, now - last)
+                last = now
+
+        ticking = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0.01)
+        try:
+            responses = await asyncio.gather(*(view(r) for r in requests))
+        finally:
+            done.set()
+            await ticking
+        return responses, longest_gap
+
+    def make_request(self, body):
+        request = HttpRequest()
+        request._body = body
+        return request
+
+    async def test_inline_by_default(self):
+        self.assertIsNone(get_verification_executor())
+        _, longest_gap = await self.measure_loop_stalls(
+            [self.make_request(b"valid") for _ in range(3)]
+        )
+        # Verification runs on the loop, one request at a time
+        self.assertGreaterEqual(longest_gap, 0.1)
+        self.assertEqual(self.max_running, 1)
+
+    async def test_offloaded(self):
+        requests = [self.make_request(b"valid") for _ in range(5)]
+        requests.append(self.make_request(b"invalid"))
+
+        with self.settings(SENDGRID_WEBHOOK_VERIFICATION_WORKERS=2):
+            start = time.monotonic()
+            responses, longest_gap = await self.measure_loop_stalls(requests)
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(responses[:5], ["The function was successfully run"] * 5)
+        self.assertIsInstance(responses[5], HttpResponseNotFound)
+        self.assertLess(longest_gap, 0.08)
+        # At most two requests are verified at once
+        self.assertEqual(self.max_running, 2)
+        self.assertGreaterEqual(elapsed, 0.3)
+
+    def test_executor_follows_setting(self):
+        with self.settings(SENDGRID_WEBHOOK_VERIFICATION_WORKERS=2):
+            executor = get_verification_executor()
+            self.assertIs(get_verification_executor(), executor)
+        with self.settings(SENDGRID_WEBHOOK_VERIFICATION_WORKERS=4):
+            self.assertIsNot(get_verification_executor(), executor)
+        self.assertIsNone(get_verification_executor())
@@ -0,0 +1,258 @@
+import http.client
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.management.commands.sendgrid_drain_spool import Command
+from sendgrid_backend.retry import RetryPolicy
+from sendgrid_backend.spool import Spool, SpoolBackend, drain_spool
+
+from .helpers import make_message, start_fake_sendgrid
+
+
+def status_for(request):
+    return {"bad": 400, "busy": 503}.get(request.body.get("subject"))
+
+
+class SpoolTestCase(SimpleTestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "spool.sqlite3")
+        self.spool = Spool(self.path)
+        self.addCleanup(self.spool.close)
+
+
+class TestSpool(SpoolTestCase):
+    def test_claim_and_ack(self):
+        self.spool.put([(b"1", 1), (b"2", 2), (b"3", 3)])
+        self.assertEqual(self.spool.pending(), 3)
+
+        first = self.spool.claim(2)
+        self.assertEqual(
+            [(r.body, r.messages, r.attempts) for r in first],
+            [(b"1", 1, 1), (b"2", 2, 1)],
+        )
+        # Claimed requests aren't claimed again until their lease runs out
+        self.assertEqual([r.body for r in self.spool.claim(10)], [b"3"])
+        self.assertEqual(self.spool.claim(10), [])
+
+        self.spool.ack([r.id for r in first])
+        self.assertEqual(self.spool.pending(), 1)
+
+    def test_expired_lease(self):
+        self.spool.put([(b"1", 1)])
+        self.spool.claim(1, lease=0)
+        (request,) = self.spool.claim(1)
+        self.assertEqual(request.attempts, 2)
+
+    def test_renew(self):
+        self.spool.put([(b"1", 1)])
+        (request,) = self.spool.claim(1, lease=0)
+        request = self.spool.renew(request, lease=60)
+        self.assertEqual(self.spool.claim(1), [])
+
+        # Once another claim was made, the lease can't be renewed
+        self.spool.renew(request, lease=0)
+        self.spool.claim(1)
+        self.assertIsNone(self.spool.renew(request))
+
+    def test_retry_and_fail(self):
+        self.spool.put([(b"1", 1), (b"2", 1)])
+        first, second = self.spool.claim(2)
+        self.spool.retry(first.id, 0)
+        self.spool.fail(second.id, "Bad request")
+
+        self.assertEqual([r.body for r in self.spool.claim(10)], [b"1"])
+        self.assertEqual((self.spool.pending(), self.spool.failed()), (1, 1))
+
+    def test_shared_between_connections(self):
+        self.spool.put([(b"1", 1)])
+        other = Spool(self.path)
+        self.addCleanup(other.close)
+        self.assertEqual(len(other.claim(10)), 1)
+        self.assertEqual(self.spool.claim(10), [])
+
+
+class TestSpoolBackend(SpoolTestCase):
+    def make_backend(self, **kwargs):
+        with override_settings(SENDGRID_SPOOL_PATH=self.path):
+            # Nothing listens on port 9, so any request would fail
+            return SpoolBackend(api_key="stub", host="http://127.0.0.1:9", **kwargs)
+
+    def test_send_messages(self):
+        backend = self.make_backend()
+        msgs = [make_message(), make_message(to="jane.doe@example.com")]
+        self.assertEqual(backend.send_messages(msgs), 2)
+
+        requests = self.spool.claim(10)
+        self.assertEqual(
+            [json.loads(r.body) for r in requests],
+            [backend._build_sg_mail(msg) for msg in msgs],
+        )
+        self.assertNotIn("status", msgs[0].extra_headers)
+
+    def test_coalesced(self):
+        backend = self.make_backend(coalesce_messages=True)
+        msgs = [make_message(to="recipient%d@example.com" % i) for i in range(3)]
+        self.assertEqual(backend.send_messages(msgs), 3)
+
+        (request,) = self.spool.claim(10)
+        self.assertEqual(request.messages, 3)
+        self.assertEqual(len(json.loads(request.body)["personalizations"]), 3)
+
+    def test_path_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SpoolBackend(api_key="stub")
+
+    async def test_asend_messages(self):
+        backend = self.make_backend()
+        self.assertEqual(await backend.asend_messages([make_message()]), 1)
+        self.assertEqual(self.spool.pending(), 1)
+
+    async def test_asend_messages_off_event_loop(self):
+        backend = self.make_backend()
+        threads = []
+        put = backend.spool.put
+
+        def record_thread(requests):
+            threads.append(threading.get_ident())
+            return put(requests)
+
+        with patch.object(backend.spool, "put", side_effect=record_thread):
+            await backend.asend_messages([make_message()])
+        self.assertEqual(len(threads), 1)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class TestDrainSpool(SpoolTestCase):
+    def setUp(self):
+        super().setUp()
+        self.server = start_fake_sendgrid(self, status_for=status_for)
+        self.host = self.server.host
+
+        with override_settings(SENDGRID_SPOOL_PATH=self.path):
+            self.spool_backend = SpoolBackend(api_key="stub")
+        self.backend = SendgridBackend(api_key="stub", host=self.host)
+        self.retry_policy = RetryPolicy(max_retries=2, backoff=0, backoff_max=0)
+
+    def test_drain(self):
+        msgs = [
+            make_message(),
+            make_message(subject="bad"),
+            make_message(subject="busy"),
+        ]
+        self.spool_backend.send_messages(msgs)
+
+        sent, failed = drain_spool(
+            self.backend, self.spool, batch_size=2, retry_policy=self.retry_policy
+        )
+        # The busy request is retried until it runs out of retries
+        self.assertEqual((sent, failed), (1, 2))
+        self.assertEqual(
+            [r.body["subject"] for r in self.server.requests],
+            ["Hello, World!", "bad", "busy", "busy", "busy"],
+        )
+        self.assertEqual((self.spool.pending(), self.spool.failed()), (0, 2))
+
+    def test_ack_each_request(self):
+        self.spool_backend.send_messages([make_message(), make_message()])
+        post = self.backend._post
+
+        def post_then_interrupt(data):
+            if self.server.requests:
+                raise KeyboardInterrupt
+            return post(data)
+
+        with patch.object(self.backend, "_post", side_effect=post_then_interrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                drain_spool(self.backend, self.spool, retry_policy=self.retry_policy)
+        # The request that was posted isn't posted again
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.spool.pending(), 1)
+
+    def test_expired_lease_not_posted(self):
+        self.spool_backend.send_messages([make_message()])
+        other = Spool(self.path)
+        self.addCleanup(other.close)
+        # Another drain claims the request while this one waits on the throttle
+        self.backend.throttle = MagicMock()
+        self.backend.throttle.acquire.side_effect = lambda: other.claim(10)
+
+        sent_failed = drain_spool(
+            self.backend, self.spool, lease=0, retry_policy=self.retry_policy
+        )
+        self.assertEqual(sent_failed, (0, 0))
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(self.spool.pending(), 1)
+
+    def test_connection_error(self):
+        self.spool_backend.send_messages([make_message()])
+        backend = SendgridBackend(api_key="stub", host="http://127.0.0.1:9")
+        policy = RetryPolicy(max_retries=1, backoff=60)
+
+        with patch("sendgrid_backend.retry.random.uniform", return_value=60):
+            sent_failed = drain_spool(backend, self.spool, retry_policy=policy)
+        self.assertEqual(sent_failed, (0, 0))
+        # The request is due again after a backoff
+        self.assertEqual(self.spool.pending(), 1)
+        self.assertEqual(self.spool.claim(10, lease=0), [])
+
+    def test_protocol_error(self):
+        self.spool_backend.send_messages([make_message()])
+        error = http.client.IncompleteRead(b"")
+        policy = RetryPolicy(max_retries=1, backoff=60)
+
+        with patch.object(self.backend, "_post", side_effect=error), patch(
+            "sendgrid_backend.retry.random.uniform", return_value=60
+        ):
+            sent_failed = drain_spool(self.backend, self.spool, retry_policy=policy)
+        # It is retried like a connection error
+        self.assertEqual(sent_failed, (0, 0))
+        self.assertEqual((self.spool.pending(), self.spool.failed()), (1, 0))
+
+    def test_invalid_request(self):
+        self.spool.put([(b"not json", 1)])
+        self.spool_backend.send_messages([make_message()])
+
+        sent_failed = drain_spool(
+            self.backend, self.spool, retry_policy=self.retry_policy
+        )
+        # The request that can't be decoded fails without stopping the drain
+        self.assertEqual(sent_failed, (1, 1))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual((self.spool.pending(), self.spool.failed()), (0, 1))
+
+    def test_serializer_error(self):
+        self.spool_backend.send_messages([make_message()])
+
+        with patch.object(self.backend, "_post", side_effect=TypeError("bad type")):
+            sent_failed = drain_spool(
+                self.backend, self.spool, retry_policy=self.retry_policy
+            )
+        self.assertEqual(sent_failed, (0, 1))
+        self.assertEqual((self.spool.pending(), self.spool.failed()), (0, 1))
+
+    def test_command(self):
+        self.spool_backend.send_messages([make_message(), make_message()])
+
+        out = StringIO()
+        with override_settings(
+            SENDGRID_API_KEY="stub",
+            SENDGRID_HOST_URL=self.host,
+            SENDGRID_SPOOL_PATH=self.path,
+        ):
+            call_command(Command(), "--once", stdout=out)
+
+        self.assertEqual(out.getvalue(), "Sent 2 messages, 0 failed\n")
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.spool.pending(), 0)
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.throttle import Throttle, ThrottledError
+
+from .helpers import make_message
+
+
+class TestThrottle(SimpleTestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "throttle.sqlite3")
+
+    def test_burst_then_wait(self):
+        throttle = Throttle("key", rate=20, burst=2, path=self.path)
+
+        self.assertEqual(throttle.try_acquire(), 0)
+        self.assertEqual(throttle.try_acquire(), 0)
+        wait = throttle.try_acquire()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.05)
+
+        start = time.monotonic()
+        throttle.acquire()
+        self.assertGreater(time.monotonic() - start, 0.01)
+
+    def test_shared_budget(self):
+        # Throttles in different processes share their state through the database
+        first = Throttle("key", rate=1, burst=1, path=self.path)
+        second = Throttle("key", rate=1, burst=1, path=self.path)
+        other_account = Throttle("other", rate=1, burst=1, path=self.path)
+
+        self.assertEqual(first.try_acquire(), 0)
+        self.assertGreater(second.try_acquire(), 0)
+        self.assertEqual(other_account.try_acquire(), 0)
+
+    def test_fail_fast(self):
+        throttle = Throttle("key", rate=1, burst=1, max_wait=0, path=self.path)
+        throttle.acquire()
+
+        with self.assertRaises(ThrottledError) as cm:
+            throttle.acquire()
+        self.assertEqual(cm.exception.status_code, 429)
+        self.assertIn("Retry-After", cm.exception.headers)
+
+    async def test_aacquire(self):
+        throttle = Throttle("key", rate=50, burst=1, path=self.path)
+
+        self.assertEqual(await throttle.aacquire(), 0)
+        self.assertGreater(await throttle.aacquire(), 0)
+
+    async def test_aacquire_off_event_loop(self):
+        throttle = Throttle("key", rate=50, burst=1, path=self.path)
+        threads = []
+        try_acquire = throttle.try_acquire
+
+        def record_thread():
+            threads.append(threading.get_ident())
+            return try_acquire()
+
+        throttle.try_acquire = record_thread
+        await throttle.aacquire()
+        # The database is only touched outside of the event loop's thread
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_send_messages(self):
+        with override_settings(
+            SENDGRID_THROTTLE_RATE=1,
+            SENDGRID_THROTTLE_MAX_WAIT=0,
+            SENDGRID_THROTTLE_PATH=self.path,
+        ):
+            backend = SendgridBackend(api_key="stub", fail_silently=True)
+        backend.sg = MagicMock()
+        resp = backend.sg.client.mail.send.post.return_value
+        resp.status_code = 202
+        resp.headers = {"x-message-id": "abc"}
+
+        self.assertEqual(backend.send_messages([make_message(), make_message()]), 1)
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 1)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(SendgridBackend(api_key="stub").throttle)
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+from django.test import override_settings
+from django.test.testcases import SimpleTestCase
+from python_http_client.exceptions import ServiceUnavailableError
+
+from sendgrid_backend.mail import SendgridBackend
+from sendgrid_backend.retry import DeadlineExceededError
+from sendgrid_backend.signals import sendgrid_email_sent
+from sendgrid_backend.throttle import Throttle, ThrottledError
+from sendgrid_backend.transport import AsyncTransport, ConnectionPool
+
+from .helpers import connect_receiver, make_message, mock_backend
+
+RESPONSE = MagicMock(status_code=202, headers={"x-message-id": "abc"})
+
+
+def slow_post(**kwargs):
+    time.sleep(0.2)
+    return RESPONSE
+
+
+class TestTimeouts(SimpleTestCase):
+    def setUp(self):
+        # A server that accepts connections, but never responds
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(8)
+        self.addCleanup(self.listener.close)
+        self.host = "http://127.0.0.1:%d" % self.listener.getsockname()[1]
+
+    def test_no_timeouts_by_default(self):
+        backend = SendgridBackend(api_key="stub")
+        self.assertIsNone(backend.connect_timeout)
+        self.assertIsNone(backend.read_timeout)
+        self.assertIsNone(backend.send_deadline)
+        self.assertIsNone(backend.sg.client.timeout)
+
+    def test_settings(self):
+        with override_settings(
+            SENDGRID_CONNECT_TIMEOUT=2,
+            SENDGRID_READ_TIMEOUT=10,
+            SENDGRID_SEND_DEADLINE=60,
+        ):
+            backend = SendgridBackend(api_key="stub")
+        self.assertEqual(backend.connect_timeout, 2)
+        self.assertEqual(backend.read_timeout, 10)
+        self.assertEqual(backend.send_deadline, 60)
+        # python_http_client can't time out connecting and reading separately
+        self.assertEqual(backend.sg.client.timeout, 10)
+
+        backend = SendgridBackend(api_key="stub", connect_timeout=3)
+        self.assertEqual(backend.sg.client.timeout, 3)
+
+    def test_python_http_client_read_timeout(self):
+        backend = SendgridBackend(api_key="stub", host=self.host, read_timeout=0.2)
+        start = time.monotonic()
+        with self.assertRaises(OSError):
+            backend.send_messages([make_message()])
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_pool_timeouts(self):
+        pool = ConnectionPool(self.host, {}, timeout=0.2, connect_timeout=5)
+        conn = pool._new_connection()
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.timeout, 5)
+        self.assertEqual(conn.sock.gettimeout(), 0.2)
+
+        start = time.monotonic()
+        with self.assertRaises(OSError):
+            pool.post({})
+        self.assertLess(time.monotonic() - start, 2)
+
+    async def test_async_transport_timeouts(self):
+        transport = AsyncTransport(self.host, {}, timeout=10, connect_timeout=2)
+        self.assertEqual(transport.client.timeout.connect, 2)
+        self.assertEqual(transport.client.timeout.read, 10)
+        await transport.close()
+
+        transport = AsyncTransport(self.host, {})
+        self.assertIsNone(transport.client.timeout.read)
+        await transport.close()
+
+
+class TestSendDeadline(SimpleTestCase):
+    def setUp(self):
+        self.signals = []
+
+        def receiver(sender, message, fail_flag, **kwargs):
+            self.signals.append((fail_flag, kwargs["attempts"]))
+
+        connect_receiver(self, sendgrid_email_sent, receiver)
+
+    def test_unattempted_messages_fail(self):
+        backend = mock_backend(slow_post, send_deadline=0.1)
+
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            backend.send_messages([make_message() for _ in range(5)])
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        # Only the first message was posted, but all of them are reported
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 1)
+        self.assertEqual(self.signals, [(False, 1)] + [(True, 0)] * 4)
+
+    def test_fail_silently(self):
+        backend = mock_backend(slow_post, send_deadline=0.1, fail_silently=True)
+        self.assertEqual(backend.send_messages([make_message() for _ in range(3)]), 1)
+        self.assertEqual(len(self.signals), 3)
+
+    def test_concurrent(self):
+        backend = mock_backend(slow_post, send_deadline=0.1, max_workers=2)
+        with self.assertRaises(DeadlineExceededError):
+            backend.send_messages([make_message() for _ in range(6)])
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 2)
+        self.assertEqual(sorted(self.signals), [(False, 1)] * 2 + [(True, 0)] * 4)
+
+    def test_retry_not_past_deadline(self):
+        error = ServiceUnavailableError(503, "", b"", {"Retry-After": "5"})
+        with override_settings(SENDGRID_MAX_RETRIES=2):
+            backend = mock_backend(error, send_deadline=3)
+
+        with self.assertRaises(ServiceUnavailableError):
+            backend.send_messages([make_message()])
+        self.assertEqual(self.signals, [(True, 1)])
+
+    def throttled_backend(self, **kwargs):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        backend = SendgridBackend(api_key="stub", send_deadline=0.5, **kwargs)
+        # A token a second, so the second message would wait past the deadline
+        backend.throttle = Throttle(
+            "stub", rate=1, path=os.path.join(tmpdir.name, "throttle.sqlite3")
+        )
+        return backend
+
+    def test_throttle_not_past_deadline(self):
+        backend = self.throttled_backend()
+        backend.sg = MagicMock()
+        backend.sg.client.mail.send.post.return_value = RESPONSE
+
+        start = time.monotonic()
+        with self.assertRaises(ThrottledError):
+            backend.send_messages([make_message(), make_message()])
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(backend.sg.client.mail.send.post.call_count, 1)
+        self.assertEqual(self.signals, [(False, 1), (True, 1)])
+
+    async def test_async_throttle_not_past_deadline(self):
+        backend = self.throttled_backend(max_concurrent_requests=1)
+        backend._async_transport = MagicMock()
+        backend._async_transport.post = AsyncMock(return_value=RESPONSE)
+
+        start = time.monotonic()
+        with self.assertRaises(ThrottledError):
+            await backend.asend_messages([make_message(), make_message()])
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(backend._async_transport.post.call_count, 1)
+
+    async def test_async(self):
+        posts = []
+
+        async def post(data):
+            posts.append(data)
+            await asyncio.sleep(0.2)
+            return RESPONSE
+
+        backend = SendgridBackend(
+            api_key="stub", send_deadline=0.1, max_concurrent_requests=1
+        )
+        backend._async_transport = MagicMock(post=post)
+
+        with self.assertRaises(DeadlineExceededError):
+            await backend.asend_messages([make_message() for _ in range(4)])
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(self.signals, [(False, 1)] + [(True, 0)] * 3)